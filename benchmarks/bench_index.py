@@ -0,0 +1,75 @@
+"""
+Benchmark of spatial indexes used for nearest spot lookups
+
+python -m benchmarks.bench_index --spots 1000000
+"""
+
+import time
+import click
+import numpy as np
+from geonetpy.balltree import BallTree
+from geonetpy.kdtree import KDTree
+
+# bounding box of random spots (lat, lon), roughly czech republic
+SPOTS_MIN = [48.5, 12.0]
+SPOTS_MAX = [51.0, 19.0]
+
+INDEXES = {
+    'balltree': BallTree,
+    'kdtree': KDTree,
+}
+
+def random_points(rng, count, first_id=0):
+    coords = rng.uniform(SPOTS_MIN, SPOTS_MAX, (count, 2))
+    return [[lat, lon, first_id + i] for i, (lat, lon) in enumerate(coords.tolist())]
+
+def bench_index(index_cls, spots, queries, inserts):
+    result = {}
+
+    start = time.perf_counter()
+    index = index_cls(spots)
+    result['build_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    nearest = [index.query(q, k=1)[0] for q in queries]
+    result['query_us'] = (time.perf_counter() - start) / len(queries) * 1e6
+
+    start = time.perf_counter()
+    for point in inserts:
+        index.add_point(point)
+    result['insert_us'] = (time.perf_counter() - start) / len(inserts) * 1e6
+
+    result['height'] = index.get_height()
+
+    return result, nearest
+
+@click.command()
+@click.option('--spots', default=1000000, show_default=True, help='Number of spots in index')
+@click.option('--queries', default=1000, show_default=True, help='Number of nearest spot queries')
+@click.option('--balltree-queries', default=20, show_default=True, help='Number of queries for ball tree (it visits most of the tree)')
+@click.option('--inserts', default=1000, show_default=True, help='Number of inserted spots')
+@click.option('--seed', default=0, show_default=True, help='Seed of random generator')
+def bench(spots, queries, balltree_queries, inserts, seed):
+    rng = np.random.default_rng(seed)
+
+    spot_points = random_points(rng, spots)
+    query_points = rng.uniform(SPOTS_MIN, SPOTS_MAX, (queries, 2)).tolist()
+    insert_points = random_points(rng, inserts, spots)
+
+    results = {}
+    for name, index_cls in INDEXES.items():
+        count = balltree_queries if name == 'balltree' else queries
+        click.echo(f'benchmarking {name} ({spots} spots, {count} queries, {inserts} inserts)')
+        results[name] = bench_index(index_cls, spot_points, query_points[:count], insert_points)
+
+    # both indexes must return nearest spots with same distances
+    checked = min(queries, balltree_queries)
+    for n1, n2 in zip(results['balltree'][1][:checked], results['kdtree'][1][:checked]):
+        assert abs(n1[0] - n2[0]) < 1e-6, f'nearest spots differ: {n1} {n2}'
+
+    click.echo(f'{"index":<10} {"build [s]":>10} {"query [us]":>12} {"insert [us]":>12} {"height":>8}')
+    for name, (result, _) in results.items():
+        click.echo(f'{name:<10} {result["build_s"]:>10.2f} {result["query_us"]:>12.1f} {result["insert_us"]:>12.1f} {result["height"]:>8}')
+
+if __name__ == '__main__':
+    bench()
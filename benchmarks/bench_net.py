@@ -0,0 +1,217 @@
+"""
+Benchmark of net construction, matching and export
+
+Tracks are synthetic random walks (steps of roughly 30 m) split to tracks
+of track size points. Overlap is probability that a track follows one of
+previous tracks (with a few meters of noise) instead of walking a new way,
+so it controls how many spots are reused.
+
+Each case runs in a fresh process, so peak RSS reported by the case is not
+affected by previous cases. Results are stored as json, results of two
+commits are compared by compare command:
+
+python -m benchmarks.bench_net run --scale 10000 --scale 100000 --output new.json
+python -m benchmarks.bench_net compare base.json new.json
+"""
+
+import io
+import json
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+import click
+import numpy as np
+from geonetpy import interpolation, match
+from geonetpy.balltree import BallTree
+from geonetpy.netmem import NetMem, SPOT_INDEXES
+
+# start of random walks (lat, lon)
+START = [49.2257, 16.5337]
+
+# size of random walk steps and noise of tracks following previous tracks (degrees)
+STEP = 0.0003
+NOISE = 0.00005
+
+# number of nearest spot queries of balltree case
+QUERIES = 100
+
+# distance of interpolated points (meters)
+INTERPOLATION_DISTANCE = 10
+
+def synthetic_tracks(points, overlap, track_size=1000, seed=0):
+    """list of tracks (arrays of lat, lon) with points in total"""
+    rng = np.random.default_rng(seed)
+    tracks = []
+    for start in range(0, points, track_size):
+        size = min(track_size, points - start)
+        if tracks and rng.random() < overlap:
+            base = tracks[rng.integers(len(tracks))]
+            base = base[:size] if len(base) >= size else np.vstack([base, base[-1] + np.cumsum(rng.normal(0, STEP, (size - len(base), 2)), axis=0)])
+            tracks.append(base + rng.normal(0, NOISE, base.shape))
+        else:
+            origin = np.array(START) + rng.uniform(-0.05, 0.05, 2)
+            tracks.append(origin + np.cumsum(rng.normal(0, STEP, (size, 2)), axis=0))
+    return tracks
+
+def build_net(tracks, spot_index='kdtree'):
+    n = NetMem(spot_index=spot_index)
+    for track_id, track in enumerate(tracks):
+        n.add_track(track, track_id)
+    return n
+
+def case_interpolate(tracks, _):
+    for track in tracks:
+        interpolation.interpolate_distance(track, INTERPOLATION_DISTANCE)
+    return {}
+
+def case_net(tracks, options):
+    n = build_net(tracks, options['spot_index'])
+    return n.stat()
+
+def case_balltree(tracks, _):
+    points = np.vstack(tracks)
+    tree = BallTree([[points[0][0], points[0][1], 0]])
+    for i, (lat, lon) in enumerate(points[1:].tolist(), start=1):
+        tree.add_point([lat, lon, i])
+
+    start = time.perf_counter()
+    for point in points[::max(1, len(points) // QUERIES)][:QUERIES].tolist():
+        tree.query(point)
+    return {'query_us': (time.perf_counter() - start) / min(QUERIES, len(points)) * 1e6, 'height': tree.get_height()}
+
+def case_match(tracks, _):
+    half = max(1, len(tracks) // 2)
+    matches = match.match(np.vstack(tracks[:half]), np.vstack(tracks[half:] or tracks), 0, tolerance_m=20)
+    return {'matches': len(matches)}
+
+def case_geojson(tracks, options):
+    # net is built before measurement starts, see SETUP
+    n = options['net']
+    output = io.StringIO()
+    n.write_geojson(output)
+    return {'spots': len(n.spots), 'edges': len(n.edges), 'bytes': output.tell()}
+
+CASES = {
+    'interpolate': case_interpolate,
+    'net': case_net,
+    'balltree': case_balltree,
+    'match': case_match,
+    'geojson': case_geojson,
+}
+
+# preparation of cases which is not measured
+SETUP = {
+    'geojson': lambda tracks, options: {**options, 'net': build_net(tracks, options['spot_index'])}
+}
+
+def peak_rss_mb():
+    """peak resident set size of the process (ru_maxrss is in bytes on macos)"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+
+def run_case(case, points, overlap, options):
+    """runs case in current process, returns dict of results"""
+    tracks = synthetic_tracks(points, overlap, options['track_size'], options['seed'])
+    options = SETUP[case](tracks, options) if case in SETUP else options
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    result = CASES[case](tracks, options)
+    seconds = time.perf_counter() - start
+
+    return {
+        'case': case,
+        'points': points,
+        'overlap': overlap,
+        'seconds': seconds,
+        'points_per_s': points / seconds if seconds > 0 else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_growth_mb': peak_rss_mb() - rss_before,
+        **result
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def result_key(result):
+    return result['case'], result['points'], result['overlap']
+
+@click.group()
+def bench():
+    pass
+
+@bench.command('run')
+@click.option('--case', 'cases', default=list(CASES), type=click.Choice(list(CASES)), multiple=True, show_default=True, help='Benchmarked cases')
+@click.option('--scale', 'scales', default=[10000, 100000], type=int, multiple=True, show_default=True, help='Number of track points')
+@click.option('--overlap', 'overlaps', default=[0.0, 0.8], type=float, multiple=True, show_default=True, help='Probability that a track follows one of previous tracks')
+@click.option('--track-size', default=1000, show_default=True, help='Number of points of one track')
+@click.option('--spot-index', default='kdtree', type=click.Choice(SPOT_INDEXES), show_default=True, help='Spatial index of the net')
+@click.option('--seed', default=0, show_default=True, help='Seed of random generator')
+@click.option('--output', default='bench.json', show_default=True, help='File name of json results')
+def bench_run(cases, scales, overlaps, track_size, spot_index, seed, output):
+    """Runs benchmarks, each case in a fresh process"""
+    options = {'track_size': track_size, 'spot_index': spot_index, 'seed': seed}
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for case in cases:
+        for points in scales:
+            for overlap in overlaps:
+                click.echo(f'benchmarking {case} ({points} points, overlap {overlap})')
+                with context.Pool(1) as pool:
+                    result = pool.apply(run_case, (case, points, overlap, options))
+                click.echo(f'  {result["points_per_s"]:.0f} points/s, peak rss {result["peak_rss_mb"]:.1f} MB')
+                results.append(result)
+
+    with open(output, 'w', encoding='utf-8') as output_file:
+        json.dump({
+            'meta': {
+                'commit': git_commit(),
+                'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.platform(),
+                'options': options
+            },
+            'results': results
+        }, output_file, indent=4)
+
+    click.echo(f'results written to {output}')
+
+@bench.command('compare')
+@click.argument('base', type=click.Path(exists=True))
+@click.argument('new', type=click.Path(exists=True))
+@click.option('--threshold', default=0.1, show_default=True, help='Relative slowdown (or memory growth) reported as regression')
+def bench_compare(base, new, threshold):
+    """Compares results of two runs, exit code is 1 if there is a regression"""
+    with open(base, encoding='utf-8') as base_file, open(new, encoding='utf-8') as new_file:
+        base = json.load(base_file)
+        new = json.load(new_file)
+
+    click.echo(f'base: {base["meta"]["commit"]}, new: {new["meta"]["commit"]}')
+    click.echo(f'{"case":<12} {"points":>10} {"overlap":>8} {"points/s":>12} {"speed":>8} {"rss [MB]":>10} {"rss":>8}')
+
+    base_results = {result_key(r): r for r in base['results']}
+    regressions = 0
+    for r in new['results']:
+        b = base_results.get(result_key(r))
+        if b is None:
+            continue
+        speed = r['points_per_s'] / b['points_per_s']
+        rss = r['peak_rss_mb'] / b['peak_rss_mb']
+        regression = speed < 1 - threshold or rss > 1 + threshold
+        regressions += regression
+        click.echo(f'{r["case"]:<12} {r["points"]:>10} {r["overlap"]:>8} {r["points_per_s"]:>12.0f} {speed:>8.2f} {r["peak_rss_mb"]:>10.1f} {rss:>8.2f}{" !" if regression else ""}')
+
+    if regressions > 0:
+        click.echo(f'{regressions} regressions')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    bench()
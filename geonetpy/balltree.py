@@ -1,7 +1,12 @@
 import logging
+import numpy as np
 from .geoutils import haversine_distance
+from . import metrics
 
-BALANCING_FACTOR = 150
+# subtree is rebuilt when one of its children holds more than this fraction
+# of its nodes (weight balanced tree with partial rebuilding), insertion
+# cost is amortized logarithmic
+BALANCING_ALPHA = 0.75
 
 class BallTreeNode:
     def __init__(self, point, index):
@@ -9,6 +14,25 @@ class BallTreeNode:
         self.index = index
         self.left = None
         self.right = None
+        self.size = 1
+
+def node_size(node):
+    return node.size if node else 0
+
+def query_nearest(index, points, max_distance=None):
+    """Nearest point of each of points by single queries of index as tuple
+    of arrays (distances in meters, ids of nearest points), distance is inf
+    and id -1 if nothing was found (see KDTree.query_nearest)"""
+    distances = np.full(len(points), np.inf)
+    ids = np.full(len(points), -1, dtype=np.int64)
+
+    for i, point in enumerate(points):
+        nearest = index.query(point, k=1)
+        if nearest and (max_distance is None or nearest[0][0] <= max_distance):
+            distances[i] = nearest[0][0]
+            ids[i] = nearest[0][1][2]
+
+    return distances, ids
 
 class BallTree:
     def __init__(self, points):
@@ -33,6 +57,7 @@ class BallTree:
         # recursively build left and right subtrees
         node.left = self.build_tree(points[:median_index])
         node.right = self.build_tree(points[median_index + 1:])
+        node.size = len(points)
 
         return node
 
@@ -62,8 +87,30 @@ class BallTree:
 
         return nearest
 
+    def query_nearest(self, points, max_distance=None):
+        return query_nearest(self, points, max_distance)
+
+    def query_rect(self, rect):
+        """points inside lat/lon rect (see Rect), tree is split on latitude"""
+        result = []
+        min_lat, _, max_lat, _ = rect.get_bounds()
+
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if not node:
+                continue
+            if rect.contains(node.point):
+                result.append(node.point)
+            if min_lat <= node.point[0]:
+                stack.append(node.left)
+            if max_lat >= node.point[0]:
+                stack.append(node.right)
+
+        return result
+
     def add_point(self, point):
-        self._add_point(self.root, point)
+        self.root = self._add_point(self.root, point)
 
     def _add_point(self, node, point):
         if not node:
@@ -74,18 +121,20 @@ class BallTree:
             node.left = self._add_point(node.left, point)
         else:
             node.right = self._add_point(node.right, point)
+        node.size += 1
 
-        # Rebuild the tree if it is unbalanced
+        # Rebuild the subtree if it is unbalanced, points are collected
+        # in sorted order, so sorting in build_tree is linear
         if self._is_unbalanced(node):
-            logging.info('balancing ball tree node, height: %d', self._height(node))
+            logging.debug('balancing ball tree node, size: %d', node.size)
+            metrics.count('balltree.rebalances')
             points = self._collect_points(node)
             node = self.build_tree(points)
-            logging.info('node balancing done, height: %d', self._height(node))
 
         return node
 
     def _is_unbalanced(self, node):
-        return abs(self._height(node.left) - self._height(node.right)) > BALANCING_FACTOR
+        return max(node_size(node.left), node_size(node.right)) > BALANCING_ALPHA * node.size
 
     def get_height(self):
         return self._height(self.root)
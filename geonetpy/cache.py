@@ -0,0 +1,130 @@
+"""
+Persistent cache of parsed and interpolated tracks
+
+Points of tracks are stored as .npy files named by key, key is hash of
+content hash of gpx file, interpolation distance, distance model and
+version of the algorithm (VERSION is increased whenever parsing or
+interpolation gives different points). Interpolated tracks are stored as
+.npz files with number of parsed points of the track. Size of the cache is
+bounded, least recently used files are removed first (modification time of
+a file is updated when it is read).
+"""
+
+import hashlib
+import logging
+import os
+import numpy as np
+from . import metrics
+
+# version of parsing and interpolation, part of the key of cached tracks
+VERSION = 1
+
+DEFAULT_MAX_SIZE = 1 << 30
+
+# extensions of cache files
+EXTENSIONS = ('.npy', '.npz')
+
+def default_path():
+    """GEONET_CACHE_DIR or geonetpy directory in user cache directory"""
+    if 'GEONET_CACHE_DIR' in os.environ:
+        return os.environ['GEONET_CACHE_DIR']
+    return os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'geonetpy')
+
+class TrackCache:
+    def __init__(self, path=None, max_size=DEFAULT_MAX_SIZE):
+        self.path = path if path is not None else default_path()
+        self.max_size = max_size
+        os.makedirs(self.path, exist_ok=True)
+
+        # size of cache files, counted since the directory was scanned by
+        # last eviction (None until then), files written by other processes
+        # sharing the cache are found by the next eviction
+        self.size = None
+
+    @staticmethod
+    def key(content_hash, max_distance=None, distance_model='haversine'):
+        """key of points of gpx file interpolated to max distance (None for parsed points)"""
+        params = f'{content_hash}:{max_distance}:{distance_model if max_distance is not None else ""}:{VERSION}'
+        return hashlib.sha256(params.encode('utf-8')).hexdigest()
+
+    def filepath(self, key, extension='.npy'):
+        return os.path.join(self.path, f'{key}{extension}')
+
+    def _read(self, filepath, read):
+        try:
+            value = read(filepath)
+            os.utime(filepath)
+        except (OSError, ValueError, KeyError):
+            metrics.count('cache.misses')
+            return None
+
+        metrics.count('cache.hits')
+        return value
+
+    def _write(self, filepath, write):
+        # written under temporary name, so readers never see partial file
+        tmp_filepath = f'{filepath}.{os.getpid()}.tmp'
+        with open(tmp_filepath, 'wb') as f:
+            write(f)
+
+        size = os.path.getsize(tmp_filepath)
+        try:
+            size -= os.path.getsize(filepath)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_filepath, filepath)
+
+        # directory is scanned only if the cache may be full
+        if self.size is not None:
+            self.size += size
+        if self.size is None or self.size > self.max_size:
+            self.evict()
+
+    def get(self, key, mmap_mode=None):
+        """cached array or None"""
+        return self._read(self.filepath(key), lambda filepath: np.load(filepath, mmap_mode=mmap_mode))
+
+    def put(self, key, points):
+        """stores array, least recently used arrays are evicted if cache is full"""
+        self._write(self.filepath(key), lambda f: np.save(f, np.asarray(points)))
+
+    def get_track(self, key):
+        """cached tuple (number of parsed points, interpolated points) or None"""
+        def read(filepath):
+            with np.load(filepath) as data:
+                return int(data['count']), data['points']
+
+        return self._read(self.filepath(key, '.npz'), read)
+
+    def put_track(self, key, count, points):
+        """stores interpolated points with number of parsed points of the track"""
+        self._write(self.filepath(key, '.npz'), lambda f: np.savez(f, count=count, points=np.asarray(points)))
+
+    def evict(self):
+        """removes least recently used files until size of cache is within limit"""
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(EXTENSIONS):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(entry[1] for entry in entries)
+        for _, file_size, filepath in sorted(entries):
+            if size <= self.max_size:
+                break
+            logging.debug('evicting %s from track cache', filepath)
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                # removed by other process sharing the cache
+                pass
+            size -= file_size
+            metrics.count('cache.evictions')
+
+        self.size = size
+
+    def clear(self):
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(EXTENSIONS):
+                os.remove(entry.path)
+        self.size = 0
@@ -0,0 +1,345 @@
+"""
+Columnar storage of net spots and edges
+
+Columns are numpy arrays which grow by doubling their capacity, so appends
+are amortized O(1) and whole columns are available as views without
+copying.
+"""
+
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+
+# hash of edges is grown when more than MAX_LOAD of its slots are used
+MAX_LOAD = 0.7
+
+# multiplier of fibonacci hashing (2^64 / golden ratio)
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+HASH_MASK = 0xFFFFFFFFFFFFFFFF
+
+def hash_capacity(size):
+    """power of two number of slots for hash of size keys (at most half full)"""
+    return 1 << max(4, (2 * size).bit_length())
+
+def hash_slot(key, capacity):
+    """slot of non-negative int key in hash of capacity (power of two) slots"""
+    return ((key * HASH_MULTIPLIER) & HASH_MASK) >> (65 - capacity.bit_length())
+
+def hash_slots(keys, capacity):
+    """vectorized hash_slot of int64 array of keys"""
+    shift = np.uint64(65 - capacity.bit_length())
+    return ((keys.astype(np.uint64) * np.uint64(HASH_MULTIPLIER)) >> shift).astype(np.int64)
+
+class GrowableArray:
+    def __init__(self, dtype, capacity=INITIAL_CAPACITY):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    @classmethod
+    def from_array(cls, data):
+        """wraps existing array (e.g. memory mapped), it is copied on first growth"""
+        array = cls(data.dtype, 0)
+        array.data = data
+        array.size = data.shape[0]
+        return array
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+    def __setitem__(self, index, value):
+        self.view()[index] = value
+
+    def reserve(self, capacity):
+        if capacity > self.data.shape[0]:
+            data = np.empty(max(capacity, 2 * self.data.shape[0]), dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+
+    def append(self, value):
+        self.reserve(self.size + 1)
+        self.data[self.size] = value
+        self.size += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype)
+        self.reserve(self.size + values.shape[0])
+        self.data[self.size:self.size + values.shape[0]] = values
+        self.size += values.shape[0]
+
+    def view(self):
+        return self.data[:self.size]
+
+class SpotTable:
+    """Spots (lat, lon, id, q) stored in columns
+
+    Spot ids generated by the net are 0, 1, 2, ... so row of a spot is equal
+    to its id and no lookup table is needed. Dict of rows is built only when
+    ids are not dense.
+    """
+
+    def __init__(self):
+        self.lat = GrowableArray(np.float64)
+        self.lon = GrowableArray(np.float64)
+        self.id = GrowableArray(np.int64)
+        self.q = GrowableArray(np.int32)
+        self.rows = None
+
+    @classmethod
+    def from_columns(cls, lat, lon, spot_id, q):
+        """table using existing arrays as its columns"""
+        table = cls()
+        table.lat = GrowableArray.from_array(lat)
+        table.lon = GrowableArray.from_array(lon)
+        table.id = GrowableArray.from_array(spot_id)
+        table.q = GrowableArray.from_array(q)
+
+        if not np.array_equal(spot_id, np.arange(spot_id.shape[0])):
+            table.rows = {int(i): r for r, i in enumerate(spot_id.tolist())}
+
+        return table
+
+    def __len__(self):
+        return len(self.id)
+
+    def append(self, lat, lon, spot_id, q=1):
+        row = len(self.id)
+
+        if self.rows is None and spot_id != row:
+            self.rows = {int(i): r for r, i in enumerate(self.id.view())}
+
+        if self.rows is not None:
+            self.rows[int(spot_id)] = row
+
+        self.lat.append(lat)
+        self.lon.append(lon)
+        self.id.append(spot_id)
+        self.q.append(q)
+
+        return row
+
+    def row(self, spot_id):
+        return int(spot_id) if self.rows is None else self.rows[int(spot_id)]
+
+    def inc(self, spot_id):
+        self.q.data[self.row(spot_id)] += 1
+
+    def get_q(self, spot_id):
+        return int(self.q.data[self.row(spot_id)])
+
+    def get_point(self, spot_id):
+        row = self.row(spot_id)
+        return [float(self.lat.data[row]), float(self.lon.data[row]), int(self.id.data[row])]
+
+    def columns(self):
+        """views of all columns (no data is copied)"""
+        return {
+            'lat': self.lat.view(),
+            'lon': self.lon.view(),
+            'id': self.id.view(),
+            'q': self.q.view()
+        }
+
+class EdgeTable:
+    """Edges (p1, p2, q) stored in int32 columns
+
+    Table behaves like dict (p1, p2) -> q, edges are deduplicated by open
+    addressing hash of ids packed to single int. Slots of the hash hold only
+    int32 rows (keys are compared in p1 and p2 columns), so the hash costs
+    8 - 16 bytes per edge. Hash of table created from existing columns is
+    built on first lookup.
+
+    Edges of simplified net are polylines, ids of spots between p1 and p2
+    are stored in via column (offsets of edges in via_offsets).
+
+    Index of edges of spots (sorted spot ids and rows of their edges) is
+    built on first lookup and dropped when an edge is added.
+    """
+
+    def __init__(self):
+        self.p1 = GrowableArray(np.int32)
+        self.p2 = GrowableArray(np.int32)
+        self.q = GrowableArray(np.int32)
+        self.via_offsets = None
+        self.via = None
+        self._slots = None
+        self._spot_edges = None
+
+    @classmethod
+    def from_columns(cls, p1, p2, q, via_offsets=None, via=None):
+        """table using existing arrays as its columns"""
+        table = cls()
+        table.p1 = GrowableArray.from_array(p1)
+        table.p2 = GrowableArray.from_array(p2)
+        table.q = GrowableArray.from_array(q)
+        if via_offsets is not None:
+            table.via_offsets = GrowableArray.from_array(via_offsets)
+            table.via = GrowableArray.from_array(via)
+        return table
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Table of polyline edges from lines (see simplify), lines which
+        would make duplicate edges (parallel lines, loops) are stored as
+        edges between consecutive spots, lines without via spots are
+        stored first, so such edges are always unique"""
+        table = cls()
+        table.via_offsets = GrowableArray(np.int64)
+        table.via_offsets.append(0)
+        table.via = GrowableArray(np.int64)
+
+        for line in sorted(lines, key=lambda line: len(line['spots'])):
+            spots = line['spots'] if line['spots'][0] <= line['spots'][-1] else line['spots'][::-1]
+            if spots[0] != spots[-1] and (spots[0], spots[-1]) not in table:
+                table.add_polyline(spots, line['q'])
+            else:
+                for a, b in zip(spots[:-1], spots[1:]):
+                    table.add_polyline([min(a, b), max(a, b)], line['q'])
+
+        return table
+
+    def add_polyline(self, spots, q):
+        """adds polyline edge, q of existing edge is increased"""
+        edge = (spots[0], spots[-1])
+        if edge in self:
+            self[edge] += q
+            return
+
+        self[edge] = q
+        self.via.extend(spots[1:-1])
+        self.via_offsets[-1] = len(self.via)
+
+    def get_via(self, row):
+        """ids of spots between p1 and p2 of edge in row"""
+        if self.via_offsets is None:
+            return []
+        return self.via[self.via_offsets[row]:self.via_offsets[row + 1]].tolist()
+
+    def spot_edges(self, spot_ids):
+        """sorted rows of edges with any of spots (ends or via spots)"""
+        if self._spot_edges is None:
+            rows = np.arange(len(self), dtype=np.int64)
+            ids = [self.p1.view(), self.p2.view()]
+            if self.via_offsets is not None:
+                ids.append(self.via.view())
+                rows = np.concatenate([rows, rows, np.repeat(rows, np.diff(self.via_offsets.view()))])
+            else:
+                rows = np.concatenate([rows, rows])
+            ids = np.concatenate(ids).astype(np.int64)
+            order = np.argsort(ids, kind='stable')
+            self._spot_edges = (ids[order], rows[order])
+
+        ids, rows = self._spot_edges
+        spot_ids = np.asarray(spot_ids, dtype=np.int64)
+        starts = np.searchsorted(ids, spot_ids, side='left')
+        ends = np.searchsorted(ids, spot_ids, side='right')
+        return np.unique(np.concatenate([rows[start:end] for start, end in zip(starts.tolist(), ends.tolist())] + [np.empty(0, dtype=np.int64)]))
+
+    def _build_slots(self, capacity):
+        """Hash of all rows, rows are inserted in vectorized rounds, the first
+        row of each free slot takes it and the other rows probe next slots"""
+        slots = np.full(capacity, -1, dtype=np.int32)
+        rows = np.arange(len(self), dtype=np.int64)
+        positions = hash_slots(self.keys(), capacity)
+
+        while rows.shape[0] > 0:
+            free = np.flatnonzero(slots[positions] == -1)
+            _, first = np.unique(positions[free], return_index=True)
+            taken = free[first]
+            slots[positions[taken]] = rows[taken]
+
+            left = np.ones(rows.shape[0], dtype=bool)
+            left[taken] = False
+            rows = rows[left]
+            positions = (positions[left] + 1) & (capacity - 1)
+
+        self._slots = slots
+
+    def _find(self, edge):
+        """tuple (slot, row) of edge, row is -1 if edge is not in table"""
+        if self._slots is None:
+            self._build_slots(hash_capacity(len(self)))
+
+        slots = self._slots
+        mask = slots.shape[0] - 1
+        a, b = int(edge[0]), int(edge[1])
+        slot = hash_slot((a << 32) | b, mask + 1)
+
+        # linear probing until the edge or free slot is found
+        while True:
+            row = int(slots[slot])
+            if row < 0 or (self.p1.data[row] == a and self.p2.data[row] == b):
+                return slot, row
+            slot = (slot + 1) & mask
+
+    @staticmethod
+    def key(edge):
+        return (int(edge[0]) << 32) | int(edge[1])
+
+    def keys(self):
+        """packed keys (see key) of all edges as int64 array"""
+        return (self.p1.view().astype(np.int64) << 32) | self.p2.view().astype(np.int64)
+
+    def __len__(self):
+        return len(self.q)
+
+    def __contains__(self, edge):
+        return self._find(edge)[1] >= 0
+
+    def __getitem__(self, edge):
+        row = self._find(edge)[1]
+        if row < 0:
+            raise KeyError(edge)
+        return int(self.q.data[row])
+
+    def __setitem__(self, edge, q):
+        slot, row = self._find(edge)
+        if row >= 0:
+            self.q.data[row] = q
+        else:
+            self._append(slot, edge, q)
+
+    def add(self, edge, q=1):
+        """adds q to edge (edge is created if it doesn't exist), returns true
+        if the edge was created"""
+        slot, row = self._find(edge)
+        if row >= 0:
+            self.q.data[row] += q
+            return False
+
+        self._append(slot, edge, q)
+        return True
+
+    def _append(self, slot, edge, q):
+        row = len(self.q)
+        self.p1.append(edge[0])
+        self.p2.append(edge[1])
+        self.q.append(q)
+        if self.via_offsets is not None:
+            self.via_offsets.append(len(self.via))
+        self._spot_edges = None
+
+        if row + 1 > MAX_LOAD * self._slots.shape[0]:
+            self._build_slots(hash_capacity(row + 1))
+        else:
+            self._slots[slot] = row
+
+    def __iter__(self):
+        return zip(self.p1.view().tolist(), self.p2.view().tolist())
+
+    def items(self):
+        return zip(iter(self), self.q.view().tolist())
+
+    def columns(self):
+        """views of all columns (no data is copied)"""
+        columns = {
+            'p1': self.p1.view(),
+            'p2': self.p2.view(),
+            'q': self.q.view()
+        }
+        if self.via_offsets is not None:
+            columns['via_offsets'] = self.via_offsets.view()
+            columns['via'] = self.via.view()
+        return columns
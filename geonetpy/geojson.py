@@ -1,49 +1,113 @@
 """
 Geojson tools
+
+Feature collections are written by GeoJsonWriter feature by feature to a
+file handle, features are generated from arrays in chunks, so memory used
+by export doesn't depend on size of exported data.
 """
 
+import io
 import json
+import numpy as np
+
+# number of rows converted from arrays to features at once
+CHUNK_SIZE = 10000
 
 def point_to_geojson(point):
     """https://macwright.com/lonlat/"""
     return [point[1], point[0]]
 
+def round_coordinates(coordinates, precision=None):
+    """rounds list of coordinates to precision (number of decimal places)"""
+    if precision is None:
+        return coordinates
+    return [round(c, precision) for c in coordinates]
 
-def tracks_to_geojson(tracks, lines=False):
-    geos = []
+def coordinates_list(lat, lon, precision=None):
+    """arrays of lat and lon -> list of [lon, lat] coordinates"""
+    coordinates = np.column_stack([lon, lat]).astype(float)
+    if precision is not None:
+        coordinates = np.round(coordinates, precision)
+    return coordinates.tolist()
 
-    for track_ix, points in enumerate(tracks):
+def coordinates_chunks(lat, lon, precision=None, chunk_size=CHUNK_SIZE):
+    """Generator of (start row, list of [lon, lat] coordinates) for chunks of
+    lat and lon arrays"""
+    for start in range(0, len(lat), chunk_size):
+        yield start, coordinates_list(lat[start:start + chunk_size], lon[start:start + chunk_size], precision)
 
-        for point in points:
+class GeoJsonWriter:
+    """Writes feature collection to file handle, features are written one by
+    one, compact output has no indentation and whitespace"""
 
-            pt = {
-                'type': 'Feature',
-                'properties': {
-                    'track': track_ix
-                },
-                'geometry': {
-                    'coordinates': point_to_geojson(point),
-                    'type': 'Point'
-                },
-            }
-            geos.append(pt)
+    def __init__(self, output, compact=False):
+        self.output = output
+        self.indent = None if compact else 4
+        self.separators = (',', ':') if compact else None
+        self.count = 0
+
+    def __enter__(self):
+        self.output.write('{"type":"FeatureCollection","features":[' if self.indent is None else '{"type": "FeatureCollection", "features": [')
+        return self
+
+    def __exit__(self, *args):
+        self.output.write(']}' if self.indent is None else '\n]}')
+
+    def write(self, feature):
+        if self.count > 0:
+            self.output.write(',')
+        if self.indent is not None:
+            self.output.write('\n')
+        self.output.write(json.dumps(feature, indent=self.indent, separators=self.separators))
+        self.count += 1
+
+    def write_all(self, features):
+        for feature in features:
+            self.write(feature)
+
+def write_geojson(output, features, compact=False):
+    """writes features as feature collection to file handle"""
+    with GeoJsonWriter(output, compact) as writer:
+        writer.write_all(features)
+
+def to_geojson(features, compact=False):
+    """features as feature collection string"""
+    output = io.StringIO()
+    write_geojson(output, features, compact)
+    return output.getvalue()
+
+def tracks_features(tracks, lines=False, precision=None):
+    """generator of point features (and line features) of tracks"""
+
+    for track_ix, points in enumerate(tracks):
+        points = np.asarray(points)
+        if len(points) == 0:
+            continue
+
+        for _, coordinates in coordinates_chunks(points[:, 0], points[:, 1], precision):
+            for point in coordinates:
+                yield {
+                    'type': 'Feature',
+                    'properties': {
+                        'track': track_ix
+                    },
+                    'geometry': {
+                        'coordinates': point,
+                        'type': 'Point'
+                    },
+                }
 
         if lines:
-            line = {
+            yield {
                 'type': 'Feature',
                 'properties': {
                     'track': track_ix
                 },
                 'geometry': {
-                    'coordinates': [point_to_geojson(p) for p in points],
+                    'coordinates': coordinates_list(points[:, 0], points[:, 1], precision),
                     'type': 'LineString'
                 },
             }
-            geos.append(line)
-
-    geometries = {
-        'type': 'FeatureCollection',
-        'features': geos,
-    }
 
-    return json.dumps(geometries, indent=4)
+def tracks_to_geojson(tracks, lines=False, precision=None, compact=False):
+    return to_geojson(tracks_features(tracks, lines, precision), compact)
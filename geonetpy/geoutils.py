@@ -1,5 +1,6 @@
 
 import math
+import numpy as np
 
 # Radius of the Earth in meters
 EARTH_RADIUS = 6371.0 * 1000
@@ -24,3 +25,36 @@ def haversine_distance(point1, point2):
     distance = EARTH_RADIUS * c
 
     return distance
+
+def haversine_distances(points1, points2):
+    """Vectorized haversine distance (in meters), arguments are arrays of
+    [lat, lon] rows which are broadcasted against each other"""
+
+    points1 = np.radians(np.asarray(points1, dtype=float))
+    points2 = np.radians(np.asarray(points2, dtype=float))
+
+    lat1 = points1[..., 0]
+    lat2 = points2[..., 0]
+    dlat = lat2 - lat1
+    dlon = points2[..., 1] - points1[..., 1]
+
+    a = np.sin(dlat / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return EARTH_RADIUS * c
+
+def to_xyz(points):
+    """Converts array of [lat, lon] rows to points on unit sphere, euclidean
+    (chord) distance of such points is monotonic with haversine distance"""
+
+    points = np.radians(np.asarray(points, dtype=float))
+    lat = points[..., 0]
+    lon = points[..., 1]
+    cos_lat = np.cos(lat)
+
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+def chord_length(distance):
+    """chord length on unit sphere (see to_xyz) for haversine distance in
+    meters, multiplied by EARTH_RADIUS it is chord length in meters"""
+    return 2 * math.sin(min(distance / EARTH_RADIUS, math.pi) / 2)
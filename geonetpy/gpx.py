@@ -0,0 +1,69 @@
+"""
+Streaming reader of gpx files
+
+Points are read from lat/lon attributes of trkpt elements by iterparse
+directly into growable numpy columns, no object tree of the whole document
+is built (parsed elements are dropped as soon as they are closed).
+Files compressed by gzip or bzip2 are detected by their magic bytes and
+decompressed on the fly.
+"""
+
+import bz2
+import gzip
+import hashlib
+import xml.etree.ElementTree as ET
+import numpy as np
+from .columns import GrowableArray
+
+GZIP_MAGIC = b'\x1f\x8b'
+BZIP2_MAGIC = b'BZh'
+
+def open_gpx(filename):
+    """opens (possibly compressed) gpx file for binary reading"""
+
+    with open(filename, 'rb') as f:
+        magic = f.read(3)
+
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.open(filename, 'rb')
+
+    if magic.startswith(BZIP2_MAGIC):
+        return bz2.open(filename, 'rb')
+
+    return open(filename, 'rb')
+
+def content_hash(filename):
+    """sha256 of decompressed content of gpx file, so the same track is
+    recognized even if it is compressed differently"""
+    digest = hashlib.sha256()
+    with open_gpx(filename) as gpx_file:
+        for chunk in iter(lambda: gpx_file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def local_name(tag):
+    """tag without namespace, e.g. {http://www.topografix.com/GPX/1/1}trkpt -> trkpt"""
+    return tag.rsplit('}', 1)[-1]
+
+def read_points(filename):
+    """Reads points of all tracks in gpx file, returns array of [lat, lon] rows"""
+
+    lat = GrowableArray(np.float64)
+    lon = GrowableArray(np.float64)
+
+    with open_gpx(filename) as gpx_file:
+        # stack of open elements, every element is removed from its parent
+        # when it is closed, so memory doesn't grow with size of the file
+        stack = []
+        for event, elem in ET.iterparse(gpx_file, events=('start', 'end')):
+            if event == 'start':
+                stack.append(elem)
+                if local_name(elem.tag) == 'trkpt':
+                    lat.append(float(elem.attrib['lat']))
+                    lon.append(float(elem.attrib['lon']))
+            else:
+                stack.pop()
+                if stack:
+                    stack[-1].remove(elem)
+
+    return np.column_stack([lat.view(), lon.view()])
@@ -0,0 +1,103 @@
+"""
+Spatial hash of geographic points
+
+Points are stored in dict of cells. Rows of cells have constant height in
+meters, width of cells (in degrees of longitude) is computed for each row
+at its poleward edge, so each cell is at least cell_size meters wide and
+all points within cell_size meters of query point are in at most 9 cells
+(3 rows x 3 columns). Columns are not wrapped at antimeridian.
+"""
+
+import math
+from .geoutils import haversine_distance, EARTH_RADIUS
+from .balltree import query_nearest
+
+# length of one degree of latitude in meters
+ONE_DEGREE = 2 * math.pi * EARTH_RADIUS / 360
+
+class GridIndex:
+    def __init__(self, points, cell_size):
+        self.cell_size = cell_size
+        self.row_height = cell_size / ONE_DEGREE
+        self.cells = {}
+        self.size = 0
+
+        for point in points:
+            self.add_point(point)
+
+    def _row(self, lat):
+        return math.floor(lat / self.row_height)
+
+    def _column_width(self, row):
+        # latitude of poleward edge of the row
+        lat = min(max(abs(row * self.row_height), abs((row + 1) * self.row_height)), 90)
+        meters_per_degree = ONE_DEGREE * math.cos(math.radians(lat))
+
+        if meters_per_degree * 360 <= self.cell_size:
+            return 360
+
+        return self.cell_size / meters_per_degree
+
+    def _column(self, lon, width):
+        return math.floor((lon + 180) / width)
+
+    def get_cell(self, point):
+        row = self._row(point[0])
+        return (row, self._column(point[1], self._column_width(row)))
+
+    def add_point(self, point):
+        self.cells.setdefault(self.get_cell(point), []).append((point, self.size))
+        self.size += 1
+
+    def get_cells(self, query_point):
+        """keys of cells which can contain points within cell_size from query point"""
+        row = self._row(query_point[0])
+        cells = []
+
+        for r in (row - 1, row, row + 1):
+            width = self._column_width(r)
+            first = self._column(query_point[1] - width, width)
+            last = self._column(query_point[1] + width, width)
+            cells.extend((r, c) for c in range(first, last + 1))
+
+        return cells
+
+    def get_rect_cells(self, rect):
+        """keys of cells which can contain points inside lat/lon rect (see Rect)"""
+        min_lat, min_lon, max_lat, max_lon = rect.get_bounds()
+        cells = []
+
+        for r in range(self._row(min_lat), self._row(max_lat) + 1):
+            width = self._column_width(r)
+            cells.extend((r, c) for c in range(self._column(min_lon, width), self._column(max_lon, width) + 1))
+
+        return cells
+
+    def query_rect(self, rect):
+        """points inside lat/lon rect (see Rect)"""
+        return [point for cell in self.get_rect_cells(rect) for point, _ in self.cells.get(cell, []) if rect.contains(point)]
+
+    def query(self, query_point, k=1):
+        """k nearest points as list of tuples (distance, point, index), only
+        points within cell_size meters from query point are returned"""
+        nearest = []
+
+        for cell in self.get_cells(query_point):
+            for point, index in self.cells.get(cell, []):
+                distance = haversine_distance(point, query_point)
+                if distance <= self.cell_size:
+                    nearest.append((distance, point, index))
+
+        nearest.sort(key=lambda x: x[0])
+
+        return nearest[:k]
+
+    def query_nearest(self, points, max_distance=None):
+        return query_nearest(self, points, max_distance)
+
+    def get_height(self):
+        # grid has single level of cells
+        return 1
+
+    def get_points(self):
+        return [point for cell in self.cells.values() for point, _ in cell]
@@ -5,11 +5,18 @@ Tools for adding points to existing geographic tracks
 import math
 from geopy import distance
 import numpy as np
+from .geoutils import haversine_distances
 
 # Constants
 earth_radius_meters = 6378160
 one_degree = (2 * math.pi * earth_radius_meters) / 360  # 111.319 km
 
+# Distance models for measuring length of track segments
+DISTANCE_MODELS = ['haversine', 'geodesic']
+
+# last point closer than this (meters) to the last sample is not appended
+SAMPLE_EPSILON = 1e-6
+
 # Bearing calculation
 def bearing(point1, point2):
     lat1r = math.radians(point1[0])
@@ -21,8 +28,45 @@ def bearing(point1, point2):
 
     return math.degrees(math.atan2(y, x))
 
+def segment_lengths(points, distance_model='haversine'):
+    """Lengths (in meters) of segments between consecutive points"""
+    if distance_model == 'geodesic':
+        return np.array([distance.distance(p1, p2).m for p1, p2 in zip(points[:-1], points[1:])])
+
+    if distance_model == 'haversine':
+        return haversine_distances(points[:-1], points[1:])
+
+    raise ValueError(f'unknown distance model: {distance_model}')
+
 # Interpolating points
-def interpolate_distance(points, dist):
+def interpolate_distance(points, dist, distance_model='haversine'):
+    """Resamples track to points placed each dist meters along the track,
+    last point of the track is always included, result is array of [lat, lon]
+    rows (empty for empty track)"""
+
+    if len(points) == 0:
+        return np.empty((0, 2))
+
+    points = np.asarray(points, dtype=float)[:, :2]
+
+    # cumulative length of the track at each of points
+    track_length = np.concatenate([[0], np.cumsum(segment_lengths(points, distance_model))])
+
+    samples = np.arange(int(track_length[-1] // dist) + 1) * dist
+
+    result = np.column_stack([
+        np.interp(samples, track_length, points[:, 0]),
+        np.interp(samples, track_length, points[:, 1])
+    ])
+
+    # last point is not repeated if length of the track is multiple of dist
+    if track_length[-1] - samples[-1] <= SAMPLE_EPSILON:
+        return result
+
+    return np.vstack([result, points[-1]])
+
+# Original step by step interpolation, kept for comparison
+def interpolate_distance_stepwise(points, dist):
     result = []
 
     if len(points) == 0:
@@ -0,0 +1,245 @@
+"""
+KD tree of geographic points
+
+Points are split on coordinates of their projection to the unit sphere
+(x, y, z). Chord distance is monotonic with haversine distance, so nearest
+points by chord are nearest points by haversine distance too, results are
+ordered and reported by haversine distance in meters.
+
+Points are stored in columns (lat, lon, id), nothing is kept per point as
+python object. Columns are indexed by a forest of static kd trees (scipy
+cKDTree) built over consecutive blocks of rows (logarithmic method). Added
+points wait in a buffer of at most BUFFER_SIZE rows searched by brute force,
+full buffer becomes a new block and blocks which are not larger than the
+new block are merged into it. There are O(log n) blocks and each point is
+rebuilt O(log n) times, so insertion cost is amortized logarithmic.
+
+Static trees can be stored as arrays (see to_arrays) of their nodes and
+order of rows, so restored trees (see from_columns) aren't built again.
+Nodes are in the layout of cKDTree of the installed scipy version, trees
+stored by another version (see NODES_FORMAT) are built from columns.
+"""
+
+import math
+import numpy as np
+import scipy.spatial
+from .columns import GrowableArray
+from .geoutils import haversine_distance, haversine_distances, to_xyz, chord_length
+from . import metrics
+
+# added points are searched by brute force until there is this many of them
+BUFFER_SIZE = 256
+
+# maximal number of points in leaves of static trees
+LEAF_SIZE = 16
+
+# layout of stored nodes of static trees
+NODES_FORMAT = f'cKDTree {scipy.__version__}, leaf size {LEAF_SIZE}'
+
+def sphere_bounds(rect):
+    """Bounds (min xyz, max xyz) of projection of lat/lon rect to unit sphere,
+    extremes of x and y are in corners or where rect crosses meridians 0, 90,
+    180 and -90, cos of latitude is the highest at latitude closest to 0"""
+    min_lat, min_lon, max_lat, max_lon = (math.radians(b) for b in rect.get_bounds())
+
+    cos_lat = [math.cos(min_lat), math.cos(max_lat)]
+    if min_lat <= 0 <= max_lat:
+        cos_lat.append(1.0)
+
+    lons = [min_lon, max_lon] + [m * math.pi / 2 for m in range(-2, 3) if min_lon <= m * math.pi / 2 <= max_lon]
+
+    # x = cos(lat) cos(lon), y = cos(lat) sin(lon)
+    x = [c * math.cos(lon) for c in cos_lat for lon in lons]
+    y = [c * math.sin(lon) for c in cos_lat for lon in lons]
+
+    return [min(x), min(y), math.sin(min_lat)], [max(x), max(y), math.sin(max_lat)]
+
+def to_sphere(point):
+    """[lat, lon, ...] -> (x, y, z) on unit sphere"""
+    lat = math.radians(point[0])
+    lon = math.radians(point[1])
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat))
+
+def box_distance(xyz, mins, maxes):
+    """euclidean distance of point from axis aligned box"""
+    return math.sqrt(sum(max(0, low - c, c - high) ** 2 for c, low, high in zip(xyz, mins, maxes)))
+
+class KDTree:
+    def __init__(self, points):
+        points = list(points)
+        self.lat = GrowableArray.from_array(np.array([p[0] for p in points], dtype=np.float64))
+        self.lon = GrowableArray.from_array(np.array([p[1] for p in points], dtype=np.float64))
+        self.ids = GrowableArray.from_array(np.array([p[2] for p in points], dtype=np.int64))
+
+        # static trees as tuples (first row, end row, cKDTree, bounding box)
+        self.blocks = [self._build(0, len(points))] if points else []
+
+    @classmethod
+    def from_columns(cls, lat, lon, ids, arrays=None):
+        """Tree of points stored in columns (arrays are not copied until a
+        point is added), arrays are static trees (see to_arrays), nodes of
+        trees are restored if they are given, otherwise trees are built
+        (all points are indexed by one tree if arrays are not given)"""
+        tree = cls([])
+        tree.lat = GrowableArray.from_array(lat)
+        tree.lon = GrowableArray.from_array(lon)
+        tree.ids = GrowableArray.from_array(ids)
+
+        arrays = arrays if arrays is not None else {'blocks': np.array([len(tree.lat)], dtype=np.int64)}
+        ends = arrays['blocks'].tolist()
+        for i, (start, end) in enumerate(zip([0] + ends[:-1], ends)):
+            if end <= start:
+                continue
+            if 'nodes' in arrays:
+                nodes = arrays['nodes'][arrays['node_offsets'][i]:arrays['node_offsets'][i + 1]]
+                tree.blocks.append(tree._restore(start, end, nodes, arrays['indices'][start:end]))
+            else:
+                tree.blocks.append(tree._build(start, end))
+
+        return tree
+
+    @property
+    def size(self):
+        return len(self.lat)
+
+    def _build(self, start, end):
+        xyz = to_xyz(np.column_stack([self.lat[start:end], self.lon[start:end]]))
+        tree = scipy.spatial.cKDTree(xyz, leafsize=LEAF_SIZE)
+        return start, end, tree, (tree.mins.tolist(), tree.maxes.tolist())
+
+    def _restore(self, start, end, nodes, indices):
+        """static tree of rows from its stored nodes and order of rows"""
+        xyz = to_xyz(np.column_stack([self.lat[start:end], self.lon[start:end]]))
+        tree = scipy.spatial.cKDTree.__new__(scipy.spatial.cKDTree)
+        # state of pickled cKDTree: nodes, data, n, m, leafsize, maxes, mins, indices, boxsize, boxsize data
+        tree.__setstate__((np.asarray(nodes).view('S1'), xyz, end - start, 3, LEAF_SIZE, xyz.max(axis=0), xyz.min(axis=0), np.asarray(indices, dtype=np.intp), None, None))
+        return start, end, tree, (tree.mins.tolist(), tree.maxes.tolist())
+
+    def _buffer_start(self):
+        return self.blocks[-1][1] if self.blocks else 0
+
+    def _point(self, row):
+        return [float(self.lat.data[row]), float(self.lon.data[row]), int(self.ids.data[row])]
+
+    def get_blocks(self):
+        """end rows of static trees (layout of the forest, see to_arrays)"""
+        return np.array([block[1] for block in self.blocks], dtype=np.int64)
+
+    def to_arrays(self):
+        """Static trees as dict of arrays: end rows of trees (blocks), their
+        nodes (concatenated, tree i is nodes[node_offsets[i]:node_offsets[i + 1]])
+        and order of rows (indices, relative to first row of each tree)"""
+        states = [tree.__getstate__() for _, _, tree, _ in self.blocks]
+        nodes = [np.asarray(state[0]).view(np.uint8) for state in states]
+        node_offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+        node_offsets[1:] = np.cumsum([len(n) for n in nodes])
+
+        return {
+            'blocks': self.get_blocks(),
+            'node_offsets': node_offsets,
+            'nodes': np.concatenate(nodes) if nodes else np.empty(0, dtype=np.uint8),
+            'indices': np.concatenate([state[7] for state in states]).astype(np.int64) if states else np.empty(0, dtype=np.int64)
+        }
+
+    def query(self, query_point, k=1):
+        """k nearest points as list of tuples (distance, point, index), static
+        trees whose bounding box is farther than k-th nearest candidate are
+        skipped (blocks of tracks added later are spatially compact)"""
+        xyz = to_sphere(query_point)
+
+        # candidates (chord distance, row), all rows of the buffer are candidates
+        rows = np.arange(self._buffer_start(), self.size, dtype=np.int64)
+        chords = np.linalg.norm(to_xyz(np.column_stack([self.lat[rows], self.lon[rows]])) - xyz, axis=-1)
+        candidates = sorted(zip(chords.tolist(), rows.tolist()))[:k]
+
+        for start, end, tree, bounds in self.blocks:
+            if len(candidates) == k and box_distance(xyz, *bounds) > candidates[-1][0]:
+                continue
+            chord, ix = tree.query(xyz, k=min(k, end - start))
+            candidates.extend(zip(np.atleast_1d(chord).tolist(), (start + np.atleast_1d(ix)).tolist()))
+            candidates = sorted(candidates)[:k]
+
+        nearest = [(haversine_distance(self._point(row), query_point), self._point(row), row) for _, row in candidates]
+        nearest.sort(key=lambda x: x[0])
+
+        return nearest
+
+    def query_nearest(self, points, max_distance=None):
+        """Nearest point of each of points (array of [lat, lon] rows) as tuple
+        of arrays (distances in meters, ids of nearest points), all points
+        are looked up by one vectorized query of each static tree, distance
+        is inf and id -1 if there is no point (within max distance)"""
+        points = np.asarray(points, dtype=np.float64)[:, :2]
+        xyz = to_xyz(points)
+        chords = np.full(points.shape[0], np.inf)
+        rows = np.full(points.shape[0], -1, dtype=np.int64)
+
+        trees = list(self.blocks)
+        if self.size > self._buffer_start():
+            trees.append(self._build(self._buffer_start(), self.size))
+
+        # search of trees is bounded, points far from all spots are cheap
+        upper_bound = chord_length(max_distance) * (1 + 1e-9) if max_distance is not None else np.inf
+
+        for start, _, tree, _ in trees:
+            chord, ix = tree.query(xyz, distance_upper_bound=upper_bound)
+            closer = chord < chords
+            chords[closer] = chord[closer]
+            rows[closer] = start + ix[closer]
+
+        found = rows >= 0
+        distances = np.full(points.shape[0], np.inf)
+        distances[found] = haversine_distances(points[found], np.column_stack([self.lat[rows[found]], self.lon[rows[found]]]))
+        ids = np.full(points.shape[0], -1, dtype=np.int64)
+        ids[found] = self.ids[rows[found]]
+
+        return distances, ids
+
+    def query_rect(self, rect):
+        """points inside lat/lon rect (see Rect), candidates are points of
+        static trees inside cube enclosing bounds of rect on unit sphere"""
+        low, high = sphere_bounds(rect)
+        center = [(a + b) / 2 for a, b in zip(low, high)]
+
+        # cube is widened by rounding error of projection
+        half_size = max((b - a) / 2 for a, b in zip(low, high)) + 1e-12
+
+        candidates = [np.arange(self._buffer_start(), self.size, dtype=np.int64)]
+        for start, _, tree, _ in self.blocks:
+            candidates.append(start + np.asarray(tree.query_ball_point(center, half_size, p=np.inf), dtype=np.int64))
+
+        rows = np.concatenate(candidates)
+        lat = self.lat[rows]
+        lon = self.lon[rows]
+        min_lat, min_lon, max_lat, max_lon = rect.get_bounds()
+        inside = rows[(lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)]
+
+        return [self._point(row) for row in inside.tolist()]
+
+    def add_point(self, point):
+        self.lat.append(point[0])
+        self.lon.append(point[1])
+        self.ids.append(point[2])
+
+        start = self._buffer_start()
+        if self.size - start < BUFFER_SIZE:
+            return
+
+        # full buffer becomes new block, blocks not larger than the new one are merged into it
+        while self.blocks and self.blocks[-1][1] - self.blocks[-1][0] <= self.size - start:
+            start = self.blocks.pop()[0]
+            metrics.count('kdtree.merges')
+
+        self.blocks.append(self._build(start, self.size))
+
+    def get_height(self):
+        """height of the highest static tree (median splits to leaves of at
+        most LEAF_SIZE points), buffer counts as single level"""
+        heights = [max(0, math.ceil(math.log2((end - start) / LEAF_SIZE))) + 1 for start, end, _, _ in self.blocks]
+        if self.size > self._buffer_start():
+            heights.append(1)
+        return max(heights, default=0)
+
+    def get_points(self):
+        return [self._point(row) for row in range(self.size)]
@@ -0,0 +1,108 @@
+"""
+Loading of gpx tracks
+
+Parsing and interpolation of tracks is independent for each file, so it can
+run in a pool of processes. Tracks are always returned in order of files,
+metrics recorded by workers are merged to metrics of the main process.
+"""
+
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from . import gpx, interpolation, metrics
+
+# cache of worker process of load_tracks, it is kept between tasks, so the
+# worker keeps size of the cache
+_worker = {}
+
+def read_points(filename, cache=None, content_hash=None):
+    """parsed points of gpx file, from cache (see TrackCache) if available"""
+
+    key = cache.key(content_hash) if cache is not None else None
+    points = cache.get(key) if cache is not None else None
+    if points is None:
+        with metrics.timer('gpx.parse'):
+            points = gpx.read_points(filename)
+        if cache is not None:
+            cache.put(key, points)
+
+    return points
+
+def load_track(filename, max_distance=None, distance_model='haversine', cache=None, content_hash=None):
+    """Reads points of gpx file (may be gzip or bzip2 compressed), points are interpolated if max distance is
+    specified, returns tuple (filename, number of points in file, points, content hash). Parsed and
+    interpolated points are stored to cache (see TrackCache) and read from it next time, content hash of
+    the file (see gpx.content_hash) is computed if not given, so it is computed by worker processes of
+    load_tracks."""
+
+    if content_hash is None:
+        content_hash = gpx.content_hash(filename)
+    key = cache.key(content_hash, max_distance, distance_model) if cache is not None and max_distance is not None else None
+    cached = cache.get_track(key) if key is not None else None
+
+    if cached is not None:
+        count, points = cached
+    else:
+        points = read_points(filename, cache, content_hash)
+        count = points.shape[0]
+
+        if max_distance is not None:
+            with metrics.timer('interpolation'):
+                points = interpolation.interpolate_distance(points, max_distance, distance_model)
+            if key is not None:
+                cache.put_track(key, count, points)
+
+    metrics.count('points.parsed', count)
+    metrics.count('points.interpolated', points.shape[0])
+
+    return filename, count, points, content_hash
+
+def new_tracks(files, known_hashes=()):
+    """Returns list of tuples (filename, content hash) of files whose content
+    is not in known hashes, files repeating content of previous files are
+    skipped too"""
+    known_hashes = set(known_hashes)
+    result = []
+    for filename in files:
+        content_hash = gpx.content_hash(filename)
+        if content_hash in known_hashes:
+            logging.info('skipping %s, track is already in the net', filename)
+            continue
+        known_hashes.add(content_hash)
+        result.append((filename, content_hash))
+    return result
+
+def _init_worker(cache):
+    _worker['cache'] = cache
+
+def _load_worker_track(filename, max_distance, distance_model, content_hash):
+    return load_track(filename, max_distance, distance_model, _worker['cache'], content_hash)
+
+def load_tracks(files, max_distance=None, workers=1, distance_model='haversine', cache=None):
+    """Generator of loaded tracks (see load_track), files are processed by
+    pool of workers processes if workers > 1, number of tracks waiting for
+    the consumer is limited to keep memory bounded, files are file names or
+    tuples (file name, content hash) of new_tracks (hash is not computed
+    again)"""
+
+    files = [(filename, None) if isinstance(filename, str) else filename for filename in files]
+
+    if workers <= 1:
+        for filename, content_hash in files:
+            yield load_track(filename, max_distance, distance_model, cache, content_hash)
+        return
+
+    def result(future):
+        track, worker_metrics = future.result()
+        metrics.merge(worker_metrics)
+        return track
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cache,)) as executor:
+        pending = deque()
+        for filename, content_hash in files:
+            pending.append(executor.submit(metrics.collect, metrics.is_enabled(), _load_worker_track, filename, max_distance, distance_model, content_hash))
+            if len(pending) >= 2 * workers:
+                yield result(pending.popleft())
+
+        while pending:
+            yield result(pending.popleft())
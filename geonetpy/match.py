@@ -1,7 +1,8 @@
 """
 Tools for matching (comparing) geographic tracks
 
-Issue 1 - scipy KD tree uses euclidean distance
+Issue 1 - scipy KD tree uses euclidean distance (solved by tolerance_m, points
+are projected to sphere and tolerance is chord length in meters)
 * https://stackoverflow.com/questions/49266244/kdtree-is-returning-points-outside-of-radius
 * https://pysal.org/libpysal/ -> possibility to use Arc + radius for KDTree
 * https://stackoverflow.com/questions/10549402/kdtree-for-longitude-latitude
@@ -35,20 +36,60 @@ nearest_cities = cities['name'].iloc[indices]
 import json
 import logging
 import scipy.spatial
+import scipy.sparse
+import scipy.sparse.csgraph
 import scipy.cluster.hierarchy
 import numpy as np
-from geopy import distance
+from .geoutils import haversine_distances, to_xyz, chord_length, EARTH_RADIUS
 
+# clustering of matching points, segments - connected components of
+# neighbouring and consecutive points (linear memory), hierarchical - scipy
+# fclusterdata (builds distance matrix of all matching points)
+CLUSTERINGS = ['segments', 'hierarchical']
 
-def match(a, b, tolerance):
-    """ Matching two GPX-tracks"""
+def cluster_segments(all_points, matches, pairs):
+    """Clusters matching points into contiguous segments
+
+    Matching points are joined with their neighbours (pairs of points within
+    tolerance found by KD tree) and with consecutive matching points of the
+    same track. Clusters are connected components of such graph (union-find),
+    they are numbered from 1 as clusters of fclusterdata.
+    """
+
+    matching_ix = np.nonzero(matches)[0]
+    position = np.full(len(all_points), -1)
+    position[matching_ix] = np.arange(len(matching_ix))
+
+    pairs = pairs[matches[pairs[:, 0]] & matches[pairs[:, 1]]]
+    consecutive = np.nonzero(matches[:-1] & matches[1:] & (all_points[:-1, 2] == all_points[1:, 2]))[0]
+
+    rows = np.concatenate([position[pairs[:, 0]], position[consecutive]])
+    cols = np.concatenate([position[pairs[:, 1]], position[consecutive + 1]])
+    graph = scipy.sparse.coo_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(matching_ix), len(matching_ix)))
+
+    _, labels = scipy.sparse.csgraph.connected_components(graph, directed=False)
+
+    return labels + 1
+
+
+def match(a, b, tolerance, clustering='segments', tolerance_m=None):
+    """ Matching two GPX-tracks
+
+    Tolerance is distance in degrees of lat/lon coordinates. If tolerance_m
+    is specified, points are matched in meters instead: tracks are projected
+    to sphere of earth radius and tolerance is length of chord for arc of
+    tolerance_m meters (chord length is monotonic with arc length).
+    """
+
+    if clustering not in CLUSTERINGS:
+        raise ValueError(f'unknown clustering: {clustering}')
 
     points_a = np.vstack(np.asarray(a))
     points_b = np.vstack(np.asarray(b))
 
     all_tracks = [points_a, points_b]
-    logging.debug('shape a: %d', points_a.shape)
-    logging.debug('shape b: %d', points_b.shape)
+    logging.debug('shape a: %s', points_a.shape)
+    logging.debug('shape b: %s', points_b.shape)
 
     all_points = np.vstack([np.hstack([points, np.full((points.shape[0], 1), i)]) for i, points in enumerate(all_tracks)])
 
@@ -57,7 +98,6 @@ def match(a, b, tolerance):
 
     # Combine indices and all points array (add index as 4th dimension)
     all_points = np.column_stack((all_points, indexes))
-    logging.debug(all_points)
 
     # all_points has following structure now:
     # [
@@ -65,127 +105,108 @@ def match(a, b, tolerance):
     #    ...
     # ]
 
-    logging.debug('all_pts (ix: coordinates):')
-    for i, v in enumerate(all_points):
-        logging.debug('%d: %s', i, v)
-
-    tree = scipy.spatial.KDTree(all_points[:, :2])
-    # tree = pysal.cg.KDTree(all_points[:, :2], distance_metric='Arc', radius=pysal.cg.RADIUS_EARTH_MILES)
-
     # note: [:, :2] removes third coordinate (label/index)
-    # find nearest points (circle is given by tolerance) around each of the points
-    points_within_tolerance = tree.query_ball_point(all_points[:, :2], tolerance)
-
-    logging.debug("points_within_tolerance (point ix -> ix of points in tolearance):")
-    for i, v in enumerate(points_within_tolerance):
-        logging.debug('%d: %s', i, v)
+    if tolerance_m is not None:
+        coordinates = to_xyz(all_points[:, :2]) * EARTH_RADIUS
+        tolerance = chord_length(tolerance_m) * EARTH_RADIUS
+    else:
+        coordinates = all_points[:, :2]
 
-    # previous returns an array of the same length as the incoming points,
-    # with each value in the array being a tuple of indexes of the found
-    # points in the tree. Because you put in our original set there will
-    # always be at least one match. However you can then build a simple
-    # vectorisation function to test whether each item in the tree matches
-    # a point from a different group.
+    # one tree per track, so only pairs of points of different tracks are
+    # searched, result is array of index pairs (point of a, point of b)
+    # tree = pysal.cg.KDTree(all_points[:, :2], distance_metric='Arc', radius=pysal.cg.RADIUS_EARTH_MILES)
+    offset = points_a.shape[0]
+    tree_a = scipy.spatial.KDTree(coordinates[:offset])
+    tree_b = scipy.spatial.KDTree(coordinates[offset:])
+    distances = tree_a.sparse_distance_matrix(tree_b, tolerance, output_type='ndarray')
+    cross_pairs = np.column_stack([distances['i'], distances['j'] + offset])
 
-    vfunc = np.vectorize(lambda a: np.any(all_points[a, 2] != all_points[a[0], 2]))
+    logging.debug('number of point pairs within tolerance: %d', cross_pairs.shape[0])
 
-    matches = vfunc(points_within_tolerance)
+    # point matches if at least one of its pairs is a point from a different
+    # track, mark both points of such pairs
+    matches = np.zeros(len(all_points), dtype=bool)
+    matches[cross_pairs.ravel()] = True
 
-    logging.debug('matches (true if given point matches point in another track):')
-    for i, v in enumerate(matches):
-        logging.debug('%d: %s', i, v)
+    logging.debug('number of matching points: %d', np.count_nonzero(matches))
 
     # reduce all_points array to those who are True in matches array,
     # so the matching_points contain only points which match points in
     # second group (labeling/index coordinate is stripped -> :2)
     matching_points = all_points[matches, :2]
 
-    logging.debug('matchiing points: %s', matching_points)
-
     # if there are no points close to each other -> tracks are too far from each other
-    if len(matching_points) > 0:
+    if len(matching_points) > 0 and clustering == 'segments':
+        # neighbours of the same track are searched among matching points only
+        pairs = [cross_pairs]
+        for track_id in range(len(all_tracks)):
+            track_ix = np.nonzero(matches & (all_points[:, 2] == track_id))[0]
+            pairs.append(track_ix[scipy.spatial.KDTree(coordinates[track_ix]).query_pairs(tolerance, output_type='ndarray')])
+
+        clusters = cluster_segments(all_points, matches, np.vstack(pairs))
+
+    elif len(matching_points) > 0:
 
         # So now you have points on the GPS trails which cross, but you want to
         # group points into contiguous segments of track that overlap. For that you
         # can use the scipy hierarchical clustering methods to group the data into
         # groups which are linked by at most the TOLERANCE distance.
 
-        clusters = scipy.cluster.hierarchy.fclusterdata(matching_points, tolerance, 'distance')
+        clusters = scipy.cluster.hierarchy.fclusterdata(coordinates[matches], tolerance, 'distance')
     else:
         clusters = []
 
     logging.debug('clusters: %s', clusters)
 
     # clusters is an array of the same length of your matched points containing
-    # cluster indexes for each point. This means it's easy to get back a table
-    # of x, y, original_trail, segment by stacking the output together.
-
-    cluster_points = np.hstack([
-        matching_points,
-        np.vstack([
-            all_points[matches, 2],    # track index
-            all_points[matches, 3],    # point index
-            clusters
-        ]).T
-    ])
-
-    logging.debug('cluster_points:')
-    logging.debug(cluster_points)
-
-    cluster_point_indexes = cluster_points[:, 3]
+    # cluster indexes for each point, scatter them by point index to cluster
+    # column, points which don't belong to any cluster have -1
+    cluster_column = np.full(len(all_points), -1.0)
+    cluster_column[matches] = clusters
 
-    def get_point_with_cluster_info(p):
-        # look for point in clusters
-        cluster_ix = np.nonzero(cluster_point_indexes == p[3])[0]
-
-        # if point is member of some cluster, use it
-        if cluster_ix.shape[0] > 0:
-            return cluster_points[cluster_ix[0]]
-
-        # if point was not found, add information that it doesn't belong to any cluster (-1)
-        return np.append(p, -1)
-
-    result = np.vstack([get_point_with_cluster_info(p) for p in all_points])
+    # (x, y, track_id, index, cluster)
+    result = np.column_stack([all_points, cluster_column])
 
     logging.debug('result:')
-    # (x, y, track_id, index, cluster)
     logging.debug(result)
 
     return result
 
 def get_track_ratios(matches):
-    """Compute single track ratio"""
+    """Computes ratios of all tracks in result of match
+
+    Length of segment ending in a point outside of clusters is counted as
+    distance outside of clusters. Points of each track are expected to be
+    consecutive rows (as returned by match). Returns list of dicts (one per
+    track ordered by track id) with keys track, points, distance_total,
+    distance_outside and ratio.
+    """
+
+    matches = np.asarray(matches)
+    if len(matches) == 0:
+        return []
+
+    track_ids, track_ix, counts = np.unique(matches[:, 2], return_inverse=True, return_counts=True)
+
+    # segment lengths, segments between two tracks have zero length
+    lengths = np.zeros(len(matches))
+    lengths[1:] = haversine_distances(matches[:-1, :2], matches[1:, :2])
+    lengths[1:][matches[:-1, 2] != matches[1:, 2]] = 0
+
+    dist_total = np.bincount(track_ix, weights=lengths, minlength=len(track_ids))
+    dist_outside = np.bincount(track_ix, weights=lengths * (matches[:, 4] == -1), minlength=len(track_ids))
+
+    result = []
+    for i, track_id in enumerate(track_ids):
+        result.append({
+            'track': int(track_id),
+            'points': int(counts[i]),
+            'distance_total': float(dist_total[i]),
+            'distance_outside': float(dist_outside[i]),
+            'ratio': float((dist_total[i] - dist_outside[i]) / dist_total[i]) if dist_total[i] > 0 else 0.0
+        })
 
-    for track_ix in range(2):
-        # prepare filter (boolean vector) to filter out current truack points
-        tracks_filter = [m[2] == track_ix for m in matches]
-        track_points = matches[tracks_filter]
-
-        dist_outside_cluster = 0    # distance outside of clusters
-        dist_total = 0      # distance total
-        last_point = None
-
-        for p_ix, p in enumerate(track_points):
-            if p_ix == 0:
-                last_point = p
-                continue
-
-            # calculating Euclidean distance using linalg.norm()
-            # d = np.linalg.norm(np.array((p[0], p[1])) - np.array((last_point[0], last_point[1])))
-            d = distance.distance([p[0], p[1]], [last_point[0], last_point[1]]).m
-            dist_total += d
-
-            # if we are outside of cluster
-            if p[4] == -1:
-                dist_outside_cluster += d
-
-            last_point = p
-
-        print('track', track_ix)
-        print(f'  points: {track_points.shape[0]}')
-        print(f'  distance total: {format_distance_m(dist_total)}')
-        print(f'  distance outside of clusters: {format_distance_m(dist_outside_cluster)}')
-        print(f'  match ratio:: {round(((dist_total - dist_outside_cluster) / dist_total * 100), 1)}%')
+    return result
 
 def points_from_gpx(gpx):
     """point from gpx object"""
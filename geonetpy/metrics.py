@@ -0,0 +1,122 @@
+"""
+Timers and counters of processing stages
+
+Metrics are recorded to module level registry (the same way as logging),
+so modules record stages and counters without passing metrics objects
+around. Recording is disabled by default, disabled timers and counters
+cost a single check.
+
+Stages running in worker processes are recorded by the registry of the
+worker, collect() returns them with the result of the worker function, so
+they can be merged to the registry of the main process.
+"""
+
+import json
+import time
+
+class Timer:
+    """context manager adding wall time of a block to timer of metrics"""
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+
+class NullTimer:
+    """timer of disabled metrics"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.timers = {}
+        self.counters = {}
+
+    def reset(self):
+        self.timers = {}
+        self.counters = {}
+
+    def count(self, name, value=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_time(self, name, seconds, calls=1):
+        stage = self.timers.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        stage['seconds'] += seconds
+        stage['calls'] += calls
+
+    def timer(self, name):
+        return Timer(self, name) if self.enabled else NULL_TIMER
+
+    def snapshot(self):
+        """timers (seconds and calls) and counters as json serializable dict"""
+        return {
+            'timers': {name: dict(stage) for name, stage in self.timers.items()},
+            'counters': dict(self.counters)
+        }
+
+    def merge(self, other):
+        """adds timers and counters of snapshot of other metrics"""
+        for name, stage in other['timers'].items():
+            self.add_time(name, stage['seconds'], stage['calls'])
+        for name, value in other['counters'].items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+METRICS = Metrics()
+
+
+def enable(enabled=True):
+    METRICS.enabled = enabled
+
+def is_enabled():
+    return METRICS.enabled
+
+def reset():
+    METRICS.reset()
+
+def count(name, value=1):
+    METRICS.count(name, value)
+
+def timer(name):
+    return METRICS.timer(name)
+
+def snapshot():
+    return METRICS.snapshot()
+
+def merge(metrics_snapshot):
+    METRICS.merge(metrics_snapshot)
+
+def collect(enabled, func, *args):
+    """Runs func in worker process with fresh registry, returns tuple (result,
+    snapshot of metrics recorded by func)"""
+    METRICS.reset()
+    METRICS.enabled = enabled
+    return func(*args), METRICS.snapshot()
+
+def format_metrics(metrics_snapshot):
+    """lines of human readable report of snapshot"""
+    lines = [f'{name:<24} {stage["seconds"]:>10.3f} s {stage["calls"]:>10} calls' for name, stage in sorted(metrics_snapshot['timers'].items())]
+    lines += [f'{name:<24} {value:>10}' for name, value in sorted(metrics_snapshot['counters'].items())]
+    return lines
+
+def save(filepath):
+    """writes snapshot of metrics as json"""
+    with open(filepath, 'w', encoding='utf-8') as metrics_file:
+        json.dump(METRICS.snapshot(), metrics_file, indent=4)
@@ -0,0 +1,120 @@
+"""
+Encoder of Mapbox vector tiles (MVT 2.1)
+
+Tiles are protocol buffers messages, the encoder writes only messages and
+fields used by geonet (points, line strings and string/number properties),
+so no protobuf library is needed.
+
+https://github.com/mapbox/vector-tile-spec/tree/master/2.1
+"""
+
+import struct
+
+EXTENT = 4096
+
+# geometry types
+POINT = 1
+LINESTRING = 2
+
+# geometry commands
+MOVE_TO = 1
+LINE_TO = 2
+
+# protobuf wire types
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+
+def encode_varint(value):
+    result = bytearray()
+    while value > 0x7f:
+        result.append((value & 0x7f) | 0x80)
+        value >>= 7
+    result.append(value)
+    return bytes(result)
+
+def zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+def encode_key(field, wire_type):
+    return encode_varint((field << 3) | wire_type)
+
+def encode_bytes(field, data):
+    return encode_key(field, LENGTH_DELIMITED) + encode_varint(len(data)) + data
+
+def encode_uint(field, value):
+    return encode_key(field, VARINT) + encode_varint(value)
+
+def encode_packed(field, values):
+    return encode_bytes(field, b''.join(encode_varint(v) for v in values))
+
+def encode_value(value):
+    """value message of layer (string, double or sint value)"""
+    if isinstance(value, bool):
+        return encode_uint(7, int(value))
+    if isinstance(value, int):
+        return encode_uint(6, zigzag(value))
+    if isinstance(value, float):
+        return encode_key(3, FIXED64) + struct.pack('<d', value)
+    return encode_bytes(1, str(value).encode('utf-8'))
+
+def command(command_id, count):
+    return (command_id & 0x7) | (count << 3)
+
+def encode_geometry(geometry_type, coordinates):
+    """geometry commands for point or line string of (x, y) tile coordinates"""
+    result = []
+    cursor_x = 0
+    cursor_y = 0
+
+    for i, (x, y) in enumerate(coordinates):
+        if i == 0:
+            result.append(command(MOVE_TO, 1))
+        elif i == 1 and geometry_type == LINESTRING:
+            result.append(command(LINE_TO, len(coordinates) - 1))
+        result.append(zigzag(x - cursor_x))
+        result.append(zigzag(y - cursor_y))
+        cursor_x = x
+        cursor_y = y
+
+    return result
+
+class LayerEncoder:
+    """Collects features of one layer, keys and values of properties are
+    stored in tables of the layer and features refer to them by indexes"""
+
+    def __init__(self, name, extent=EXTENT):
+        self.name = name
+        self.extent = extent
+        self.keys = {}
+        self.values = {}
+        self.features = []
+
+    def add_feature(self, geometry_type, coordinates, properties):
+        tags = []
+        for key, value in properties.items():
+            tags.append(self.keys.setdefault(key, len(self.keys)))
+            tags.append(self.values.setdefault((type(value), value), len(self.values)))
+
+        self.features.append(b''.join([
+            encode_packed(2, tags),
+            encode_uint(3, geometry_type),
+            encode_packed(4, encode_geometry(geometry_type, coordinates))
+        ]))
+
+    def __len__(self):
+        return len(self.features)
+
+    def encode(self):
+        return b''.join([
+            encode_uint(15, 2),
+            encode_bytes(1, self.name.encode('utf-8')),
+            b''.join(encode_bytes(2, feature) for feature in self.features),
+            b''.join(encode_bytes(3, key.encode('utf-8')) for key in self.keys),
+            b''.join(encode_bytes(4, encode_value(value)) for _, value in self.values),
+            encode_uint(5, self.extent)
+        ])
+
+def encode_tile(layers):
+    """tile message of layers (LayerEncoder), empty layers are skipped"""
+    return b''.join(encode_bytes(3, layer.encode()) for layer in layers if len(layer) > 0)
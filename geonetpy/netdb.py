@@ -1,7 +1,31 @@
+import contextlib
+import itertools
 import json
 import logging
+import random
+import time
+import uuid
 from pymongo.mongo_client import MongoClient
+from pymongo import InsertOne, UpdateOne
 import pymongo
+import numpy as np
+from .gridindex import GridIndex
+from .columns import EdgeTable
+from . import geojson, metrics, netfile, simplify
+from .geoutils import haversine_distance
+
+# rect queries covering more grid cells use $geoWithin on 2dsphere index
+MAX_QUERY_CELLS = 10000
+
+# widening of $geoWithin polygon (degrees) and length of its segments along parallels
+RECT_MARGIN = 0.001
+POLYGON_STEP = 0.1
+
+# claims of grid cells older than this (seconds) are left by crashed workers
+CLAIM_TIMEOUT = 60
+
+# maximal wait (seconds) before claiming cells held by another worker again
+CLAIM_RETRY = 0.01
 
 def mongo_loc_to_point(loc):
 
@@ -11,40 +35,172 @@ def mongo_loc_to_point(loc):
 def remove_att_from_list(lst, att):
     return [{k: v for k, v in item.items() if k != att} for item in lst]
 
+def cell_to_key(cell):
+    return f'{cell[0]}:{cell[1]}'
+
+def rect_polygon(rect, margin=RECT_MARGIN, step=POLYGON_STEP):
+    """Geojson polygon of rect widened by margin (degrees), edges along
+    parallels are split to segments of step degrees of longitude, so great
+    circle segments of the polygon stay within margin from the parallels"""
+    min_lat, min_lon, max_lat, max_lon = rect.get_bounds()
+    min_lat, min_lon = max(min_lat - margin, -90), max(min_lon - margin, -180)
+    max_lat, max_lon = min(max_lat + margin, 90), min(max_lon + margin, 180)
+
+    lons = np.linspace(min_lon, max_lon, max(2, int(np.ceil((max_lon - min_lon) / step)) + 1)).tolist()
+    ring = [[lon, min_lat] for lon in lons] + [[lon, max_lat] for lon in reversed(lons)]
+
+    return {'type': 'Polygon', 'coordinates': [ring + [ring[0]]]}
+
+def edge_update(edge_points, hits, track_id):
+    """filter and update of edge document, edge is created if it doesn't exist"""
+    return (
+        {'index': f'{edge_points[0]}-{edge_points[1]}'},
+        {
+            '$setOnInsert': {'p1': edge_points[0], 'p2': edge_points[1]},
+            '$inc': {'q': hits},
+            '$addToSet': {'tracks': track_id}
+        }
+    )
+
 class NetDb:
-    def __init__(self, uri):
+    def __init__(self, uri, client=None, reset=True, shared=None):
 
         self.max_spot_distance = 75
-        self.last_id = 0
+
+        # grid with cells of max spot distance size, spots close enough to be
+        # reused for a point are always stored in one of 9 neighbouring cells
+        self.grid = GridIndex([], self.max_spot_distance)
 
         self.uri = uri
-        self.client = MongoClient(self.uri)
+        self.client = client if client is not None else MongoClient(self.uri)
 
         # send a ping to confirm a successful connection
         self.client.admin.command('ping')
         self.db = self.client.geonet
 
-        # make collection empty
-        self.db.tracks.drop()
-        self.db.points.drop()
-        self.db.edges.drop()
+        # spots of database shared with other workers adding tracks are
+        # created under claims of grid cells (see _claim), database is
+        # shared if it isn't reset by default
+        self.shared = shared if shared is not None else not reset
+        self.worker_id = uuid.uuid4().hex
 
-        # create geospatial index
-        self.db.points.create_index({'loc': pymongo.GEOSPHERE})
+        # make collection empty, unless the database is shared with other
+        # processes adding tracks to the same net
+        if reset:
+            self.drop()
+        else:
+            self.create_indexes()
 
         print("Pinged your deployment. You successfully connected to MongoDB!")
 
-    def generate_id(self):
-        result = self.last_id
-        self.last_id += 1
-        return result
+    def drop(self):
+        self.db.tracks.drop()
+        self.db.points.drop()
+        self.db.edges.drop()
+        self.db.counters.drop()
+        self.db.claims.drop()
+        self.create_indexes()
+
+    def create_indexes(self):
+        # geospatial index and index of grid cells for spot lookups
+        self.db.points.create_index([('loc', pymongo.GEOSPHERE)])
+        self.db.points.create_index([('cell', pymongo.ASCENDING)])
+
+        # unique indexes, edges are looked up by index and by point ids
+        self.db.points.create_index([('index', pymongo.ASCENDING)], unique=True)
+        self.db.edges.create_index([('index', pymongo.ASCENDING)], unique=True)
+        self.db.edges.create_index([('p1', pymongo.ASCENDING), ('p2', pymongo.ASCENDING)], unique=True)
+
+        # edges touching spots (rect queries)
+        self.db.edges.create_index([('p2', pymongo.ASCENDING)])
+        self.db.edges.create_index([('via', pymongo.ASCENDING)])
+
+    def generate_id(self, count=1):
+        """Reserves count of consecutive point ids and returns the first one,
+        counter is stored in database, so ids are unique for all processes
+        sharing the database"""
+        metrics.count('mongo.ops')
+        counter = self.db.counters.find_one_and_update(
+            {'_id': 'points'},
+            {'$inc': {'next': count}},
+            upsert=True,
+            return_document=pymongo.ReturnDocument.AFTER)
+
+        return counter['next'] - count
+
+    def set_next_id(self, next_id):
+        self.db.counters.update_one({'_id': 'points'}, {'$set': {'next': next_id}}, upsert=True)
 
     def get_meta(self):
         return {
             'tracks': remove_att_from_list(self.db.tracks.find({}), "_id")
         }
 
-    def add_track(self, points, track_id, track_meta=None):
+    def get_cell_keys(self, point):
+        return [cell_to_key(cell) for cell in self.grid.get_cells(point)]
+
+    def find_nearest(self, point, spots):
+        """nearest of spots (point documents) which is closer than max spot distance"""
+        nearest = None
+        nearest_distance = self.max_spot_distance
+
+        for spot in spots:
+            coordinates = spot['loc']['coordinates']
+            distance = haversine_distance([coordinates[1], coordinates[0]], point)
+            if distance < nearest_distance:
+                nearest = spot
+                nearest_distance = distance
+
+        return nearest
+
+    @contextlib.contextmanager
+    def _claim(self, keys):
+        """Claims grid cells (keys) for creating spots
+
+        Spot of shared net is created only by worker holding claims of all
+        cells of its point, so two workers sharing the database can't create
+        spots closer than max spot distance (both would claim the cell of one
+        of them). Claim is a document with cell key as _id, claims held by
+        another worker are released and tried again after a random wait.
+        Claiming costs three more database operations per created spot (or
+        batch creating spots): insert of claims, repeated lookup of spots and
+        delete of claims, so nets which are not shared don't claim cells.
+        """
+        keys = sorted(set(keys))
+        while True:
+            now = time.time()
+            try:
+                metrics.count('mongo.ops')
+                self.db.claims.insert_many([{'_id': key, 'owner': self.worker_id, 'time': now} for key in keys])
+                break
+            except pymongo.errors.BulkWriteError:
+                metrics.count('mongo.ops', 2)
+                metrics.count('netdb.claim_retries')
+                self.db.claims.delete_many({'_id': {'$in': keys}, 'owner': self.worker_id})
+                self.db.claims.delete_many({'_id': {'$in': keys}, 'time': {'$lt': now - CLAIM_TIMEOUT}})
+                time.sleep(random.uniform(0, CLAIM_RETRY))
+
+        try:
+            yield
+        finally:
+            metrics.count('mongo.ops')
+            self.db.claims.delete_many({'_id': {'$in': keys}, 'owner': self.worker_id})
+
+    def create_spot(self, point, point_id, track_id):
+        return {
+            'loc': {
+                'type': 'Point',
+                'coordinates': [point[1], point[0]]
+            },
+            'cell': cell_to_key(self.grid.get_cell(point)),
+            'index': point_id,
+            'tracks': [track_id],
+            'q': 1
+        }
+
+    def add_track(self, points, track_id, track_meta=None, batch_size=None):
+        """Adds track to the net, points are added one by one or in batches
+        of batch_size points (bulk writes), result is the same"""
 
         if track_meta is None:
             track_meta = {}
@@ -54,89 +210,160 @@ class NetDb:
         self.db.tracks.insert_one(track_meta)
 
         last_point_id = None
+        if batch_size:
+            for start in range(0, len(points), batch_size):
+                last_point_id = self._add_batch(points[start:start + batch_size], track_id, last_point_id)
+        else:
+            for point in points:
+                last_point_id = self.add_point(point, track_id, last_point_id)
+
+    def _batch_keys(self, points):
+        keys = set()
         for point in points:
-            last_point_id = self.add_point(point, track_id, last_point_id)
+            keys.update(self.get_cell_keys(point))
+        return keys
 
-    def add_point(self, point, track_id, last_point_id=None):
-        logging.debug('add point: %s, track_id=%s, last_point_id: %s', point, track_id, last_point_id if last_point_id is not None else "-")
+    def _resolve_batch(self, points, track_id, keys):
+        """Finds spots for batch of points, new spots are indexed -1, -2, ..."""
 
-        final_point_id = None
+        metrics.count('mongo.ops')
+        cells = {}
+        for spot in self.db.points.find({'cell': {'$in': list(keys)}}, {'loc': 1, 'cell': 1, 'index': 1}):
+            cells.setdefault(spot['cell'], []).append(spot)
 
-        # look for existing point to be reused
-        nearest = self.db.points.find({
-            'loc': {
-                "$nearSphere": {
-                    "$geometry": {
-                        "type": "Point",
-                        "coordinates": [point[1], point[0]]  # Example query point (Los Angeles)
-                    },
-                    "$maxDistance": self.max_spot_distance}}})
+        new_spots = []      # documents of spots created by this batch, their index is -1, -2, ...
+        spot_hits = {}      # index -> number of reuses of existing spot
+        point_ids = []
 
-        for loc in nearest:
-            logging.debug('reusing point %s (%s)', loc['index'], point)
-            update = {
-                'q': loc['q'] + 1
-            }
+        for point in points:
+            nearest = self.find_nearest(point, [spot for key in self.get_cell_keys(point) for spot in cells.get(key, [])])
+
+            if nearest is None:
+                nearest = self.create_spot(point, -1 - len(new_spots), track_id)
+                new_spots.append(nearest)
+                cells.setdefault(nearest['cell'], []).append(nearest)
+            elif nearest['index'] < 0:
+                new_spots[-1 - nearest['index']]['q'] += 1
+            else:
+                spot_hits[nearest['index']] = spot_hits.get(nearest['index'], 0) + 1
 
-            if track_id not in loc['tracks']:
-                update['tracks'] = loc['tracks'].copy()
-                update['tracks'].append(track_id)
+            point_ids.append(nearest['index'])
 
-            self.db.points.update_one({'_id': loc['_id']}, {'$set': update})
+        return new_spots, spot_hits, point_ids
 
-            final_point_id = loc['index']
-            break
+    def _add_batch(self, points, track_id, last_point_id=None):
+        """Adds batch of track points
 
-        # if no near point exists, register new one
-        if final_point_id is None:
-            final_point_id = self.generate_id()
+        All spots which can be reused by points of the batch are fetched by
+        one query, points are resolved in memory and changes of points and
+        edges are written by one bulk write per collection. Batch creating
+        spots of shared net is resolved again while cells of its points are
+        claimed (spots could be created by other workers meanwhile).
+        """
 
-            logging.debug('registring new point %s track_id=%s (%s)', final_point_id, track_id, point)
-            loc = {
-                'loc': {
-                    'type': 'Point',
-                    'coordinates': [point[1], point[0]]
-                },
-                'index': final_point_id,
-                'tracks': [track_id],
-                'q': 1
-            }
-            self.db.points.insert_one(loc)
+        keys = self._batch_keys(points)
+        with metrics.timer('net.spot_lookup'):
+            resolved = self._resolve_batch(points, track_id, keys)
 
-        # --------------------  edge processing
-        if last_point_id is not None:
+        if len(resolved[0]) == 0 or not self.shared:
+            return self._write_batch(points, track_id, last_point_id, resolved)
 
+        with self._claim(keys):
+            with metrics.timer('net.spot_lookup'):
+                resolved = self._resolve_batch(points, track_id, keys)
+            return self._write_batch(points, track_id, last_point_id, resolved)
+
+    def _write_batch(self, points, track_id, last_point_id, resolved):
+        new_spots, spot_hits, point_ids = resolved
+
+        metrics.count('spots.created', len(new_spots))
+        metrics.count('spots.reused', len(points) - len(new_spots))
+
+        # ids of new spots are reserved at once, they are consecutive as in
+        # case of adding points one by one
+        first_id = self.generate_id(len(new_spots)) if len(new_spots) > 0 else 0
+        point_ids = [first_id - 1 - i if i < 0 else i for i in point_ids]
+        for spot in new_spots:
+            spot['index'] = first_id - 1 - spot['index']
+
+        edge_hits = {}      # (p1, p2) -> number of passes
+        for final_point_id in point_ids:
             # ignore self edges
-            if last_point_id != final_point_id:
-                # create edge with sorted point ids to avoid duplicates (reverse direction of track movement)
+            if last_point_id is not None and last_point_id != final_point_id:
                 edge_points = (last_point_id, final_point_id) if last_point_id < final_point_id else (final_point_id, last_point_id)
-                edge_id = f'{edge_points[0]}-{edge_points[1]}'
-                edge = {
-                    'index': edge_id,
-                    'p1': edge_points[0],
-                    'p2': edge_points[1],
-                    'tracks': [track_id],
-                    'q': 1
-                }
+                edge_hits[edge_points] = edge_hits.get(edge_points, 0) + 1
 
-                existing = self.db.edges.find_one({'index': edge_id})
+            last_point_id = final_point_id
 
-                if existing is not None:
-                    logging.debug('reusing existing edge: %s', existing['index'])
+        point_ops = [InsertOne(spot) for spot in new_spots]
+        point_ops += [UpdateOne({'index': index}, {'$inc': {'q': hits}, '$addToSet': {'tracks': track_id}}) for index, hits in spot_hits.items()]
+        edge_ops = [UpdateOne(*edge_update(edge_points, hits, track_id), upsert=True) for edge_points, hits in edge_hits.items()]
 
-                    update = {
-                        'q': loc['q'] + 1
-                    }
+        logging.debug('writing batch of %d points (point ops: %d, edge ops: %d)', len(points), len(point_ops), len(edge_ops))
+
+        with metrics.timer('net.db_writes'):
+            if len(point_ops) > 0:
+                metrics.count('mongo.ops')
+                self.db.points.bulk_write(point_ops, ordered=False)
+
+            if len(edge_ops) > 0:
+                metrics.count('mongo.ops')
+                result = self.db.edges.bulk_write(edge_ops, ordered=False)
+                metrics.count('edges.created', result.upserted_count)
+                metrics.count('edges.reused', len(edge_ops) - result.upserted_count)
+
+        return last_point_id
+
+    def _find_spot(self, point, keys):
+        metrics.count('mongo.ops')
+        return self.find_nearest(point, self.db.points.find({'cell': {'$in': keys}}, {'loc': 1, 'index': 1}))
+
+    def _insert_spot(self, point, track_id):
+        point_id = self.generate_id()
+
+        logging.debug('registring new point %s track_id=%s (%s)', point_id, track_id, point)
+        metrics.count('mongo.ops')
+        metrics.count('spots.created')
+        self.db.points.insert_one(self.create_spot(point, point_id, track_id))
 
-                    if track_id not in existing['tracks']:
-                        update['tracks'] = existing['tracks'].copy()
-                        update['tracks'].append(track_id)
+        return point_id
 
-                    self.db.edges.update_one({'_id': existing['_id']}, {'$set': update})
+    def add_point(self, point, track_id, last_point_id=None):
+        logging.debug('add point: %s, track_id=%s, last_point_id: %s', point, track_id, last_point_id if last_point_id is not None else "-")
 
-                else:
-                    logging.debug('registering new edge: %s', edge_id)
-                    self.db.edges.insert_one(edge)
+        # look for existing point to be reused, spot is then updated or inserted
+        keys = self.get_cell_keys(point)
+        loc = self._find_spot(point, keys)
+
+        # if no near point exists, register new one (unless another worker
+        # sharing the database created it before cells were claimed)
+        final_point_id = None
+        if loc is None and not self.shared:
+            final_point_id = self._insert_spot(point, track_id)
+        elif loc is None:
+            with self._claim(keys):
+                loc = self._find_spot(point, keys)
+                if loc is None:
+                    final_point_id = self._insert_spot(point, track_id)
+
+        if loc is not None:
+            logging.debug('reusing point %s (%s)', loc['index'], point)
+            final_point_id = loc['index']
+            metrics.count('mongo.ops')
+            metrics.count('spots.reused')
+            self.db.points.update_one({'_id': loc['_id']}, {'$inc': {'q': 1}, '$addToSet': {'tracks': track_id}})
+
+        # --------------------  edge processing
+        if last_point_id is not None:
+
+            # ignore self edges
+            if last_point_id != final_point_id:
+                # create edge with sorted point ids to avoid duplicates (reverse direction of track movement)
+                edge_points = (last_point_id, final_point_id) if last_point_id < final_point_id else (final_point_id, last_point_id)
+                logging.debug('adding edge: %s', edge_points)
+                metrics.count('mongo.ops')
+                result = self.db.edges.update_one(*edge_update(edge_points, 1, track_id), upsert=True)
+                metrics.count('edges.created' if result.upserted_id is not None else 'edges.reused')
 
         return final_point_id
 
@@ -149,23 +376,48 @@ class NetDb:
 
         return result
 
+    def columns(self):
+        """columns of spots (lat, lon, id, q) and edges (p1, p2, q and via
+        of simplified net) as numpy arrays"""
+        points = list(self.db.points.find({}, {'index': 1, 'q': 1, 'loc': 1}, sort=[('index', pymongo.ASCENDING)]))
+        edges = list(self.db.edges.find({}, {'p1': 1, 'p2': 1, 'q': 1, 'via': 1}))
+        return self._to_columns(points, edges)
+
+    @staticmethod
+    def _to_columns(points, edges):
+        spots = {
+            'lat': np.array([p['loc']['coordinates'][1] for p in points], dtype=np.float64),
+            'lon': np.array([p['loc']['coordinates'][0] for p in points], dtype=np.float64),
+            'id': np.array([p['index'] for p in points], dtype=np.int64),
+            'q': np.array([p['q'] for p in points], dtype=np.int32)
+        }
+        columns = {
+            'p1': np.array([e['p1'] for e in edges], dtype=np.int32),
+            'p2': np.array([e['p2'] for e in edges], dtype=np.int32),
+            'q': np.array([e['q'] for e in edges], dtype=np.int32)
+        }
+
+        # polyline edges of simplified net
+        if any('via' in e for e in edges):
+            columns['via_offsets'], columns['via'] = netfile.from_lists([e.get('via', []) for e in edges])
+
+        return spots, columns
+
     def save(self, filepath, output_format='gnt', show_points=True):
 
         logging.info("saving net content to %s (output_format: %s)", filepath, output_format)
 
         if output_format == 'js':
-            content = {
-                'geojson': self.to_geojson(show_points=show_points),
-                'meta': {
-                    'tracks': remove_att_from_list(self.db.tracks.find({}), "_id")
-                }
-            }
-
             with open(filepath, 'w', encoding='utf-8') as output_file:
-                output_file.write('geonet=' + json.dumps(content, indent=4))
+                output_file.write('geonet={"geojson": ')
+                self.write_geojson(output_file, show_points=show_points)
+                output_file.write(', "meta": ' + json.dumps(self.get_meta(), indent=4) + '}')
 
             logging.info("saved")
 
+        elif output_format == 'gnb':
+            self._save_binary(filepath)
+
         else:
             content = {
                 'points': remove_att_from_list(self.db.points.find({}), "_id"),
@@ -178,18 +430,101 @@ class NetDb:
 
             logging.info("saved (points: %d, edges: %d, tracks: %d)", len(content['points']), len(content['edges']), len(content['tracks']))
 
+    def _save_binary(self, filepath):
+        """Saves net to binary net file (see netfile)"""
+
+        points = list(self.db.points.find({}, sort=[('index', pymongo.ASCENDING)]))
+        edges = list(self.db.edges.find({}))
+
+        arrays = {
+            'spots.lat': np.array([p['loc']['coordinates'][1] for p in points], dtype=np.float64),
+            'spots.lon': np.array([p['loc']['coordinates'][0] for p in points], dtype=np.float64),
+            'spots.id': np.array([p['index'] for p in points], dtype=np.int64),
+            'spots.q': np.array([p['q'] for p in points], dtype=np.int32),
+            'edges.p1': np.array([e['p1'] for e in edges], dtype=np.int32),
+            'edges.p2': np.array([e['p2'] for e in edges], dtype=np.int32),
+            'edges.q': np.array([e['q'] for e in edges], dtype=np.int32)
+        }
+        arrays['spots.tracks_offsets'], arrays['spots.tracks'] = netfile.from_lists([p.get('tracks', []) for p in points])
+        arrays['edges.tracks_offsets'], arrays['edges.tracks'] = netfile.from_lists([e.get('tracks', []) for e in edges])
+        if any('via' in e for e in edges):
+            arrays['edges.via_offsets'], arrays['edges.via'] = netfile.from_lists([e.get('via', []) for e in edges])
+
+        netfile.write_net(filepath, arrays, {
+            'tracks': remove_att_from_list(self.db.tracks.find({}), "_id"),
+            'last_id': self.generate_id(0),
+            'max_spot_distance': self.max_spot_distance
+        })
+
+        logging.info("saved (points: %d, edges: %d)", len(points), len(edges))
+
+    def _load_binary(self, filepath):
+        """Loads content of binary net file (see netfile) to database"""
+
+        self._load_arrays(*netfile.read_net(filepath))
+
+    def _load_arrays(self, arrays, meta):
+        """Loads arrays and meta (see netfile) to database"""
+
+        spot_tracks = netfile.to_lists(arrays['spots.tracks_offsets'], arrays['spots.tracks']) if 'spots.tracks' in arrays else None
+        edge_tracks = netfile.to_lists(arrays['edges.tracks_offsets'], arrays['edges.tracks']) if 'edges.tracks' in arrays else None
+        edge_via = netfile.to_lists(arrays['edges.via_offsets'], arrays['edges.via']) if 'edges.via' in arrays else None
+
+        points = []
+        for i, (lat, lon, point_id, q) in enumerate(zip(arrays['spots.lat'].tolist(), arrays['spots.lon'].tolist(), arrays['spots.id'].tolist(), arrays['spots.q'].tolist())):
+            point = self.create_spot([lat, lon], point_id, None)
+            point['tracks'] = spot_tracks[i] if spot_tracks is not None else []
+            point['q'] = q
+            points.append(point)
+
+        edges = []
+        for i, (p1, p2, q) in enumerate(zip(arrays['edges.p1'].tolist(), arrays['edges.p2'].tolist(), arrays['edges.q'].tolist())):
+            edges.append({
+                'index': f'{p1}-{p2}',
+                'p1': p1,
+                'p2': p2,
+                'q': q,
+                'tracks': edge_tracks[i] if edge_tracks is not None else []
+            })
+            if edge_via is not None:
+                edges[-1]['via'] = edge_via[i]
+
+        self.drop()
+
+        for collection, documents in [(self.db.points, points), (self.db.edges, edges), (self.db.tracks, meta['tracks'])]:
+            if len(documents) > 0:
+                collection.insert_many(documents)
+
+        self.set_next_id(meta['last_id'])
+
+        logging.debug('next index set to %d', meta['last_id'])
+
     def load(self, filepath):
 
+        if netfile.is_net_file(filepath):
+            logging.info("loading net content from binary file %s", filepath)
+            self._load_binary(filepath)
+            return
+
         with open(filepath, encoding='utf-8') as json_file:
 
             logging.info("loading net content from %s", filepath)
 
             data = json.load(json_file)
 
+            # json net of memory net
+            if 'meta' in data:
+                self._load_arrays(*netfile.from_json(data))
+                return
+
             # make collection empty
-            self.db.tracks.drop()
-            self.db.points.drop()
-            self.db.edges.drop()
+            self.drop()
+
+            # nets saved before spots were looked up by grid cells have no cell keys
+            for point in data['points']:
+                if 'cell' not in point:
+                    coordinates = point['loc']['coordinates']
+                    point['cell'] = cell_to_key(self.grid.get_cell([coordinates[1], coordinates[0]]))
 
             # insert into collections
             self.db.points.insert_many(data['points'])
@@ -198,77 +533,152 @@ class NetDb:
 
             # find last id
             max_point = self.db.points.find_one(sort=[('index', pymongo.DESCENDING)])
-            if max_point is not None:
-                self.last_id = max_point['index']
-            else:
-                self.last_id = 0
+            next_id = max_point['index'] + 1 if max_point is not None else 0
+            self.set_next_id(next_id)
 
-            logging.debug('last index set to %d', self.last_id)
+            logging.debug('next index set to %d', next_id)
 
-    def simplify(self):
+    def simplify(self, min_q=2, merge_distance=simplify.MERGE_DISTANCE):
+        """Simplifies graph of the net (see simplify), edge documents are
+        replaced by documents of polyline edges (ids of spots between p1 and
+        p2 are in via), tracks of polyline edge are tracks of its edges"""
 
-        # reset process flag for each edge
-        self.db.edges.update({}, {'$set': {'proc': False}})
+        spots, _ = self.columns()
+        documents = list(self.db.edges.find({}, {'p1': 1, 'p2': 1, 'q': 1, 'via': 1, 'tracks': 1}))
 
-        # loop over not processed edges
-        simplified = False
-        while not simplified:
-            pass
-
-    def to_geojson(self, show_points=True, show_edges=True):
-        geos = []
+        edges = {
+            'p1': np.array([e['p1'] for e in documents], dtype=np.int32),
+            'p2': np.array([e['p2'] for e in documents], dtype=np.int32),
+            'q': np.array([e['q'] for e in documents], dtype=np.int32)
+        }
+        edges['via_offsets'], edges['via'] = netfile.from_lists([e.get('via', []) for e in documents])
+
+        lines = simplify.simplify(spots, edges, min_q, merge_distance)
+        table = EdgeTable.from_lines(lines)
+
+        # tracks of consecutive spots of polylines
+        segment_tracks = {}
+        for e in documents:
+            polyline = [e['p1']] + e.get('via', []) + [e['p2']]
+            for a, b in zip(polyline[:-1], polyline[1:]):
+                segment_tracks.setdefault((min(a, b), max(a, b)), set()).update(e.get('tracks', []))
+
+        polylines = []
+        for row, (p1, p2) in enumerate(table):
+            via = table.get_via(row)
+            polyline = [p1] + via + [p2]
+            tracks = set()
+            for a, b in zip(polyline[:-1], polyline[1:]):
+                tracks.update(segment_tracks.get((min(a, b), max(a, b)), []))
+            polylines.append({'index': f'{p1}-{p2}', 'p1': p1, 'p2': p2, 'q': int(table[(p1, p2)]), 'tracks': sorted(tracks), 'via': via})
+
+        logging.info('simplified net: %d edges -> %d polyline edges', len(documents), len(polylines))
+
+        self.db.edges.delete_many({})
+        if len(polylines) > 0:
+            self.db.edges.insert_many(polylines)
+
+    def _find_rect(self, rect, projection=None):
+        """Point documents inside rect, small rects are looked up by keys of
+        grid cells, large rects by $geoWithin, candidates are filtered by
+        exact coordinates"""
+
+        cells = self.grid.get_rect_cells(rect)
+        if len(cells) <= MAX_QUERY_CELLS:
+            query = {'cell': {'$in': [cell_to_key(cell) for cell in cells]}}
+        else:
+            query = {'loc': {'$geoWithin': {'$geometry': rect_polygon(rect)}}}
+
+        metrics.count('mongo.ops')
+        points = self.db.points.find(query, projection)
+        return [p for p in points if rect.contains([p['loc']['coordinates'][1], p['loc']['coordinates'][0]])]
+
+    def _find_edges(self, spot_ids, projection=None):
+        """edge documents with any of spots (ends or via spots)"""
+        metrics.count('mongo.ops')
+        return list(self.db.edges.find({'$or': [{'p1': {'$in': spot_ids}}, {'p2': {'$in': spot_ids}}, {'via': {'$in': spot_ids}}]}, projection))
+
+    def query_rect(self, rect):
+        """Points inside lat/lon rect (see Rect) and edges touching it (any of
+        their spots is inside) as columns (see columns)"""
+
+        points = sorted(self._find_rect(rect, {'index': 1, 'q': 1, 'loc': 1}), key=lambda p: p['index'])
+        edges = self._find_edges([p['index'] for p in points], {'p1': 1, 'p2': 1, 'q': 1, 'via': 1})
+        return self._to_columns(points, edges)
+
+    def _geojson_features(self, show_points=True, show_edges=True, precision=None, rect=None):
+        """generator of geojson features of points and edges (only points
+        inside rect and edges touching it if rect is given), documents are
+        read from cursors in batches and edges are rendered in chunks, so
+        memory is bounded by size of the chunk"""
+
+        projection = {'index': 1, 'q': 1, 'loc': 1}
+        if rect is None:
+            points = self.db.points.find({}, projection, batch_size=geojson.CHUNK_SIZE)
+        else:
+            points = self._find_rect(rect, projection)
 
-        index = {}
+        # ids of points inside rect for searching of edges touching it
+        spot_ids = []
 
-        # render points and build dict of points for searching when
-        # rendering edges
-        points = self.db.points.find({})
+        # render points
         for point in points:
-
-            point_id = point['index']
+            if rect is not None:
+                spot_ids.append(point['index'])
 
             if show_points:
-
-                pnt = {
+                yield {
                     'type': 'Feature',
                     'properties': {
-                        'spot': point_id,
+                        'spot': point['index'],
                         'q': point['q']
                     },
                     'geometry': {
-                        'coordinates': point['loc']['coordinates'],
+                        'coordinates': geojson.round_coordinates(point['loc']['coordinates'], precision),
                         'type': 'Point'
                     }
                 }
-                geos.append(pnt)
-
-            index[point_id] = point
 
         # render edges
         if show_edges:
-            edges = self.db.edges.find({})
+            edges = iter(self.db.edges.find({}, batch_size=geojson.CHUNK_SIZE) if rect is None else self._find_edges(spot_ids))
+            chunk = list(itertools.islice(edges, geojson.CHUNK_SIZE))
+            while chunk:
+                yield from self._edge_features(chunk, precision)
+                chunk = list(itertools.islice(edges, geojson.CHUNK_SIZE))
+
+    def _edge_features(self, edges, precision=None):
+        """geojson features of chunk of edge documents, coordinates of their
+        spots are read by single query"""
+
+        spot_ids = list({spot_id for edge in edges for spot_id in [edge['p1'], edge['p2']] + edge.get('via', [])})
+        metrics.count('mongo.ops')
+        index = {
+            point['index']: geojson.round_coordinates(point['loc']['coordinates'], precision)
+            for point in self.db.points.find({'index': {'$in': spot_ids}}, {'index': 1, 'loc': 1})
+        }
 
-            for edge in edges:
-                p1 = index[edge['p1']]    # p1 index -> p1 data
-                p2 = index[edge['p2']]    # p2 index -> p2 data
-                line = {
-                    'type': 'Feature',
-                    'properties': {
-                        'edge': edge['index'],
-                        'tracks': edge['tracks'],
-                        'q': edge['q']
-                    },
-                    'geometry': {
-                        'coordinates': [p1['loc']['coordinates'], p2['loc']['coordinates']],
-                        'type': 'LineString'
-                    }
+        for edge in edges:
+            yield {
+                'type': 'Feature',
+                'properties': {
+                    'edge': edge['index'],
+                    'tracks': edge['tracks'],
+                    'q': edge['q']
+                },
+                'geometry': {
+                    'coordinates': [index[edge['p1']]] + [index[v] for v in edge.get('via', [])] + [index[edge['p2']]],
+                    'type': 'LineString'
                 }
-                geos.append(line)
+            }
 
-        geometries = {
+    def write_geojson(self, output, compact=False, **options):
+        """writes net as geojson feature collection to file handle, options
+        (show_points, show_edges, precision and rect) select features"""
+        geojson.write_geojson(output, self._geojson_features(**options), compact)
+
+    def to_geojson(self, **options):
+        return {
             'type': 'FeatureCollection',
-            'features': geos,
+            'features': list(self._geojson_features(**options)),
         }
-
-        # return json.dumps(geometries, indent=4)
-        return geometries
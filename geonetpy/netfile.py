@@ -0,0 +1,149 @@
+"""
+Binary net file (.gnb)
+
+File consists of fixed header, json block and raw arrays:
+
+    magic (8 bytes) | version (uint32) | length of json block (uint64)
+    json block {'meta': {...}, 'arrays': {name: {dtype, shape, offset}}}
+    arrays (little endian, each aligned to ALIGNMENT bytes)
+
+Offsets of arrays are relative to the end of json block rounded up to
+ALIGNMENT. Arrays are opened by np.memmap in copy on write mode, so opening
+of a file doesn't read the data and arrays can be modified in memory
+without touching the file. Variable length lists (e.g. tracks of edges) are
+stored as pairs of arrays (offsets, values).
+
+Json nets (.gnt) of both backends can be converted to the same arrays
+(see from_json), so each backend can load net saved by the other one.
+
+Versions:
+    1 - kd tree spot index of memory net is stored as its layout (end rows
+        of static trees), trees are built when the net is loaded
+    2 - nodes of static trees are stored too (see KDTree.to_arrays), loaded
+        net is queried without building them
+"""
+
+import json
+import os
+import struct
+import numpy as np
+
+MAGIC = b'GEONETB\x00'
+VERSION = 2
+ALIGNMENT = 64
+
+HEADER = struct.Struct('<8sIQ')
+
+def align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def is_net_file(filepath):
+    """true if file is binary net file (checked by magic bytes)"""
+    with open(filepath, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def to_lists(offsets, values):
+    """(offsets, values) -> list of lists"""
+    values = np.asarray(values).tolist()
+    return [values[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+def from_lists(lists):
+    """list of lists -> (offsets, values)"""
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(lst) for lst in lists])
+    values = np.array([v for lst in lists for v in lst], dtype=np.int64)
+    return offsets, values
+
+def write_net(filepath, arrays, meta):
+    """Writes dict of arrays and json serializable meta to binary net file"""
+
+    arrays = {name: np.ascontiguousarray(array, dtype=np.dtype(array.dtype).newbyteorder('<')) for name, array in arrays.items()}
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = align(offset + array.nbytes)
+
+    block = json.dumps({'meta': meta, 'arrays': layout}).encode('utf-8')
+    data_start = align(HEADER.size + len(block))
+
+    # file is written under temporary name and renamed, so arrays memory
+    # mapped from the file being replaced stay valid while they are written
+    tmp_filepath = filepath + '.tmp'
+    with open(tmp_filepath, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(block)))
+        f.write(block)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+
+        # file ends with the last array, even if it is empty
+        f.truncate(data_start + offset)
+
+    os.replace(tmp_filepath, filepath)
+
+def read_net(filepath):
+    """Opens binary net file, returns tuple (dict of memory mapped arrays, meta)"""
+
+    with open(filepath, 'rb') as f:
+        header = f.read(HEADER.size)
+        if not header.startswith(MAGIC) or len(header) < HEADER.size:
+            raise ValueError(f'not a binary net file: {filepath}')
+        _, version, block_size = HEADER.unpack(header)
+        if version > VERSION:
+            raise ValueError(f'unsupported version of net file: {version}')
+        block = json.loads(f.read(block_size).decode('utf-8'))
+
+    data_start = align(HEADER.size + block_size)
+
+    arrays = {}
+    for name, desc in block['arrays'].items():
+        dtype = np.dtype(desc['dtype'])
+        shape = tuple(desc['shape'])
+        if np.prod(shape) == 0:
+            # zero sized arrays can't be memory mapped
+            arrays[name] = np.empty(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(filepath, dtype=dtype, mode='c', offset=data_start + desc['offset'], shape=shape)
+
+    return arrays, block['meta']
+
+def from_json(data):
+    """Arrays (named as in binary net file) and meta of content of json net
+    file of any backend, memory net stores spots as [lat, lon, id] lists and
+    edges as [p1, p2] lists with q in meta, database net stores documents"""
+
+    if 'meta' in data:
+        points = sorted(data['points'], key=lambda p: p[2])
+        spots = [(p[0], p[1], p[2], data['meta'][str(int(p[2]))]['q']) for p in points]
+        edges = [(a, b, data['meta'][f'{a}-{b}']['q']) for a, b in data['edges']]
+        via = [data['via'][f'{a}-{b}'] for a, b in data['edges']] if 'via' in data else None
+        spot_tracks = edge_tracks = None
+    else:
+        points = sorted(data['points'], key=lambda p: p['index'])
+        spots = [(p['loc']['coordinates'][1], p['loc']['coordinates'][0], p['index'], p['q']) for p in points]
+        edges = [(e['p1'], e['p2'], e['q']) for e in data['edges']]
+        via = [e.get('via', []) for e in data['edges']] if any('via' in e for e in data['edges']) else None
+        spot_tracks = [p.get('tracks', []) for p in points]
+        edge_tracks = [e.get('tracks', []) for e in data['edges']]
+
+    arrays = {
+        'spots.lat': np.array([s[0] for s in spots], dtype=np.float64),
+        'spots.lon': np.array([s[1] for s in spots], dtype=np.float64),
+        'spots.id': np.array([s[2] for s in spots], dtype=np.int64),
+        'spots.q': np.array([s[3] for s in spots], dtype=np.int32),
+        'edges.p1': np.array([e[0] for e in edges], dtype=np.int32),
+        'edges.p2': np.array([e[1] for e in edges], dtype=np.int32),
+        'edges.q': np.array([e[2] for e in edges], dtype=np.int32)
+    }
+    if via is not None:
+        arrays['edges.via_offsets'], arrays['edges.via'] = from_lists(via)
+    if spot_tracks is not None:
+        arrays['spots.tracks_offsets'], arrays['spots.tracks'] = from_lists(spot_tracks)
+        arrays['edges.tracks_offsets'], arrays['edges.tracks'] = from_lists(edge_tracks)
+
+    return arrays, {
+        'tracks': data.get('tracks', []),
+        'last_id': int(arrays['spots.id'].max()) + 1 if len(spots) > 0 else 0
+    }
@@ -1,38 +1,87 @@
 import json
 import logging
-from .geojson import point_to_geojson
+import numpy as np
+from . import geojson
 from .balltree import BallTree
+from .kdtree import KDTree, NODES_FORMAT
+from .gridindex import GridIndex
+from .columns import SpotTable, EdgeTable
+from . import metrics, netfile, simplify
+
+# available spatial indexes for nearest spot lookups
+SPOT_INDEXES = ['kdtree', 'balltree', 'grid']
 
 def num2id(val):
     return str(int(val))
 
 class NetMem:
-    def __init__(self, points=None, edges=None):
+    def __init__(self, points=None, edges=None, spot_index='kdtree'):
+        if spot_index not in SPOT_INDEXES:
+            raise ValueError(f'unknown spot index: {spot_index}')
+
         self.max_spot_distance = 75
+        self.spot_index = spot_index
         self.last_id = 0
-        self.edges = edges if edges is not None else []
 
-        # meta information
-        self.meta = {}
+        # spatial index is created on first use, kd tree of loaded binary
+        # net is restored from its serialized layout (array of block ends)
+        self._index = None
+
+        # spots (lat, lon, id, q) and edges (p1, p2) -> q, where p1 < p2
+        self.spots = SpotTable()
+        self.edges = EdgeTable()
+        for edge in edges if edges is not None else []:
+            self.edges[tuple(edge)] = 1
+        self.tracks = []
 
         if points is not None:
-            self.balltree = BallTree(points)
-            logging.debug('created net from existing data, max spot distance: %i', self.max_spot_distance)
+            for point in points:
+                self.spots.append(point[0], point[1], point[2])
+            self.last_id = max((int(point[2]) + 1 for point in points), default=0)
+            logging.debug('created net from existing data, max spot distance: %i, spot index: %s', self.max_spot_distance, spot_index)
         else:
-            self.balltree = None
-            logging.debug('created empty net, max spot distance: %i', self.max_spot_distance)
+            logging.debug('created empty net, max spot distance: %i, spot index: %s', self.max_spot_distance, spot_index)
+
+    @property
+    def index(self):
+        if isinstance(self._index, dict) or (self._index is None and len(self.spots) > 0):
+            self._index = self.create_index(self._index)
+        return self._index
+
+    def create_index(self, arrays=None):
+        """spatial index of all spots, kd tree indexes columns of spots
+        directly (arrays are its stored trees, see KDTree.to_arrays)"""
+        if self.spot_index == 'kdtree':
+            spots = self.spots.columns()
+            return KDTree.from_columns(spots['lat'], spots['lon'], spots['id'], arrays)
+
+        if self.spot_index == 'balltree':
+            return BallTree(self.get_points())
+
+        # cells of the size of max spot distance, any spot close enough
+        # to be reused is in one of neighbouring cells
+        return GridIndex(self.get_points(), self.max_spot_distance)
 
     def stat(self):
-        return f'height of ball tree is: {self.balltree.get_height()}'
+        """sizes of the net and height of its spatial index"""
+        return {
+            'spots': len(self.spots),
+            'edges': len(self.edges),
+            'tracks': len(self.tracks),
+            'index': self.spot_index,
+            'height': self.index.get_height() if self.index is not None else 0
+        }
 
     def get_points(self):
-        if self.balltree is None:
-            return []
-
-        return self.balltree.get_points()
+        spots = self.spots.columns()
+        return [list(point) for point in zip(spots['lat'].tolist(), spots['lon'].tolist(), spots['id'].tolist())]
 
     def get_edges(self):
-        return self.edges
+        return list(self.edges)
+
+    def columns(self):
+        """columns of spots (lat, lon, id, q) and edges (p1, p2, q)"""
+        return self.spots.columns(), self.edges.columns()
 
     def generate_id(self):
         result = self.last_id
@@ -44,142 +93,342 @@ class NetMem:
         point = [point[0], point[1], point_id]
         logging.debug('storing point: %s', point)
 
-        if self.balltree is None:
-            self.balltree = BallTree([point])
-        else:
-            self.balltree.add_point(point)
+        index = self.index
+        self.spots.append(point[0], point[1], point_id)
 
-        self.meta[num2id(point_id)] = {
-            'q': 1
-        }
+        if index is None:
+            self._index = self.create_index()
+        else:
+            index.add_point(point)
 
         return point
 
-    def store_edge(self, edge):
-        self.edges.append(edge)
-
     def add_point(self, point, last_point=None):
         logging.debug('add point: %s, last_point: %s', point, last_point[2] if last_point is not None else "-")
 
-        # ball tree needs to be created with first point and no further processing is needed
-        if self.balltree is None:
+        # spatial index needs to be created with first point and no further processing is needed
+        if self.index is None:
             return self.store_point(point)
 
-        final_point = None
-
-        # find nearest neighbor it returns array of tuples (distance, point, node index)
-        # there must be always at least one item in result since tree is not empty
-        nearest = self.balltree.query(point, k=1)
+        # find nearest neighbor it returns array of tuples (distance, point, node index),
+        # grid index returns only points within max spot distance, so result can be empty
+        nearest = self.index.query(point, k=1)
         logging.debug('nearest points: %s', nearest)
-        assert len(nearest) > 0
-
-        if nearest[0][0] < self.max_spot_distance:
-
-            final_point = nearest[0][1]
 
+        if len(nearest) > 0 and nearest[0][0] < self.max_spot_distance:
             logging.debug('reusing existing point, which is %f m far, limit is %f m', nearest[0][0], self.max_spot_distance)
             # NOTE: possibility to store meta information somewhere - we have
-            # an id of the ball tree point in nearest[0][1][2] place
-
-            self.meta[num2id(final_point[2])]['q'] += 1
-
+            # an id of the spatial index point in nearest[0][1][2] place
+            final_point = self.reuse_point(nearest[0][1])
+            metrics.count('spots.reused')
         else:
             #  no existing point was close enough -> create new one
-
             logging.debug('adding point as new: %s', point)
             final_point = self.store_point(point)
+            metrics.count('spots.created')
 
-        # --------------------  edge processing
         if last_point is not None:
-            last_point_id = int(last_point[2])
-            final_point_id = int(final_point[2])
-
-            # ignore self edges
-            if last_point_id != final_point_id:
-                # create edge with sorted point ids to avoid duplicates (reverse direction of track movement)
-                edge = (last_point_id, final_point_id) if last_point_id < final_point_id else (final_point_id, last_point_id)
-                edge_id = f'{edge[0]}-{edge[1]}'
-                if edge in self.edges:
-                    logging.debug('reusing existing edge: %s', edge)
-                    self.meta[edge_id]['q'] += 1
-                else:
-                    logging.debug('adding edge: %s', edge)
-                    self.store_edge(edge)
-                    self.meta[edge_id] = {'q': 1}
+            self.add_edge(last_point[2], final_point[2])
 
         return final_point
 
-    def save(self, filepath):
-        content = {
-            'points': [[p[0], p[1], int(p[2])] for p in self.get_points()],
-            'edges': self.edges,
-            'meta': self.meta
+    def reuse_point(self, point):
+        self.spots.inc(point[2])
+        return point
+
+    def add_edge(self, last_point_id, final_point_id):
+        last_point_id = int(last_point_id)
+        final_point_id = int(final_point_id)
+
+        # ignore self edges
+        if last_point_id == final_point_id:
+            return
+
+        # create edge with sorted point ids to avoid duplicates (reverse direction of track movement)
+        edge = (last_point_id, final_point_id) if last_point_id < final_point_id else (final_point_id, last_point_id)
+        if self.edges.add(edge):
+            logging.debug('added edge: %s', edge)
+            metrics.count('edges.created')
+        else:
+            logging.debug('reused existing edge: %s', edge)
+            metrics.count('edges.reused')
+
+    def add_track(self, points, track_id, track_meta=None):
+        """Adds all points of (interpolated) track to the net
+
+        Nearest spots for all track points are looked up in one batch query
+        of the spatial index of the net. Spots created by the track itself
+        are not part of the batch result, they are looked up in a local
+        grid of cells of max spot distance, so the result is the same as
+        calling add_point for each of the points.
+        """
+
+        if track_meta is None:
+            track_meta = {}
+
+        logging.debug('registering new track: %s, %s', track_id, track_meta)
+        track_meta['id'] = track_id
+        self.tracks.append(track_meta)
+
+        if len(points) == 0:
+            return
+
+        coords = np.asarray(points, dtype=float)[:, :2]
+
+        # batch lookup of nearest spots existing before the track was added
+        with metrics.timer('net.spot_lookup'):
+            if self.index is not None:
+                nearest_dist, nearest_ids = self.index.query_nearest(coords, self.max_spot_distance)
+            else:
+                nearest_dist, nearest_ids = np.full(coords.shape[0], np.inf), np.full(coords.shape[0], -1)
+
+        # spots created by this track
+        new_spots = GridIndex([], self.max_spot_distance)
+
+        with metrics.timer('net.update'):
+            last_point_id = None
+            for point, distance, final_point_id in zip(coords.tolist(), nearest_dist.tolist(), nearest_ids.tolist()):
+                nearest = new_spots.query(point)
+                if len(nearest) > 0 and nearest[0][0] < distance:
+                    distance = nearest[0][0]
+                    final_point_id = nearest[0][1][2]
+
+                if distance < self.max_spot_distance:
+                    self.spots.inc(final_point_id)
+                else:
+                    new_point = self.store_point(point)
+                    new_spots.add_point(new_point)
+                    final_point_id = new_point[2]
+
+                if last_point_id is not None:
+                    self.add_edge(last_point_id, final_point_id)
+
+                last_point_id = final_point_id
+
+        metrics.count('spots.created', new_spots.size)
+        metrics.count('spots.reused', coords.shape[0] - new_spots.size)
+
+    def save(self, filepath, output_format='gnt', show_points=True):
+
+        logging.info("saving net content to %s (output_format: %s)", filepath, output_format)
+
+        if output_format == 'gnb':
+            self._save_binary(filepath)
+
+        elif output_format == 'js':
+            with open(filepath, 'w', encoding='utf-8') as output_file:
+                output_file.write('geonet={"geojson": ')
+                self.write_geojson(output_file, show_points=show_points)
+                output_file.write(', "meta": ' + json.dumps(self.get_meta(), indent=4) + '}')
+
+        else:
+            content = {
+                'points': self.get_points(),
+                'edges': [list(edge) for edge in self.edges],
+                'meta': {**self.get_spots_meta(), **{f'{a}-{b}': {'q': q} for (a, b), q in self.edges.items()}},
+                'tracks': self.tracks
+            }
+
+            # spots between ends of polyline edges of simplified net
+            if self.edges.via is not None:
+                content['via'] = {f'{a}-{b}': self.edges.get_via(row) for row, (a, b) in enumerate(self.edges)}
+
+            with open(filepath, 'w', encoding='utf-8') as json_file:
+                json.dump(content, json_file)
+
+    def _save_binary(self, filepath):
+        """Saves net to binary net file (see netfile), kd tree spot index is
+        stored too, so it doesn't need to be built when the net is loaded"""
+
+        spots = self.spots.columns()
+        edges = self.edges.columns()
+        arrays = {
+            'spots.lat': spots['lat'],
+            'spots.lon': spots['lon'],
+            'spots.id': spots['id'],
+            'spots.q': spots['q'],
+            'edges.p1': edges['p1'],
+            'edges.p2': edges['p2'],
+            'edges.q': edges['q']
         }
 
-        with open(filepath, 'w', encoding='utf-8') as json_file:
-            json.dump(content, json_file)
+        if 'via' in edges:
+            arrays['edges.via_offsets'] = edges['via_offsets']
+            arrays['edges.via'] = edges['via']
+
+        # stored trees of loaded net are saved without restoring them
+        if isinstance(self._index, dict) and 'nodes' in self._index:
+            trees = self._index
+        elif self.spot_index == 'kdtree' and self.index is not None:
+            trees = self.index.to_arrays()
+        else:
+            trees = {}
+        arrays.update({f'kdtree.{name}': array for name, array in trees.items()})
+
+        netfile.write_net(filepath, arrays, {
+            'tracks': self.tracks,
+            'last_id': self.last_id,
+            'max_spot_distance': self.max_spot_distance,
+            'kdtree_format': NODES_FORMAT
+        })
 
     def load(self, filepath):
 
+        if netfile.is_net_file(filepath):
+            self._load_binary(filepath)
+            return
+
         with open(filepath, encoding='utf-8') as json_file:
             data = json.load(json_file)
-            self.meta = data['meta']
-            self.edges = data['edges']
-            # set last_id to max of ids in points
-            self.balltree = BallTree(data['points'])
-
-    def to_geojson(self, show_points=True, show_edges=True):
-        geos = []
-
-        points = self.balltree.get_points()
-
-        index = {}
-
-        # render edges and build dict of points for searching
-        for point in points:
-
-            if show_points:
-                point_id = num2id(point[2])
-                point_meta = self.meta[point_id]
-
-                pnt = {
-                    'type': 'Feature',
-                    'properties': {
-                        'spot': point_id,
-                        'q': point_meta['q']
-                    },
-                    'geometry': {
-                        'coordinates': point_to_geojson(point),
-                        'type': 'Point'
-                    }
-                }
-                geos.append(pnt)
 
-            index[int(point[2])] = point
+            # json net of database net
+            if 'meta' not in data:
+                self._load_arrays(*netfile.from_json(data))
+                return
+
+            if 'via' in data:
+                self.edges = EdgeTable.from_lines([{'spots': [a] + data['via'][f'{a}-{b}'] + [b], 'q': data['meta'][f'{a}-{b}']['q']} for a, b in data['edges']])
+            else:
+                self.edges = EdgeTable()
+                for a, b in data['edges']:
+                    self.edges[(a, b)] = data['meta'][f'{a}-{b}']['q']
+
+            # spots are stored in order of their ids
+            self.spots = SpotTable()
+            for point in sorted(data['points'], key=lambda p: p[2]):
+                self.spots.append(point[0], point[1], point[2], data['meta'][num2id(point[2])]['q'])
+
+            self.tracks = data.get('tracks', [])
+
+            # new spots get ids following the highest loaded id
+            self.last_id = max((int(point[2]) + 1 for point in data['points']), default=0)
+            self._index = None
+
+    def _load_binary(self, filepath):
+        """Opens binary net file, columns of spots and edges are memory mapped
+        and spot index is restored on first use"""
+
+        self._load_arrays(*netfile.read_net(filepath))
+
+    def _load_arrays(self, arrays, meta):
+        """Sets columns of spots and edges to arrays (see netfile)"""
+
+        self.spots = SpotTable.from_columns(arrays['spots.lat'], arrays['spots.lon'], arrays['spots.id'], arrays['spots.q'])
+        self.edges = EdgeTable.from_columns(arrays['edges.p1'], arrays['edges.p2'], arrays['edges.q'], arrays.get('edges.via_offsets'), arrays.get('edges.via'))
+        self.tracks = meta['tracks']
+        self.last_id = meta['last_id']
+        self.max_spot_distance = meta.get('max_spot_distance', self.max_spot_distance)
+
+        # stored kd tree is used only by net with kd tree spot index, nodes
+        # stored by other version of scipy are not used (trees are built)
+        if self.spot_index == 'kdtree' and 'kdtree.blocks' in arrays:
+            self._index = {name[len('kdtree.'):]: array for name, array in arrays.items() if name.startswith('kdtree.')}
+            if meta.get('kdtree_format') != NODES_FORMAT:
+                self._index = {'blocks': self._index['blocks']}
+        else:
+            self._index = None
+
+    def get_meta(self):
+        return {
+            'tracks': self.tracks
+        }
+
+    def get_spots_meta(self):
+        spots = self.spots.columns()
+        return {num2id(spot_id): {'q': q} for spot_id, q in zip(spots['id'].tolist(), spots['q'].tolist())}
+
+    def simplify(self, min_q=2, merge_distance=simplify.MERGE_DISTANCE):
+        """Simplifies graph of the net (see simplify), edges are replaced
+        by polyline edges between junctions, spots are kept"""
+
+        spots, edges = self.columns()
+        lines = simplify.simplify(spots, edges, min_q, merge_distance)
+        logging.info('simplified net: %d edges -> %d polyline edges', len(self.edges), len(lines))
+
+        self.edges = EdgeTable.from_lines(lines)
+
+    def _rect_rows(self, rect):
+        """rows of spots inside rect and rows of edges touching it"""
+        ids = [point[2] for point in self.index.query_rect(rect)] if self.index is not None else []
+        spot_rows = np.array(sorted(self.spots.row(spot_id) for spot_id in ids), dtype=np.int64)
+        return spot_rows, self.edges.spot_edges(ids)
+
+    def query_rect(self, rect):
+        """Spots inside lat/lon rect (see Rect) and edges touching it (any of
+        their spots is inside) as columns (see columns), spots are looked up
+        by spatial index"""
+
+        spot_rows, edge_rows = self._rect_rows(rect)
+        spots = {name: column[spot_rows] for name, column in self.spots.columns().items()}
+        edges = {name: column[edge_rows] for name, column in self.edges.columns().items() if name in ('p1', 'p2', 'q')}
+
+        if self.edges.via is not None:
+            edges['via_offsets'], edges['via'] = netfile.from_lists([self.edges.get_via(row) for row in edge_rows.tolist()])
+
+        return spots, edges
+
+    def _geojson_features(self, show_points=True, show_edges=True, precision=None, rect=None):
+        """generator of geojson features of spots and edges (only spots inside
+        rect and edges touching it if rect is given), columns are converted in
+        chunks"""
+
+        spots = self.spots.columns()
+        spot_rows, edge_rows = self._rect_rows(rect) if rect is not None else (None, None)
+
+        # render points
+        if show_points:
+            points = spots if spot_rows is None else {name: column[spot_rows] for name, column in spots.items()}
+            for start, coordinates in geojson.coordinates_chunks(points['lat'], points['lon'], precision):
+                ids = points['id'][start:start + len(coordinates)].tolist()
+                qs = points['q'][start:start + len(coordinates)].tolist()
+                for spot_id, q, point in zip(ids, qs, coordinates):
+                    yield {
+                        'type': 'Feature',
+                        'properties': {
+                            'spot': num2id(spot_id),
+                            'q': q
+                        },
+                        'geometry': {
+                            'coordinates': point,
+                            'type': 'Point'
+                        }
+                    }
 
         # render edges
         if show_edges:
-
-            for edge in self.edges:
-                p1 = index[edge[0]]
-                p2 = index[edge[1]]
-                edge_id = f'{edge[0]}-{edge[1]}'
-                line = {
-                    'type': 'Feature',
-                    'properties': {
-                        'edge': edge_id,
-                        'q': self.meta[edge_id]['q']
-                    },
-                    'geometry': {
-                        'coordinates': [point_to_geojson(p1), point_to_geojson(p2)],
-                        'type': 'LineString'
+            edges = self.edges.columns()
+            edge_rows = np.arange(len(self.edges)) if edge_rows is None else edge_rows
+            for start in range(0, len(edge_rows), geojson.CHUNK_SIZE):
+                rows = edge_rows[start:start + geojson.CHUNK_SIZE]
+                p1 = edges['p1'][rows].tolist()
+                p2 = edges['p2'][rows].tolist()
+                qs = edges['q'][rows].tolist()
+
+                r1 = [self.spots.row(spot_id) for spot_id in p1]
+                r2 = [self.spots.row(spot_id) for spot_id in p2]
+                c1 = geojson.coordinates_list(spots['lat'][r1], spots['lon'][r1], precision)
+                c2 = geojson.coordinates_list(spots['lat'][r2], spots['lon'][r2], precision)
+
+                for row, a, b, q, point1, point2 in zip(rows.tolist(), p1, p2, qs, c1, c2):
+                    # polyline edges of simplified net go through via spots
+                    via = [self.spots.row(spot_id) for spot_id in self.edges.get_via(row)]
+                    via = geojson.coordinates_list(spots['lat'][via], spots['lon'][via], precision) if via else []
+                    yield {
+                        'type': 'Feature',
+                        'properties': {
+                            'edge': f'{a}-{b}',
+                            'q': q
+                        },
+                        'geometry': {
+                            'coordinates': [point1] + via + [point2],
+                            'type': 'LineString'
+                        }
                     }
-                }
-                geos.append(line)
 
-        geometries = {
-            'type': 'FeatureCollection',
-            'features': geos,
-        }
+    def write_geojson(self, output, compact=False, **options):
+        """writes net as geojson feature collection to file handle, options
+        (show_points, show_edges, precision and rect) select features"""
+        geojson.write_geojson(output, self._geojson_features(**options), compact)
 
-        return json.dumps(geometries, indent=4)
+    def to_geojson(self, compact=False, **options):
+        return geojson.to_geojson(self._geojson_features(**options), compact)
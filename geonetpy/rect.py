@@ -4,6 +4,26 @@ class Rect:
         self.point1 = point1
         self.point2 = point2
 
+    @classmethod
+    def from_bbox(cls, bbox):
+        """rect of geojson bbox [west, south, east, north]"""
+        west, south, east, north = bbox
+        return cls([south, west], [north, east])
+
+    def get_bounds(self):
+        """[min lat, min lon, max lat, max lon] (corners may be in any order)"""
+        return [
+            min(self.point1[0], self.point2[0]),
+            min(self.point1[1], self.point2[1]),
+            max(self.point1[0], self.point2[0]),
+            max(self.point1[1], self.point2[1])
+        ]
+
+    def contains(self, point):
+        """true if [lat, lon] point is inside rect (or on its border)"""
+        min_lat, min_lon, max_lat, max_lon = self.get_bounds()
+        return min_lat <= point[0] <= max_lat and min_lon <= point[1] <= max_lon
+
     def get_center(self):
         return [
             self.point1[0] + (self.point2[0] - self.point1[0]) / 2,
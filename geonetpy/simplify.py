@@ -0,0 +1,149 @@
+"""
+Simplification of net graph
+
+Spots are nodes and edges are links of an undirected graph. Simplification
+repeats following steps until nothing changes:
+
+* chains of spots of degree 2 are contracted to polyline edges (lines)
+  between junctions (spots of other degree than 2),
+* parallel lines (lines between the same junctions) are merged if each
+  spot of one line is within merge distance of the other line, geometry of
+  line with highest q is kept and q of merged lines is summed,
+* spurs (lines from a junction to a dead end) with q lower than min_q are
+  dropped.
+
+Result is list of lines, each line has spots (list of spot ids from one end
+to the other), q (maximal q of its edges) and edges (indexes of original
+edges the line consists of).
+"""
+
+from collections import defaultdict
+import numpy as np
+from .geoutils import haversine_distances
+
+# default maximal distance (in meters) of parallel lines to be merged
+MERGE_DISTANCE = 150
+
+def walk(start, edge, ends, adjacency, visited):
+    """walks from start spot along edge through spots of degree 2, returns
+    spots and edges of the walk"""
+    p1, p2 = ends
+    spots = [start]
+    edges = [edge]
+    visited.add(edge)
+    node = start
+    while True:
+        node = p2[edge] if p1[edge] == node else p1[edge]
+        spots.append(node)
+        if len(adjacency[node]) != 2 or node == start:
+            break
+        edge = adjacency[node][0] if adjacency[node][1] == edge else adjacency[node][1]
+        if edge in visited:
+            break
+        visited.add(edge)
+        edges.append(edge)
+    return spots, edges
+
+def contract(p1, p2, q, active):
+    """contracts chains of spots of degree 2 of active edges to lines"""
+
+    adjacency = defaultdict(list)
+    for e in np.nonzero(active)[0].tolist():
+        adjacency[p1[e]].append(e)
+        adjacency[p2[e]].append(e)
+
+    # lines start in junctions, remaining edges form cycles without junctions
+    starts = [(node, edge) for node, node_edges in adjacency.items() if len(node_edges) != 2 for edge in node_edges]
+    starts += [(p1[edge], edge) for edge in np.nonzero(active)[0].tolist()]
+
+    visited = set()
+    lines = []
+    for node, edge in starts:
+        if edge not in visited:
+            spots, edges = walk(node, edge, (p1, p2), adjacency, visited)
+            lines.append({'spots': spots, 'edges': edges, 'q': max(q[e] for e in edges)})
+
+    return lines, {node: len(node_edges) for node, node_edges in adjacency.items()}
+
+def is_parallel(line1, line2, coordinates, merge_distance):
+    """true if every spot of one line is within merge distance of the other line"""
+    points1 = np.array([coordinates[s] for s in line1['spots']])
+    points2 = np.array([coordinates[s] for s in line2['spots']])
+    distances = haversine_distances(points1[:, None, :], points2[None, :, :])
+    return max(distances.min(axis=1).max(), distances.min(axis=0).max()) <= merge_distance
+
+def merge_parallel(lines, coordinates, merge_distance):
+    """merges parallel lines, returns lines and list of merged (removed) lines"""
+
+    groups = defaultdict(list)
+    for line in lines:
+        ends = line['spots'][0], line['spots'][-1]
+        groups[min(ends), max(ends)].append(line)
+
+    result = []
+    removed = []
+    for group in groups.values():
+        group.sort(key=lambda line: line['q'], reverse=True)
+        while group:
+            line = group.pop(0)
+            rest = []
+            for other in group:
+                if other['spots'][0] != other['spots'][-1] and is_parallel(line, other, coordinates, merge_distance):
+                    line['q'] += other['q']
+                    line['merged'] = line.get('merged', 0) + other['q']
+                    removed.append(other)
+                else:
+                    rest.append(other)
+            group = rest
+            result.append(line)
+
+    return result, removed
+
+def expand_via(line, p1, via):
+    """spots of line including via spots of its edges (net simplified before)"""
+    spots = line['spots'][:1]
+    for i, edge in enumerate(line['edges']):
+        spots.extend(via[edge] if p1[edge] == line['spots'][i] else via[edge][::-1])
+        spots.append(line['spots'][i + 1])
+    return {**line, 'spots': spots}
+
+def simplify(spots, edges, min_q=2, merge_distance=MERGE_DISTANCE):
+    """Simplifies graph given by columns of spots (lat, lon, id) and edges
+    (p1, p2, q and optionally via_offsets and via of polyline edges),
+    returns list of lines"""
+
+    p1 = np.asarray(edges['p1']).tolist()
+    p2 = np.asarray(edges['p2']).tolist()
+    q = np.asarray(edges['q']).tolist()
+    coordinates = dict(zip(np.asarray(spots['id']).tolist(), zip(np.asarray(spots['lat']).tolist(), np.asarray(spots['lon']).tolist())))
+
+    active = np.ones(len(q), dtype=bool)
+    while True:
+        lines, degree = contract(p1, p2, q, active)
+        lines, removed = merge_parallel(lines, coordinates, merge_distance)
+
+        # spurs are dropped only if other end is a junction, so isolated
+        # lines are kept
+        for line in lines:
+            ends = sorted([degree[line['spots'][0]], degree[line['spots'][-1]]])
+            if ends[0] == 1 and ends[1] > 2 and line['q'] < min_q:
+                removed.append(line)
+
+        if len(removed) == 0:
+            break
+
+        for line in removed:
+            active[line['edges']] = False
+
+        # q of merged lines is kept in edges of the line they were merged to
+        for line in lines:
+            for e in line['edges']:
+                q[e] += line.get('merged', 0)
+
+    if 'via' in edges:
+        offsets = np.asarray(edges['via_offsets']).tolist()
+        via = np.asarray(edges['via']).tolist()
+        via = [via[offsets[i]:offsets[i + 1]] for i in range(len(p1))]
+        lines = [expand_via(line, p1, via) for line in lines]
+
+    return lines
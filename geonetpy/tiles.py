@@ -0,0 +1,246 @@
+"""
+Vector tiles of a net
+
+Spots and edges are cut into z/x/y pyramid of web mercator tiles encoded as
+Mapbox vector tiles (layers spots and edges). Each zoom level is simplified
+separately: edges are snapped to the pixel grid of the zoom (tile extent),
+edges collapsed to a single pixel are dropped, edges with the same snapped
+geometry are merged (the one with highest q is kept) and number of
+features in a tile is limited, features with highest q are kept. Spots are
+rendered only from points_min_zoom.
+
+Zoom levels are independent, so they are generated by pool of processes.
+Tiles are written to a directory (z/x/y.pbf) or to MBTiles (sqlite) file.
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from . import mvt
+
+MAX_LATITUDE = 85.0511287798
+
+# default limit of features of one layer in a tile
+MAX_FEATURES = 4096
+
+# default minimal zoom level of spots layer
+POINTS_MIN_ZOOM = 14
+
+def to_tile_coordinates(lat, lon, zoom):
+    """web mercator coordinates in units of tiles of zoom level"""
+    n = 2 ** zoom
+    lat = np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE))
+    x = (np.asarray(lon) + 180.0) / 360.0 * n
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0 * n
+    return x, y
+
+def spot_rows(spot_ids, ids):
+    """rows of spots with ids in column of spot ids"""
+    order = np.argsort(spot_ids, kind='stable')
+    return order[np.searchsorted(spot_ids[order], ids)]
+
+def limit_per_tile(tile_x, tile_y, q, max_features):
+    """indexes of items with highest q, at most max_features per tile, sorted by tile"""
+    order = np.lexsort((-q, tile_y, tile_x))
+    tile_x = tile_x[order]
+    tile_y = tile_y[order]
+
+    # position of item in its tile
+    starts = np.concatenate([[True], (tile_x[1:] != tile_x[:-1]) | (tile_y[1:] != tile_y[:-1])])
+    first = np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))
+
+    return order[np.arange(len(order)) - first < max_features]
+
+def merge_pixels(keys, q):
+    """indexes of unique rows of keys, row with highest q is kept"""
+    if len(q) == 0:
+        return np.empty(0, dtype=np.int64)
+    order = np.argsort(-q, kind='stable')
+    _, first = np.unique(keys[order], axis=0, return_index=True)
+    return order[first]
+
+def polyline_segments(edges):
+    """edges (p1, p2, q) of segments of polyline edges (simplified net), each
+    segment has q of its polyline"""
+    p1 = np.asarray(edges['p1'], dtype=np.int64)
+    p2 = np.asarray(edges['p2'], dtype=np.int64)
+    offsets = np.asarray(edges['via_offsets'], dtype=np.int64)
+    via = np.asarray(edges['via'], dtype=np.int64)
+    counts = np.diff(offsets)
+
+    # spots of polylines one after another, p1 + via + p2 of each edge
+    ends = offsets[1:] + 2 * np.arange(1, len(p1) + 1)
+    spots = np.empty(len(via) + 2 * len(p1), dtype=np.int64)
+    spots[ends - counts - 2] = p1
+    spots[ends - 1] = p2
+    inner = np.ones(len(spots), dtype=bool)
+    inner[ends - counts - 2] = False
+    inner[ends - 1] = False
+    spots[inner] = via
+
+    # segments between consecutive spots of the same polyline
+    last = np.zeros(len(spots), dtype=bool)
+    last[ends - 1] = True
+    starts = np.nonzero(~last)[0]
+    return {
+        'p1': spots[starts],
+        'p2': spots[starts + 1],
+        'q': np.repeat(np.asarray(edges['q']), counts + 1)
+    }
+
+def zoom_tiles(spots, edges, zoom, max_features=MAX_FEATURES, points_min_zoom=POINTS_MIN_ZOOM):
+    """Tiles of zoom level as list of tuples (zoom, x, y, encoded tile)"""
+
+    n = 2 ** zoom
+    x, y = to_tile_coordinates(spots['lat'], spots['lon'], zoom)
+
+    # global pixel coordinates
+    px = np.round(x * mvt.EXTENT).astype(np.int64)
+    py = np.round(y * mvt.EXTENT).astype(np.int64)
+
+    layers = {}
+
+    def layer(tile, name):
+        tile_layers = layers.setdefault(tile, {})
+        return tile_layers.setdefault(name, mvt.LayerEncoder(name))
+
+    # edges
+    r1 = spot_rows(spots['id'], edges['p1'])
+    r2 = spot_rows(spots['id'], edges['p2'])
+    q = np.asarray(edges['q'])
+
+    visible = (px[r1] != px[r2]) | (py[r1] != py[r2])
+    ix = np.nonzero(visible)[0]
+    ix = ix[merge_pixels(np.column_stack([px[r1[ix]], py[r1[ix]], px[r2[ix]], py[r2[ix]]]), q[ix])]
+
+    # edge is added to all tiles of its bounding box
+    tx1 = np.clip(np.minimum(x[r1[ix]], x[r2[ix]]).astype(np.int64), 0, n - 1)
+    tx2 = np.clip(np.maximum(x[r1[ix]], x[r2[ix]]).astype(np.int64), 0, n - 1)
+    ty1 = np.clip(np.minimum(y[r1[ix]], y[r2[ix]]).astype(np.int64), 0, n - 1)
+    ty2 = np.clip(np.maximum(y[r1[ix]], y[r2[ix]]).astype(np.int64), 0, n - 1)
+
+    items = []
+    for dx in range(int(np.max(tx2 - tx1, initial=0)) + 1):
+        for dy in range(int(np.max(ty2 - ty1, initial=0)) + 1):
+            mask = (tx1 + dx <= tx2) & (ty1 + dy <= ty2)
+            items.append((ix[mask], tx1[mask] + dx, ty1[mask] + dy))
+
+    if items:
+        edge_ix, edge_tx, edge_ty = (np.concatenate(column) for column in zip(*items))
+        for i in limit_per_tile(edge_tx, edge_ty, q[edge_ix], max_features):
+            e = edge_ix[i]
+            tile = (int(edge_tx[i]), int(edge_ty[i]))
+            origin_x = tile[0] * mvt.EXTENT
+            origin_y = tile[1] * mvt.EXTENT
+            a = r1[e]
+            b = r2[e]
+            layer(tile, 'edges').add_feature(
+                mvt.LINESTRING,
+                [(int(px[a] - origin_x), int(py[a] - origin_y)), (int(px[b] - origin_x), int(py[b] - origin_y))],
+                {'edge': f'{edges["p1"][e]}-{edges["p2"][e]}', 'q': int(q[e])})
+
+    # spots
+    if zoom >= points_min_zoom:
+        spot_q = np.asarray(spots['q'])
+        ix = merge_pixels(np.column_stack([px, py]), spot_q)
+        tx = np.clip(x[ix].astype(np.int64), 0, n - 1)
+        ty = np.clip(y[ix].astype(np.int64), 0, n - 1)
+        for i in limit_per_tile(tx, ty, spot_q[ix], max_features):
+            s = ix[i]
+            tile = (int(tx[i]), int(ty[i]))
+            layer(tile, 'spots').add_feature(
+                mvt.POINT,
+                [(int(px[s] - tile[0] * mvt.EXTENT), int(py[s] - tile[1] * mvt.EXTENT))],
+                {'spot': str(spots['id'][s]), 'q': int(spot_q[s])})
+
+    return [(zoom, tile[0], tile[1], mvt.encode_tile(tile_layers.values())) for tile, tile_layers in layers.items()]
+
+def generate_tiles(spots, edges, zooms, workers=1, **options):
+    """Generator of tiles (zoom, x, y, encoded tile) of zoom levels, spots
+    and edges are dicts of columns (see SpotTable and EdgeTable), options
+    are passed to zoom_tiles"""
+
+    spots = {name: np.asarray(column) for name, column in spots.items()}
+    edges = {name: np.asarray(column) for name, column in edges.items()}
+
+    # polyline edges of simplified net are cut to segments
+    if 'via' in edges:
+        edges = polyline_segments(edges)
+
+    if workers <= 1:
+        for zoom in zooms:
+            yield from zoom_tiles(spots, edges, zoom, **options)
+        return
+
+    # the highest zoom levels take the longest time, they are submitted first
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(zoom_tiles, spots, edges, zoom, **options) for zoom in sorted(zooms, reverse=True)]
+        for future in as_completed(futures):
+            yield from future.result()
+
+def get_bounds(spots):
+    """[west, south, east, north] of spots"""
+    if len(spots['lat']) == 0:
+        return [-180.0, -MAX_LATITUDE, 180.0, MAX_LATITUDE]
+    return [float(np.min(spots['lon'])), float(np.min(spots['lat'])), float(np.max(spots['lon'])), float(np.max(spots['lat']))]
+
+def tiles_meta(spots, min_zoom, max_zoom):
+    """tilejson like description of tiles"""
+    bounds = get_bounds(spots)
+    return {
+        'format': 'pbf',
+        'minzoom': min_zoom,
+        'maxzoom': max_zoom,
+        'bounds': bounds,
+        'center': [(bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2, max(min_zoom, min(13, max_zoom))],
+        'vector_layers': [
+            {'id': 'spots', 'fields': {'spot': 'String', 'q': 'Number'}, 'minzoom': min_zoom, 'maxzoom': max_zoom},
+            {'id': 'edges', 'fields': {'edge': 'String', 'q': 'Number'}, 'minzoom': min_zoom, 'maxzoom': max_zoom}
+        ]
+    }
+
+def write_directory(path, tiles, meta):
+    """writes tiles to path/z/x/y.pbf (not compressed), returns number of tiles"""
+    count = 0
+    for zoom, x, y, data in tiles:
+        tile_dir = os.path.join(path, str(zoom), str(x))
+        os.makedirs(tile_dir, exist_ok=True)
+        with open(os.path.join(tile_dir, f'{y}.pbf'), 'wb') as tile_file:
+            tile_file.write(data)
+        count += 1
+
+    with open(os.path.join(path, 'metadata.json'), 'w', encoding='utf-8') as meta_file:
+        json.dump(meta, meta_file, indent=4)
+
+    return count
+
+def write_mbtiles(path, tiles, meta):
+    """writes tiles to MBTiles file (gzip compressed, rows in TMS scheme), returns number of tiles"""
+    if os.path.exists(path):
+        os.remove(path)
+
+    count = 0
+    with sqlite3.connect(path) as db:
+        db.execute('CREATE TABLE metadata (name TEXT, value TEXT)')
+        db.execute('CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)')
+        db.execute('CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)')
+
+        for zoom, x, y, data in tiles:
+            db.execute('INSERT INTO tiles VALUES (?, ?, ?, ?)', (zoom, x, 2 ** zoom - 1 - y, gzip.compress(data)))
+            count += 1
+
+        db.executemany('INSERT INTO metadata VALUES (?, ?)', [
+            ('name', meta.get('name', 'geonet')),
+            ('format', 'pbf'),
+            ('minzoom', str(meta['minzoom'])),
+            ('maxzoom', str(meta['maxzoom'])),
+            ('bounds', ','.join(str(b) for b in meta['bounds'])),
+            ('center', ','.join(str(c) for c in meta['center'])),
+            ('json', json.dumps({'vector_layers': meta['vector_layers']}))
+        ])
+    db.close()
+
+    return count
@@ -0,0 +1,84 @@
+"""
+Index of reference tracks for matching new tracks against all of them
+
+Points of all reference tracks are stored in one KD tree (points projected
+to sphere of earth radius, see match.match with tolerance_m) together with
+ids of their tracks. New track is matched against all reference tracks by
+one query of the tree.
+"""
+
+import numpy as np
+import scipy.spatial
+from .geoutils import haversine_distances, to_xyz, chord_length, EARTH_RADIUS
+
+def track_segment_lengths(points):
+    """length of segment ending in each of points (0 for first point)"""
+    points = np.asarray(points, dtype=float)[:, :2]
+    return np.concatenate([[0], haversine_distances(points[:-1], points[1:])])
+
+class TrackIndex:
+    def __init__(self, tolerance_m):
+        # tolerance in meters -> chord length
+        self.tolerance = chord_length(tolerance_m) * EARTH_RADIUS
+
+        self.track_ids = []
+        self.chunks = []
+        self.tree = None
+        self.point_tracks = None
+        self.point_lengths = None
+        self.track_lengths = None
+
+    def add_track(self, points, track_id):
+        """adds reference track, index is rebuilt on next match"""
+        points = np.asarray(points, dtype=float)[:, :2]
+        self.chunks.append((points, np.full(points.shape[0], len(self.track_ids)), track_segment_lengths(points)))
+        self.track_ids.append(track_id)
+        self.tree = None
+
+    def build(self):
+        self.point_tracks = np.concatenate([c[1] for c in self.chunks])
+        self.point_lengths = np.concatenate([c[2] for c in self.chunks])
+        self.track_lengths = np.bincount(self.point_tracks, weights=self.point_lengths, minlength=len(self.track_ids))
+        self.tree = scipy.spatial.cKDTree(to_xyz(np.vstack([c[0] for c in self.chunks])) * EARTH_RADIUS)
+
+    def match(self, points):
+        """Matches track against all reference tracks
+
+        Returns list of overlapping reference tracks sorted by ratio, ratio is
+        part of track length which is within tolerance of reference track,
+        ref_ratio is part of reference track length within tolerance of track.
+        """
+
+        if len(self.track_ids) == 0 or len(points) == 0:
+            return []
+
+        if self.tree is None:
+            self.build()
+
+        points = np.asarray(points, dtype=float)[:, :2]
+        lengths = track_segment_lengths(points)
+
+        # all pairs (point of track, point of reference track) within tolerance
+        pairs = scipy.spatial.cKDTree(to_xyz(points) * EARTH_RADIUS).sparse_distance_matrix(self.tree, self.tolerance, output_type='ndarray')
+        pair_tracks = self.point_tracks[pairs['j']]
+
+        # matched points of track for each of reference tracks
+        matched = np.unique(pair_tracks.astype(np.int64) * points.shape[0] + pairs['i'])
+        matched_length = np.bincount(matched // points.shape[0], weights=lengths[matched % points.shape[0]], minlength=len(self.track_ids))
+
+        # matched points of reference tracks
+        ref_matched = np.unique(pairs['j'])
+        ref_matched_length = np.bincount(self.point_tracks[ref_matched], weights=self.point_lengths[ref_matched], minlength=len(self.track_ids))
+
+        total_length = lengths.sum()
+        result = []
+        for track_ix in np.unique(pair_tracks):
+            result.append({
+                'track': self.track_ids[track_ix],
+                'ratio': matched_length[track_ix] / total_length if total_length > 0 else 1.0,
+                'ref_ratio': ref_matched_length[track_ix] / self.track_lengths[track_ix] if self.track_lengths[track_ix] > 0 else 1.0
+            })
+
+        result.sort(key=lambda r: r['ratio'], reverse=True)
+
+        return result
@@ -1,13 +1,16 @@
 #!/usr/bin/env python
 import os
+import json
 import sys
 import logging
 import string
-import gpxpy.gpx
+import cProfile
 import click
-from geonetpy import match, interpolation, geojson
+from geonetpy import match, interpolation, geojson, loader, metrics, netfile, simplify, tiles, trackindex
+from geonetpy.cache import TrackCache
 from geonetpy.netdb import NetDb
-from geonetpy.netmem import NetMem
+from geonetpy.netmem import NetMem, SPOT_INDEXES
+from geonetpy.rect import Rect
 
 DEFAULT_INTERPOLATION_MAX_DISTANCE = 30
 
@@ -29,57 +32,182 @@ def change_file_extension(file_path, new_extension):
         new_extension = "." + new_extension
     return base_name + new_extension
 
+def write_html(tpl_path, html_path, title, meta, write_geojson):
+    """Writes html page from template, template is split at $geojson and
+    geojson is streamed by write_geojson(file) between both parts"""
+
+    print(f'generating html content from template {tpl_path}')
+    with open(tpl_path, 'r') as tpl_file:
+        head, tail = tpl_file.read().split('$geojson', 1)
+
+    values = {'title': title, 'meta': json.dumps(meta)}
+
+    print(f'writing html to {html_path}')
+    with metrics.timer('output.html'), open(html_path, 'w') as html_file:
+        html_file.write(string.Template(head).substitute(values))
+        write_geojson(html_file)
+        html_file.write(string.Template(tail).substitute(values))
+
+def open_net(file):
+    """Binary net files are opened in memory (memory mapped), other files
+    are loaded to database"""
+    n = NetMem() if netfile.is_net_file(file) else NetDb(DB_URI)
+    with metrics.timer('net.load'):
+        n.load(file)
+    return n
+
+def write_outputs(n, output, output_format, precision=None, compact=False):
+    """writes net to output files of all output formats"""
+
+    if 'html' in output_format:
+        write_html('templates/tpl_map.html', f'{output}.html', 'Net', {}, lambda f: n.write_geojson(f, precision=precision, compact=compact))
+
+    if 'geojson' in output_format:
+        json_path = f'{output}.json'
+        print(f'writing geojson to {json_path}')
+        with metrics.timer('output.geojson'), open(json_path, 'w') as json_file:
+            n.write_geojson(json_file, precision=precision, compact=compact)
+
+    if 'gnt' in output_format:
+        gnt_path = f'{output}.gnt'
+        print(f'writing net to {gnt_path}')
+        with metrics.timer('output.gnt'):
+            n.save(gnt_path)
+
+    if 'gnb' in output_format:
+        gnb_path = f'{output}.gnb'
+        print(f'writing net to {gnb_path}')
+        with metrics.timer('output.gnb'):
+            n.save(gnb_path, 'gnb')
+
+def track_cache():
+    """cache of tracks configured by root command (None if disabled)"""
+    return click.get_current_context().find_root().obj['cache']
+
+def add_tracks(n, files, first_track_id, load_args, add_track_args):
+    """adds tracks (file names or tuples of file name and content hash, see
+    loader.load_tracks) to net, ids of tracks start with first track id, load
+    args are passed to loader"""
+
+    for counter, (filename, count, points, content_hash) in enumerate(loader.load_tracks(files, *load_args, cache=track_cache())):
+        click.echo(f'adding {filename} {counter + 1}/{len(files)}')
+        print('number of points in track:', count)
+        print('number of points in track after interpolation:', points.shape[0])
+        print(f'adding {points.shape[0]} points to the net')
+
+        with metrics.timer('net.add_track'):
+            n.add_track(points, first_track_id + counter, {'name': os.path.basename(filename), 'hash': content_hash}, **add_track_args)
+
+def start_profiler(profile, profiler):
+    """Starts profiler, returns function which stops it and writes profile
+    (cProfile stats, pyinstrument html or text report) to file"""
+
+    if profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler   # pylint: disable=import-outside-toplevel
+        except ImportError as e:
+            raise click.UsageError('pyinstrument profiler is not installed (pip install pyinstrument)') from e
+
+        instrument = Profiler()
+        instrument.start()
+
+        def stop_instrument():
+            instrument.stop()
+            with open(profile, 'w', encoding='utf-8') as profile_file:
+                profile_file.write(instrument.output_html() if profile.endswith('.html') else instrument.output_text())
+            logging.info('profile written to %s', profile)
+
+        return stop_instrument
+
+    cprofile = cProfile.Profile()
+    cprofile.enable()
+
+    def stop_cprofile():
+        cprofile.disable()
+        cprofile.dump_stats(profile)
+        logging.info('profile written to %s (python -m pstats %s)', profile, profile)
+
+    return stop_cprofile
+
+def write_metrics(metrics_out):
+    for line in metrics.format_metrics(metrics.snapshot()):
+        logging.info('%s', line)
+    metrics.save(metrics_out)
+    logging.info('metrics written to %s', metrics_out)
+
 @click.group()
 @click.option('--log-level', default='INFO', help='Log level (DEBUG, INFO, ...)')
-def root(log_level):
+@click.option('--metrics-out', type=click.Path(), default=None, help='Json file for wall time of processing stages and counters (spots, edges, rebalances, mongo ops)')
+@click.option('--profile', type=click.Path(), default=None, help='File for profile of the command (cProfile stats, pyinstrument html or text report)')
+@click.option('--profiler', default='cprofile', type=click.Choice(['cprofile', 'pyinstrument']), show_default=True, help='Profiler used for --profile')
+@click.option('--no-cache', is_flag=True, show_default=True, default=False, help='Parse and interpolate gpx files without cache of tracks')
+@click.option('--cache-dir', type=click.Path(), default=None, help='Directory of cache of parsed and interpolated tracks (default is GEONET_CACHE_DIR or ~/.cache/geonetpy)')
+@click.option('--cache-size', default=1024, show_default=True, help='Maximal size of cache of tracks in MB, least recently used tracks are evicted')
+@click.pass_context
+def root(ctx, log_level, metrics_out, profile, profiler, no_cache, cache_dir, cache_size):
     logging.basicConfig(stream=sys.stderr, level=log_level)
     logging.getLogger('pymongo').setLevel(logging.ERROR)
 
+    ctx.ensure_object(dict)
+    ctx.obj['cache'] = None if no_cache else TrackCache(cache_dir, cache_size * 2 ** 20)
+
+    # callbacks run in reverse order, so profile doesn't include writing of metrics
+    if metrics_out is not None:
+        metrics.enable()
+        ctx.call_on_close(lambda: write_metrics(metrics_out))
+
+    if profile is not None:
+        ctx.call_on_close(start_profiler(profile, profiler))
+
 @root.group(chain=True)
-def tracks():
+@click.pass_context
+def tracks(ctx):
     """Track tools and visualization"""
+    ctx.ensure_object(dict)
+    ctx.obj.setdefault('points', [])
+    ctx.obj.setdefault('names', [])
+
+@tracks.command('open')
+@click.pass_context
+@click.argument('file', nargs=1, type=click.Path())
+def cmd_tracks_open(ctx, file):
+    """Reads gpx file to buffer of tracks (e.g. tracks open a.gpx open b.gpx match)"""
+
+    _, count, points, _ = loader.load_track(file, cache=track_cache())
+    click.echo(f'reading {file} ({count} points)')
+    ctx.obj['points'].append(points)
+    ctx.obj['names'].append(os.path.basename(file))
 
 @tracks.command('html')
 @click.argument('files', nargs=-1, type=click.Path())
 @click.option('--output', default='tracks.html', show_default=True, help='Path to files to be generated, e.g. tracks.html')
 @click.option('--max-distance', default=DEFAULT_INTERPOLATION_MAX_DISTANCE, show_default=True, help='Maximal distance (in meters) for points interpolation')
 @click.option("--skip-interpolation", is_flag=True, show_default=False, default=False, help="Show points.")
-def cmd_tracks_html(files, output, max_distance, skip_interpolation):
+@click.option('--distance-model', default='haversine', type=click.Choice(interpolation.DISTANCE_MODELS), show_default=True, help='Distance model used for points interpolation')
+@click.option('--precision', type=int, default=None, help='Number of decimal places of geojson coordinates')
+@click.option("--compact", is_flag=True, show_default=True, default=False, help="Write geojson without indentation")
+def cmd_tracks_html(files, output, max_distance, skip_interpolation, distance_model, precision, compact):
 
     click.echo(f"rendering to html from {len(files)} files'")
 
     all_tracks = []
     for filename in files:
         click.echo(f'reading {filename}')
-        with open(filename, 'r') as gpx_file:
-            gpx = gpxpy.parse(gpx_file)
-            points = match.points_from_gpx(gpx)
-            print('number of points in track:', points.shape[0])
-            if not skip_interpolation:
-                points = interpolation.interpolate_distance(points, max_distance)
-                print('number of points in track after interpolation:', points.shape[0])
-            all_tracks.append(points)
-
-    geojson_content = geojson.tracks_to_geojson(all_tracks, lines=True)
-
-    tpl_path = 'templates/tpl_map.html'
-    print(f'generating html content from template {tpl_path}')
-    with open(tpl_path, 'r') as tpl_file:
-        tpl = string.Template(tpl_file.read())
-
-    html_content = tpl.substitute({
-        'title': 'Tracks',
-        'geojson': geojson_content
-    })
+        _, count, points, _ = loader.load_track(filename, None if skip_interpolation else max_distance, distance_model, track_cache())
+        print('number of points in track:', count)
+        if not skip_interpolation:
+            print('number of points in track after interpolation:', points.shape[0])
+        all_tracks.append(points)
 
-    print(f'writing html to {output}')
-    with open(output, 'w') as html_file:
-        html_file.write(html_content)
+    features = geojson.tracks_features(all_tracks, lines=True, precision=precision)
+    write_html('templates/tpl_map.html', output, 'Tracks', {}, lambda f: geojson.write_geojson(f, features, compact))
 
 @tracks.command('match')
 @click.pass_context
 @click.option('--tolerance', default=0.005, show_default=True, help='Tolerance for matching')
-def cmd_match(ctx, tolerance):
+@click.option('--tolerance-m', type=float, default=None, help='Tolerance for matching in meters (overrides --tolerance)')
+@click.option('--clustering', default='segments', type=click.Choice(match.CLUSTERINGS), show_default=True, help='Clustering of matching points')
+def cmd_match(ctx, tolerance, tolerance_m, clustering):
 
     if len(ctx.obj['points']) < 2:
         click.echo("Error: Invalid number of tracks in buffer, required at least 2 tracks")
@@ -95,9 +223,35 @@ def cmd_match(ctx, tolerance):
 
     print('number of points in tracks after interpolation:', t1.shape[0], t2.shape[0])
 
-    matches = match.match(t1, t2, tolerance)
+    matches = match.match(t1, t2, tolerance, clustering, tolerance_m)
+
+    for ratio in match.get_track_ratios(matches):
+        print('track', ratio['track'])
+        print(f'  points: {ratio["points"]}')
+        print(f'  distance total: {match.format_distance_m(ratio["distance_total"])}')
+        print(f'  distance outside of clusters: {match.format_distance_m(ratio["distance_outside"])}')
+        print(f'  match ratio:: {round(ratio["ratio"] * 100, 1)}%')
+
+@tracks.command('match-index')
+@click.pass_context
+@click.option('--tolerance-m', default=20.0, show_default=True, help='Tolerance for matching in meters')
+@click.option('--max-distance', default=DEFAULT_INTERPOLATION_MAX_DISTANCE, show_default=True, help='Maximal distance (in meters) for points interpolation')
+def cmd_match_index(ctx, tolerance_m, max_distance):
+    """Matches first track in buffer against all other tracks at once"""
+
+    if len(ctx.obj['points']) < 2:
+        click.echo("Error: Invalid number of tracks in buffer, required at least 2 tracks")
+        raise click.Abort()
+
+    index = trackindex.TrackIndex(tolerance_m)
+    for points, name in zip(ctx.obj['points'][1:], ctx.obj['names'][1:]):
+        index.add_track(interpolation.interpolate_distance(points, max_distance), name)
 
-    match.get_track_ratios(matches)
+    result = index.match(interpolation.interpolate_distance(ctx.obj['points'][0], max_distance))
+
+    print(f'track {ctx.obj["names"][0]} overlaps {len(result)} of {len(ctx.obj["points"]) - 1} tracks')
+    for r in result:
+        print(f'  {r["track"]}: match ratio: {round(r["ratio"] * 100, 1)}%, reference track match ratio: {round(r["ref_ratio"] * 100, 1)}%')
 
 
 @root.group()
@@ -107,116 +261,165 @@ def net():
 @net.command("create")
 @click.argument('files', nargs=-1, type=click.Path())
 @click.option('--output', default='net', show_default=True, help='File name for generated output (extension is added automaticaly, e.g. net.html)')
-@click.option('--output-format', default=['html'], type=click.Choice(['html', 'geojson', 'gnt']), show_default=True, multiple=True, help='Output format')
+@click.option('--output-format', default=['html'], type=click.Choice(['html', 'geojson', 'gnt', 'gnb']), show_default=True, multiple=True, help='Output format')
 @click.option('--max-distance', default=DEFAULT_INTERPOLATION_MAX_DISTANCE, show_default=True, help='Maximal distance (in meters) for points interpolation')
 @click.option("--memory-net", is_flag=True, show_default=True, default=False, help="Use memory network instead of mongo database")
-def net_create_cmd(files, output, output_format, max_distance, memory_net):
+@click.option('--spot-index', default='kdtree', type=click.Choice(SPOT_INDEXES), show_default=True, help='Spatial index used by memory network')
+@click.option('--batch-size', default=0, show_default=True, help='Number of points written to database in one bulk write (0 - point by point)')
+@click.option('--workers', default=1, show_default=True, help='Number of processes parsing and interpolating gpx files, tracks are added to the net in order of files')
+@click.option('--distance-model', default='haversine', type=click.Choice(interpolation.DISTANCE_MODELS), show_default=True, help='Distance model used for points interpolation')
+@click.option('--precision', type=int, default=None, help='Number of decimal places of geojson coordinates')
+@click.option("--compact", is_flag=True, show_default=True, default=False, help="Write geojson without indentation")
+def net_create_cmd(files, output, output_format, max_distance, memory_net, spot_index, batch_size, workers, distance_model, precision, compact):
     """Creates network from gpx files"""
 
     click.echo(f'creating net from {len(files)} files')
     click.echo(f'output format: {output_format}')
 
-    n = NetMem() if memory_net else NetDb(DB_URI)
+    n = NetMem(spot_index=spot_index) if memory_net else NetDb(DB_URI)
+    add_track_args = {} if memory_net else {'batch_size': batch_size}
 
-    counter = 1
-    for filename in files:
-        click.echo(f'adding {filename} {counter}/{len(files)}')
-        with open(filename, 'r') as gpx_file:
-            gpx = gpxpy.parse(gpx_file)
-            points = match.points_from_gpx(gpx)
+    # content hashes of files are computed by loader (in worker processes)
+    add_tracks(n, files, 1, (max_distance, workers, distance_model), add_track_args)
 
-            print('number of points in track:', points.shape[0])
-            points = interpolation.interpolate_distance(points, max_distance)
-            print('number of points in track after interpolation:', points.shape[0])
-            print(f'adding {points.shape[0]} points to the net')
+    write_outputs(n, output, output_format, precision, compact)
 
-            n.add_track(points, counter, {'name': os.path.basename(filename)})
 
-        counter += 1
-
-    # print('number of spots in net:', len(n.spots))
-    if 'html' in output_format:
-        print('generating geojson content')
-        geojson_content = n.to_geojson()
+@net.command("add")
+@click.argument('net_file', nargs=1, type=click.Path())
+@click.argument('files', nargs=-1, type=click.Path())
+@click.option('--output', default=None, help='File name of updated net, net file is overwritten by default (binary format for .gnb extension, otherwise gnt)')
+@click.option('--max-distance', default=DEFAULT_INTERPOLATION_MAX_DISTANCE, show_default=True, help='Maximal distance (in meters) for points interpolation')
+@click.option("--memory-net", is_flag=True, show_default=True, default=False, help="Use memory network instead of mongo database (always used for binary net files)")
+@click.option('--spot-index', default='kdtree', type=click.Choice(SPOT_INDEXES), show_default=True, help='Spatial index used by memory network')
+@click.option('--batch-size', default=0, show_default=True, help='Number of points written to database in one bulk write (0 - point by point)')
+@click.option('--workers', default=1, show_default=True, help='Number of processes parsing and interpolating gpx files, tracks are added to the net in order of files')
+@click.option('--distance-model', default='haversine', type=click.Choice(interpolation.DISTANCE_MODELS), show_default=True, help='Distance model used for points interpolation')
+def net_add_cmd(net_file, files, output, max_distance, memory_net, spot_index, batch_size, workers, distance_model):
+    """Adds gpx files to existing net, files with tracks already added to the
+    net are skipped (tracks are compared by content hash), database net
+    continues with content of database if net file doesn't exist"""
+
+    exists = os.path.exists(net_file)
+    memory_net = memory_net or (exists and netfile.is_net_file(net_file))
+
+    n = NetMem(spot_index=spot_index) if memory_net else NetDb(DB_URI, reset=False)
+    add_track_args = {} if memory_net else {'batch_size': batch_size}
+
+    if exists:
+        click.echo(f'loading net from {net_file}')
+        with metrics.timer('net.load'):
+            n.load(net_file)
+
+    # new tracks continue ids of tracks already in the net
+    tracks_meta = n.get_meta()['tracks']
+    new_tracks = loader.new_tracks(files, [track['hash'] for track in tracks_meta if 'hash' in track])
+    click.echo(f'adding {len(new_tracks)} of {len(files)} files to net of {len(tracks_meta)} tracks')
+
+    add_tracks(n, new_tracks, max((track['id'] for track in tracks_meta), default=0) + 1, (max_distance, workers, distance_model), add_track_args)
+
+    output = output if output is not None else net_file
+    output_format = 'gnb' if output.endswith('.gnb') else 'gnt'
+    print(f'writing net to {output}')
+    with metrics.timer(f'output.{output_format}'):
+        n.save(output, output_format)
+
+def parse_bbox(ctx, param, value):
+    """click callback converting "west,south,east,north" to Rect"""
+    if value is None:
+        return None
+    try:
+        return Rect.from_bbox([float(v) for v in value.split(',')])
+    except ValueError as e:
+        raise click.BadParameter('expected four numbers west,south,east,north', ctx, param) from e
 
-        tpl_path = 'templates/tpl_map.html'
-        print(f'generating html content from template {tpl_path}')
-        with open(tpl_path, 'r') as tpl_file:
-            tpl = string.Template(tpl_file.read())
+@net.command("show")
+@click.argument('file', nargs=1, type=click.Path())
+@click.option('--output', default='net', show_default=True, help='File name for generated output (extension is added automaticaly, e.g. net.html)')
+@click.option("--hide-points", is_flag=True, show_default=True, default=False, help="Show points.")
+@click.option('--precision', type=int, default=None, help='Number of decimal places of geojson coordinates')
+@click.option("--compact", is_flag=True, show_default=True, default=False, help="Write geojson without indentation")
+@click.option('--bbox', default=None, callback=parse_bbox, help='Show only spots inside bounding box "west,south,east,north" and edges touching it')
+def net_show_cmd(file, output, hide_points, precision, compact, bbox):
+    """Reads and shows geo net loaded from npz file"""
 
-        html_content = tpl.substitute({
-            'title': 'Net',
-            'geojson': geojson_content,
-            'meta': {}
-        })
+    click.echo(f'loading net from {file}')
 
-        html_path = f'{output}.html'
-        print(f'writing html to {html_path}')
-        with open(html_path, 'w') as html_file:
-            html_file.write(html_content)
+    n = open_net(file)
 
-    if 'geojson' in output_format:
-        print('generating geojson content')
-        geojson_content = n.to_geojson()
+    write_html('templates/tpl_map_grid.html', f'{output}.html', 'Net', n.get_meta(), lambda f: n.write_geojson(f, compact, show_points=not hide_points, precision=precision, rect=bbox))
 
-        json_path = f'{output}.json'
-        print(f'writing geojson to {json_path}')
-        with open(json_path, 'w') as json_file:
-            json_file.write(geojson_content)
+@net.command("tiles")
+@click.argument('file', nargs=1, type=click.Path())
+@click.option('--output', default='tiles', show_default=True, help='Output directory, or MBTiles file if it ends with .mbtiles')
+@click.option('--min-zoom', default=0, show_default=True, help='Minimal zoom level')
+@click.option('--max-zoom', default=16, show_default=True, help='Maximal zoom level')
+@click.option('--points-min-zoom', default=tiles.POINTS_MIN_ZOOM, show_default=True, help='Minimal zoom level of spots layer')
+@click.option('--max-features', default=tiles.MAX_FEATURES, show_default=True, help='Maximal number of features of a layer in a tile (features with highest q are kept)')
+@click.option('--workers', default=1, show_default=True, help='Number of processes generating zoom levels')
+@click.option('--tile-url', default=None, help='Url of tiles for html page (e.g. tile server serving MBTiles file), default is url relative to output directory')
+def net_tiles_cmd(file, output, min_zoom, max_zoom, points_min_zoom, max_features, workers, tile_url):
+    """Generates pyramid of vector tiles (MVT) of a net"""
 
-    if 'gnt' in output_format:
-        gnt_path = f'{output}.gnt'
-        print(f'writing net to {gnt_path}')
-        n.save(gnt_path)
+    click.echo(f'loading net from {file}')
+    n = open_net(file)
 
+    spots, edges = n.columns()
+    meta = {**tiles.tiles_meta(spots, min_zoom, max_zoom), **n.get_meta()}
+    generated = tiles.generate_tiles(spots, edges, range(min_zoom, max_zoom + 1), workers, max_features=max_features, points_min_zoom=points_min_zoom)
 
-@net.command("show")
-@click.argument('file', nargs=1, type=click.Path())
-@click.option('--output', default='net', show_default=True, help='File name for generated output (extension is added automaticaly, e.g. net.html)')
-@click.option("--hide-points", is_flag=True, show_default=True, default=False, help="Show points.")
-def net_show_cmd(file, output, hide_points):
-    """Reads and shows geo net loaded from npz file"""
+    if output.endswith('.mbtiles'):
+        count = tiles.write_mbtiles(output, generated, meta)
+        html_path = change_file_extension(output, 'html') if tile_url is not None else None
+    else:
+        os.makedirs(output, exist_ok=True)
+        count = tiles.write_directory(output, generated, meta)
+        html_path = os.path.join(output, 'index.html')
+        tile_url = tile_url if tile_url is not None else '{z}/{x}/{y}.pbf'
 
-    click.echo(f'loading net from {file}')
+    print(f'{count} tiles written to {output}')
 
-    n = NetDb(DB_URI)
-    n.load(file)
+    if html_path is not None:
+        print(f'writing html to {html_path}')
+        with open('templates/tpl_map_tiles.html', 'r') as tpl_file:
+            tpl = string.Template(tpl_file.read())
+        with open(html_path, 'w') as html_file:
+            html_file.write(tpl.substitute({'title': 'Net', 'url': json.dumps(tile_url), 'meta': json.dumps(meta)}))
 
-    print('generating geojson content')
-    geojson_content = n.to_geojson(show_points=not hide_points)
+@net.command("simplify")
+@click.argument('file', nargs=1, type=click.Path())
+@click.option('--output', default='simplified', show_default=True, help='File name for generated output (extension is added automaticaly, e.g. simplified.html)')
+@click.option('--output-format', default=['html'], type=click.Choice(['html', 'geojson', 'gnt', 'gnb']), show_default=True, multiple=True, help='Output format')
+@click.option('--min-q', default=2, show_default=True, help='Spurs (dead end lines) with lower q are dropped')
+@click.option('--merge-distance', default=simplify.MERGE_DISTANCE, show_default=True, help='Maximal distance (in meters) of parallel lines to be merged')
+@click.option('--precision', type=int, default=None, help='Number of decimal places of geojson coordinates')
+@click.option("--compact", is_flag=True, show_default=True, default=False, help="Write geojson without indentation")
+def net_simplify_cmd(file, output, output_format, min_q, merge_distance, precision, compact):
+    """Simplifies graph of a net (degree 2 chains, parallel edges, spurs)"""
 
-    tpl_path = 'templates/tpl_map_grid.html'
-    print(f'generating html content from template {tpl_path}')
-    with open(tpl_path, 'r') as tpl_file:
-        tpl = string.Template(tpl_file.read())
+    click.echo(f'loading net from {file}')
+    n = open_net(file)
 
-    html_content = tpl.substitute({
-        'title': 'Net',
-        'geojson': geojson_content,
-        'meta': n.get_meta()
-    })
+    with metrics.timer('net.simplify'):
+        n.simplify(min_q, merge_distance)
 
-    html_path = f'{output}.html'
-    print(f'writing html to {html_path}')
-    with open(html_path, 'w') as html_file:
-        html_file.write(html_content)
+    write_outputs(n, output, output_format, precision, compact)
 
 @net.command("convert")
 @click.argument('file', nargs=1, type=click.Path())
 @click.option('--output', help='File name for generated output (extension is added automaticaly, e.g. net.js)')
-@click.option('--output-format', default='js', type=click.Choice(['js']), show_default=True, help='Output format')
+@click.option('--output-format', default='js', type=click.Choice(['js', 'gnt', 'gnb']), show_default=True, help='Output format')
 @click.option("--hide-points", is_flag=True, show_default=True, default=False, help="Skip all points.")
 def net_convert_cmd(file, output, output_format, hide_points):
     """Converts geonet file to a different format"""
 
-    n = NetDb(DB_URI)
-
     click.echo(f'loading net from {file} for convertion to {output_format} format')
-    n.load(file)
+    n = open_net(file)
 
     output = f'{output}.{output_format}' if output is not None else change_file_extension(file, output_format)
 
-    n.save(output, output_format, show_points=not hide_points)
+    with metrics.timer(f'output.{output_format}'):
+        n.save(output, output_format, show_points=not hide_points)
 
 if __name__ == '__main__':
     root()
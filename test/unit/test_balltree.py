@@ -1,6 +1,7 @@
 import unittest
 import numpy as np
 from geonetpy.balltree import BallTree
+from geonetpy.rect import Rect
 
 # sample points
 POINTS = [
@@ -48,9 +49,33 @@ class TestBallTree(unittest.TestCase):
         self.assertEqual(2, nearest[1][1][2])                         # new york is nearest from other cities
         self.assertAlmostEqual(3935746.254, nearest[1][0], places=2)  # distance to new york
 
+    def test_balancing(self):
+        tree = BallTree(np.array([[0.0, 0.0, 0]]))
+
+        # points sorted by latitude would make a degenerated tree without rebalancing
+        for i in range(1, 2000):
+            tree.add_point([i * 0.001, i * 0.001, i])
+
+        # height of weight balanced tree with alpha 0.75 is at most log(n) / log(4 / 3)
+        self.assertLessEqual(tree.get_height(), 27)
+        self.assertEqual(tree.root.size, len(tree.get_points()))
+
     def test_dump(self):
 
         tree = BallTree(np.array(POINTS))
 
         dump = tree.get_points()
         self.assertEqual(4, len(dump))
+
+    def test_query_rect(self):
+        rng = np.random.default_rng(2)
+        points = np.column_stack([rng.uniform(48.5, 51, 2000), rng.uniform(12, 19, 2000), np.arange(2000)])
+        index = BallTree(points[:1000])
+        for point in points[1000:]:
+            index.add_point(point)
+
+        for lat, lon in rng.uniform([48.5, 12], [51, 19], (20, 2)):
+            rect = Rect([lat, lon], [lat + rng.uniform(0, 1), lon + rng.uniform(0, 2)])
+            expected = [i for i, point in enumerate(points) if rect.contains(point)]
+
+            self.assertEqual(expected, sorted(int(p[2]) for p in index.query_rect(rect)))
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from geonetpy import gpx, metrics
+from geonetpy.cache import TrackCache
+from geonetpy.loader import load_track
+from test_loader import write_gpx
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = TrackCache(os.path.join(self.tmp_dir.name, 'cache'))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        metrics.enable(False)
+        metrics.reset()
+
+    def test_key(self):
+        keys = {
+            TrackCache.key('abc'),
+            TrackCache.key('abc', 30),
+            TrackCache.key('abc', 10),
+            TrackCache.key('abc', 10, 'geodesic'),
+            TrackCache.key('abd', 10)
+        }
+        self.assertEqual(5, len(keys))
+        self.assertEqual(TrackCache.key('abc'), TrackCache.key('abc', None, 'geodesic'))
+
+    def test_put_get(self):
+        points = np.arange(10, dtype=np.float64).reshape(5, 2)
+        self.assertIsNone(self.cache.get('a'))
+
+        self.cache.put('a', points)
+        np.testing.assert_array_equal(points, self.cache.get('a'))
+        self.assertEqual((5, 2), self.cache.get('a', mmap_mode='r').shape)
+
+    def test_evict(self):
+        points = np.zeros((100, 2))
+        self.cache.put('a', points)
+        size = os.path.getsize(self.cache.filepath('a'))
+        self.cache.max_size = 2 * size
+
+        # a is used after b, so b is the least recently used one
+        self.cache.put('b', points)
+        os.utime(self.cache.filepath('a'), (0, 1))
+        os.utime(self.cache.filepath('b'), (0, 0))
+        self.cache.get('a')
+        self.cache.put('c', points)
+
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('c'))
+
+    def test_size(self):
+        points = np.zeros((100, 2))
+        self.cache.put('a', points)
+        self.cache.put_track('b', 50, points)
+        size = os.path.getsize(self.cache.filepath('a')) + os.path.getsize(self.cache.filepath('b', '.npz'))
+        self.assertEqual(size, self.cache.size)
+
+        # cache directory is not scanned until the size exceeds the limit
+        with mock.patch('os.scandir', wraps=os.scandir) as scandir:
+            self.cache.put('a', points)
+            self.cache.put('c', points)
+            scandir.assert_not_called()
+            self.assertEqual(size + os.path.getsize(self.cache.filepath('c')), self.cache.size)
+
+            self.cache.max_size = size
+            self.cache.put('d', points)
+            scandir.assert_called_once()
+
+        files = [os.path.join(self.cache.path, name) for name in os.listdir(self.cache.path)]
+        self.assertEqual(sum(os.path.getsize(filepath) for filepath in files), self.cache.size)
+        self.assertLessEqual(self.cache.size, size)
+
+    def test_put_get_track(self):
+        points = np.arange(10, dtype=np.float64).reshape(5, 2)
+        self.assertIsNone(self.cache.get_track('a'))
+
+        self.cache.put_track('a', 3, points)
+        count, cached = self.cache.get_track('a')
+        self.assertEqual(3, count)
+        np.testing.assert_array_equal(points, cached)
+
+    def test_load_track(self):
+        path = os.path.join(self.tmp_dir.name, 'track.gpx')
+        write_gpx(path, np.array([49.2257, 16.5337]) + np.cumsum(np.random.default_rng(0).normal(0, 0.001, (50, 2)), axis=0))
+
+        metrics.enable()
+        expected = load_track(path, 30)
+        first = load_track(path, 30, cache=self.cache)
+        self.assertEqual({'cache.misses': 2}, {k: v for k, v in metrics.snapshot()['counters'].items() if k.startswith('cache')})
+
+        # interpolated points are read from cache with number of parsed
+        # points, known content hash is not computed again
+        known_hash = gpx.content_hash(path)
+        with mock.patch('geonetpy.gpx.content_hash') as content_hash:
+            second = load_track(path, 30, cache=self.cache, content_hash=known_hash)
+            content_hash.assert_not_called()
+        self.assertEqual(1, metrics.snapshot()['counters']['cache.hits'])
+        self.assertEqual(2, metrics.snapshot()['timers']['gpx.parse']['calls'])
+
+        for result in [first, second]:
+            self.assertEqual(expected[1], result[1])
+            np.testing.assert_array_equal(expected[2], result[2])
@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+from geonetpy.columns import GrowableArray, SpotTable, EdgeTable
+
+
+class TestColumns(unittest.TestCase):
+
+    def test_growable_array(self):
+        a = GrowableArray(np.int32, capacity=2)
+
+        for i in range(10):
+            a.append(i)
+        a.extend([10, 11])
+
+        self.assertEqual(12, len(a))
+        self.assertEqual(list(range(12)), a.view().tolist())
+        self.assertTrue(np.shares_memory(a.view(), a.data))
+
+    def test_spot_table(self):
+        spots = SpotTable()
+        spots.append(49.0, 16.0, 0)
+        spots.append(50.0, 17.0, 1)
+        self.assertIsNone(spots.rows)
+
+        # ids which are not dense need lookup of rows
+        spots.append(51.0, 18.0, 10)
+        spots.inc(10)
+
+        self.assertEqual(2, spots.get_q(10))
+        self.assertEqual([51.0, 18.0, 10], spots.get_point(10))
+        self.assertEqual([50.0, 17.0, 1], spots.get_point(1))
+        self.assertEqual([1, 1, 2], spots.columns()['q'].tolist())
+
+    def test_edge_table(self):
+        edges = EdgeTable()
+        edges[(0, 1)] = 1
+        edges[(1, 2)] = 1
+        edges[(0, 1)] += 1
+
+        self.assertEqual(2, len(edges))
+        self.assertIn((1, 2), edges)
+        self.assertNotIn((0, 2), edges)
+        self.assertEqual([((0, 1), 2), ((1, 2), 1)], list(edges.items()))
+        self.assertEqual(np.int32, edges.columns()['p1'].dtype)
+
+    def test_spot_edges(self):
+        edges = EdgeTable.from_columns(np.array([0, 1, 4]), np.array([1, 2, 5]), np.array([1, 1, 1]), np.array([0, 0, 2, 2]), np.array([6, 7]))
+
+        self.assertEqual([0, 1], edges.spot_edges([1]).tolist())
+        self.assertEqual([1, 2], edges.spot_edges([7, 5]).tolist())
+        self.assertEqual([], edges.spot_edges([3]).tolist())
+
+        # index is rebuilt when edge is added
+        edges[(3, 4)] = 1
+        self.assertEqual([2, 3], edges.spot_edges([4]).tolist())
@@ -0,0 +1,50 @@
+import io
+import json
+import unittest
+import numpy as np
+from geonetpy import geojson
+
+
+class TestGeoJson(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.tracks = [np.array([49.2257, 16.5337]) + np.cumsum(rng.normal(0, 0.001, (n, 2)), axis=0) for n in (30, 20)]
+
+    def test_tracks_to_geojson(self):
+        content = json.loads(geojson.tracks_to_geojson(self.tracks, lines=True))
+
+        self.assertEqual('FeatureCollection', content['type'])
+        self.assertEqual(30 + 1 + 20 + 1, len(content['features']))
+
+        line = content['features'][30]
+        self.assertEqual('LineString', line['geometry']['type'])
+        self.assertEqual([[p[1], p[0]] for p in self.tracks[0].tolist()], line['geometry']['coordinates'])
+
+    def test_writer(self):
+        features = list(geojson.tracks_features(self.tracks))
+
+        output = io.StringIO()
+        with geojson.GeoJsonWriter(output, compact=True) as writer:
+            writer.write_all(iter(features))
+
+        self.assertNotIn(' ', output.getvalue())
+        self.assertEqual(features, json.loads(output.getvalue())['features'])
+
+        # empty collection is valid json too
+        for compact in (True, False):
+            self.assertEqual([], json.loads(geojson.to_geojson([], compact))['features'])
+
+    def test_precision(self):
+        content = json.loads(geojson.tracks_to_geojson(self.tracks, precision=3))
+
+        for feature in content['features']:
+            for c in feature['geometry']['coordinates']:
+                self.assertEqual(round(c, 3), c)
+
+    def test_chunks(self):
+        lat = np.arange(25.0)
+        chunks = list(geojson.coordinates_chunks(lat, -lat, chunk_size=10))
+
+        self.assertEqual([0, 10, 20], [start for start, _ in chunks])
+        self.assertEqual([[-i, i] for i in range(25)], [c for _, chunk in chunks for c in chunk])
@@ -0,0 +1,28 @@
+import unittest
+import numpy as np
+from geonetpy.geoutils import haversine_distance, haversine_distances, to_xyz, chord_length, EARTH_RADIUS
+
+
+class TestGeoUtils(unittest.TestCase):
+
+    def test_haversine_distances(self):
+        points = np.array([[52.5200, 13.4050], [48.8566, 2.3522], [40.7128, -74.0060]])
+        query = [34.0522, -118.2437]
+
+        distances = haversine_distances(points, query)
+
+        self.assertEqual((3,), distances.shape)
+        for point, d in zip(points, distances):
+            self.assertAlmostEqual(haversine_distance(point, query), d, places=4)
+
+    def test_to_xyz(self):
+        xyz = to_xyz([[0, 0], [90, 0], [0, 90]])
+        np.testing.assert_allclose([[1, 0, 0], [0, 0, 1], [0, 1, 0]], xyz, atol=1e-12)
+
+    def test_chord_length(self):
+        points = np.array([[49.2, 16.5], [49.2005, 16.5007], [-30.0, 120.0]])
+        distances = haversine_distances(points[0], points[1:])
+        chords = np.linalg.norm(to_xyz(points[1:]) - to_xyz(points[0]), axis=-1)
+
+        np.testing.assert_allclose(chords, [chord_length(d) for d in distances], rtol=1e-9)
+        self.assertAlmostEqual(2.0, chord_length(10 * EARTH_RADIUS))
@@ -0,0 +1,60 @@
+import bz2
+import gzip
+import os
+import tempfile
+import unittest
+import numpy as np
+import gpxpy
+import gpxpy.gpx
+from geonetpy import gpx, match
+
+
+def gpx_xml(tracks):
+    doc = gpxpy.gpx.GPX()
+    for segments in tracks:
+        track = gpxpy.gpx.GPXTrack()
+        for points in segments:
+            segment = gpxpy.gpx.GPXTrackSegment()
+            segment.points.extend(gpxpy.gpx.GPXTrackPoint(lat, lon, elevation=300) for lat, lon in points)
+            track.segments.append(segment)
+        doc.tracks.append(track)
+    doc.waypoints.append(gpxpy.gpx.GPXWaypoint(50.0, 15.0))
+    return doc.to_xml()
+
+
+class TestGpx(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        points = np.array([49.2257, 16.5337]) + np.cumsum(rng.normal(0, 0.001, (300, 2)), axis=0)
+        self.xml = gpx_xml([[points[:100], points[100:150]], [points[150:]]])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, name, opener):
+        path = os.path.join(self.tmp_dir.name, name)
+        with opener(path, 'wt', encoding='utf-8') as gpx_file:
+            gpx_file.write(self.xml)
+        return path
+
+    def test_read_points(self):
+        expected = match.points_from_gpx(gpxpy.parse(self.xml))
+        self.assertEqual((300, 2), expected.shape)
+
+        for name, opener in [('a.gpx', open), ('a.gpx.gz', gzip.open), ('a.gpx.bz2', bz2.open)]:
+            points = gpx.read_points(self.write(name, opener))
+            self.assertEqual(np.float64, points.dtype)
+            np.testing.assert_array_equal(expected, points)
+
+    def test_no_points(self):
+        self.xml = gpx_xml([])
+        self.assertEqual((0, 2), gpx.read_points(self.write('empty.gpx', open)).shape)
+
+    def test_content_hash(self):
+        hashes = {gpx.content_hash(self.write(name, opener)) for name, opener in [('a.gpx', open), ('a.gpx.gz', gzip.open), ('a.gpx.bz2', bz2.open)]}
+        self.assertEqual(1, len(hashes))
+
+        self.xml = gpx_xml([])
+        self.assertNotIn(gpx.content_hash(self.write('empty.gpx', open)), hashes)
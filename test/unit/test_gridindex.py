@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+from geonetpy.gridindex import GridIndex
+from geonetpy.rect import Rect
+from geonetpy.geoutils import haversine_distances
+
+
+class TestGridIndex(unittest.TestCase):
+
+    def test_query(self):
+        index = GridIndex([[49.2257, 16.5337, 0]], 75)
+
+        nearest = index.query([49.2257, 16.5338])
+        self.assertEqual(1, len(nearest))
+        self.assertEqual(0, nearest[0][1][2])
+
+        # points farther than cell size are not returned
+        self.assertEqual([], index.query([49.2357, 16.5337]))
+
+    def test_brute_force(self):
+        rng = np.random.default_rng(1)
+
+        for lat in (0, 49, 80, 89.99):
+            points = np.column_stack([rng.uniform(lat - 0.01, lat + 0.01, 2000), rng.uniform(179.9, 180.0, 2000), np.arange(2000)])
+            index = GridIndex(points, 75)
+
+            for query_point in points[:100, :2] + rng.normal(0, 0.0005, (100, 2)):
+                self.assertLessEqual(len(index.get_cells(query_point)), 9)
+
+                distances = haversine_distances(points[:, :2], query_point)
+                expected = sorted(np.nonzero(distances <= 75)[0])
+
+                nearest = index.query(query_point, k=len(points))
+
+                self.assertEqual(expected, sorted(int(n[1][2]) for n in nearest))
+
+    def test_dump(self):
+        index = GridIndex([[1, 1, 0], [2, 2, 1]], 75)
+        self.assertEqual(2, len(index.get_points()))
+
+    def test_query_rect(self):
+        rng = np.random.default_rng(2)
+        points = np.column_stack([rng.uniform(49, 49.05, 2000), rng.uniform(16, 16.05, 2000), np.arange(2000)])
+        index = GridIndex(points, 75)
+
+        for lat, lon in rng.uniform([49, 16], [49.05, 16.05], (20, 2)):
+            rect = Rect([lat, lon], [lat + rng.uniform(0, 0.01), lon + rng.uniform(0, 0.01)])
+            expected = [i for i, point in enumerate(points) if rect.contains(point)]
+
+            self.assertEqual(expected, sorted(int(p[2]) for p in index.query_rect(rect)))
@@ -0,0 +1,56 @@
+import unittest
+import numpy as np
+from geonetpy.interpolation import interpolate_distance, interpolate_distance_stepwise, segment_lengths, DISTANCE_MODELS
+from geonetpy.geoutils import haversine_distances, EARTH_RADIUS
+
+
+class TestInterpolation(unittest.TestCase):
+
+    def test_straight_line(self):
+        points = np.array([[49.0, 16.0], [49.01, 16.0]])    # ~1112 m
+        result = interpolate_distance(points, 100)
+
+        # samples each 100 m + last point
+        self.assertEqual((13, 2), result.shape)
+        np.testing.assert_allclose(100, haversine_distances(result[:-2], result[1:-1]), rtol=1e-6)
+        np.testing.assert_array_equal(points[-1], result[-1])
+
+    def test_short_tracks(self):
+        self.assertEqual((0, 2), interpolate_distance([], 10).shape)
+        self.assertEqual((1, 2), interpolate_distance([[49.0, 16.0]], 10).shape)
+
+    def test_exact_multiple(self):
+        # 100 m along meridian
+        points = np.array([[49.0, 16.0], [49.0 + np.degrees(100 / EARTH_RADIUS), 16.0]])
+        result = interpolate_distance(points, 10)
+
+        # last sample is the last point, it is not repeated
+        self.assertEqual((11, 2), result.shape)
+        np.testing.assert_allclose(points[-1], result[-1], atol=1e-9)
+        np.testing.assert_allclose(10, haversine_distances(result[:-1], result[1:]), rtol=1e-6)
+
+    def test_stepwise(self):
+        rng = np.random.default_rng(0)
+        points = np.array([49.2, 16.5]) + np.cumsum(rng.normal(0, 0.001, (100, 2)), axis=0)
+        expected = np.array(interpolate_distance_stepwise(points, 30))
+        track_length = segment_lengths(points, 'geodesic').sum()
+
+        # difference of distance models (and flat moves of stepwise version) accumulates along the track
+        for distance_model, tolerance in zip(DISTANCE_MODELS, [0.0015, 0.001]):
+            result = interpolate_distance(points, 30, distance_model)
+            self.assertLessEqual(abs(expected.shape[0] - result.shape[0]), 1)
+
+            count = min(expected.shape[0], result.shape[0])
+            deviation = haversine_distances(expected[:count], result[:count])
+            self.assertLess(deviation.max(), tolerance * track_length)
+
+            # samples each 30 m along the track + last point
+            self.assertEqual(int(segment_lengths(points, distance_model).sum() // 30) + 2, result.shape[0])
+
+        result = interpolate_distance(points, 30, 'geodesic')
+        deviation = haversine_distances(expected[:10], result[:10])
+        self.assertLess(deviation.max(), 1)
+
+    def test_unknown_model(self):
+        with self.assertRaises(ValueError):
+            interpolate_distance([[49.0, 16.0], [49.1, 16.0]], 10, 'flat')
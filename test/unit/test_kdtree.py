@@ -0,0 +1,128 @@
+import unittest
+from unittest import mock
+import numpy as np
+from geonetpy.kdtree import KDTree, BUFFER_SIZE
+from geonetpy.rect import Rect
+from geonetpy.geoutils import haversine_distances
+
+# sample points
+POINTS = [
+    [52.5200, 13.4050, 0],      # berlin
+    [48.8566, 2.3522, 1],       # paris
+    [40.7128, -74.0060, 2],     # new york
+    [34.0522, -118.2437, 3]     # los angeles
+]
+
+
+class TestKDTree(unittest.TestCase):
+
+    def test_distance(self):
+        tree = KDTree(POINTS)
+
+        nearest = tree.query([34.0522, -118.2437], k=2)
+
+        self.assertEqual(2, len(nearest))
+        self.assertEqual(3, nearest[0][1][2])  # los angeles is nearest since it is point itself
+        self.assertEqual(0, nearest[0][0])
+        self.assertEqual(2, nearest[1][1][2])  # new york is nearest from other cities
+        self.assertAlmostEqual(3935746.254, nearest[1][0], places=2)
+
+    def test_adding(self):
+        tree = KDTree([])
+
+        for point in POINTS:
+            tree.add_point(point)
+
+        nearest = tree.query([34.0522, -118.2437], k=2)
+
+        self.assertEqual(2, nearest[1][1][2])
+        self.assertAlmostEqual(3935746.254, nearest[1][0], places=2)
+        self.assertEqual(4, len(tree.get_points()))
+
+    def test_blocks(self):
+        tree = KDTree([])
+
+        for i in range(1, 2000):
+            tree.add_point([i * 0.001, i * 0.001, i])
+
+        # blocks are merged like digits of binary counter, sizes are decreasing
+        sizes = [end - start for start, end, _, _ in tree.blocks]
+        self.assertEqual(sorted(sizes, reverse=True), sizes)
+        self.assertLessEqual(len(sizes), 3)
+        self.assertLess(tree.size - tree.get_blocks()[-1], BUFFER_SIZE)
+        self.assertEqual(1999, len(tree.get_points()))
+
+        nearest = tree.query([1.0001, 1.0001])
+        self.assertEqual(1000, nearest[0][1][2])
+
+    def test_from_columns(self):
+        rng = np.random.default_rng(0)
+        points = np.column_stack([rng.uniform(48.5, 51, 1000), rng.uniform(12, 19, 1000), np.arange(1000)])
+
+        tree = KDTree(points[:200])
+        for point in points[200:]:
+            tree.add_point(point)
+
+        # static trees are restored from their nodes, or built by layout of blocks
+        arrays = tree.to_arrays()
+        with mock.patch.object(KDTree, '_build', wraps=tree._build) as build:
+            restored = KDTree.from_columns(points[:, 0], points[:, 1], points[:, 2].astype(np.int64), arrays)
+            build.assert_not_called()
+        rebuilt = KDTree.from_columns(points[:, 0], points[:, 1], points[:, 2].astype(np.int64), {'blocks': arrays['blocks']})
+
+        for other in [restored, rebuilt]:
+            self.assertEqual(tree.get_blocks().tolist(), other.get_blocks().tolist())
+            self.assertEqual(tree.get_height(), other.get_height())
+            for query_point in rng.uniform([48.5, 12], [51, 19], (20, 2)):
+                self.assertEqual(tree.query(query_point, 3), other.query(query_point, 3))
+            self.assertEqual(tree.query_rect(Rect([49, 13], [50, 15])), other.query_rect(Rect([49, 13], [50, 15])))
+            np.testing.assert_array_equal(tree.query_nearest(points[:50, :2], 1000), other.query_nearest(points[:50, :2], 1000))
+
+    def test_query_nearest(self):
+        rng = np.random.default_rng(3)
+        points = np.column_stack([rng.uniform(48.5, 51, 1000), rng.uniform(12, 19, 1000), np.arange(1000)])
+        queries = rng.uniform([48.5, 12], [51, 19], (100, 2))
+
+        tree = KDTree([])
+        distances, ids = tree.query_nearest(queries)
+        self.assertTrue(np.all(np.isinf(distances)))
+        self.assertTrue(np.all(ids == -1))
+
+        for point in points:
+            tree.add_point(point)
+
+        distances, ids = tree.query_nearest(queries)
+        for query_point, distance, point_id in zip(queries, distances, ids):
+            nearest = tree.query(query_point)[0]
+            self.assertEqual(nearest[1][2], point_id)
+            self.assertAlmostEqual(nearest[0], distance)
+
+    def test_brute_force(self):
+        rng = np.random.default_rng(1)
+        points = np.column_stack([rng.uniform(48.5, 51, 2000), rng.uniform(12, 19, 2000), np.arange(2000)])
+
+        tree = KDTree(points[:1000])
+        for point in points[1000:]:
+            tree.add_point(point)
+
+        for query_point in rng.uniform([48.5, 12], [51, 19], (50, 2)):
+            distances = haversine_distances(points[:, :2], query_point)
+            expected = np.argsort(distances)[:3]
+
+            nearest = tree.query(query_point, k=3)
+
+            self.assertEqual(list(expected), [int(n[1][2]) for n in nearest])
+            np.testing.assert_allclose(distances[expected], [n[0] for n in nearest])
+
+    def test_query_rect(self):
+        rng = np.random.default_rng(2)
+        points = np.column_stack([rng.uniform(48.5, 51, 2000), rng.uniform(12, 19, 2000), np.arange(2000)])
+        index = KDTree(points[:1000])
+        for point in points[1000:]:
+            index.add_point(point)
+
+        for lat, lon in rng.uniform([48.5, 12], [51, 19], (20, 2)):
+            rect = Rect([lat, lon], [lat + rng.uniform(0, 1), lon + rng.uniform(0, 2)])
+            expected = [i for i, point in enumerate(points) if rect.contains(point)]
+
+            self.assertEqual(expected, sorted(int(p[2]) for p in index.query_rect(rect)))
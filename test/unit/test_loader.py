@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import gpxpy.gpx
+from geonetpy.loader import load_track, load_tracks, new_tracks
+from geonetpy.gpx import content_hash
+from geonetpy.cache import TrackCache
+from geonetpy.netmem import NetMem
+
+
+def write_gpx(path, points):
+    gpx = gpxpy.gpx.GPX()
+    track = gpxpy.gpx.GPXTrack()
+    segment = gpxpy.gpx.GPXTrackSegment()
+    segment.points.extend(gpxpy.gpx.GPXTrackPoint(lat, lon) for lat, lon in points)
+    track.segments.append(segment)
+    gpx.tracks.append(track)
+
+    with open(path, 'w', encoding='utf-8') as gpx_file:
+        gpx_file.write(gpx.to_xml())
+
+
+class TestLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.files = []
+        for i in range(5):
+            path = os.path.join(self.tmp_dir.name, f'track{i}.gpx')
+            write_gpx(path, np.array([49.2257, 16.5337]) + np.cumsum(rng.normal(0, 0.001, (50, 2)), axis=0))
+            self.files.append(path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_load_track(self):
+        filename, count, points, track_hash = load_track(self.files[0])
+        self.assertEqual(self.files[0], filename)
+        self.assertEqual(50, count)
+        self.assertEqual((50, 2), points.shape)
+        self.assertEqual(content_hash(self.files[0]), track_hash)
+
+        _, _, points, _ = load_track(self.files[0], 30)
+        self.assertGreater(points.shape[0], 50)
+
+    def test_empty_track(self):
+        path = os.path.join(self.tmp_dir.name, 'empty.gpx')
+        write_gpx(path, [])
+        cache = TrackCache(os.path.join(self.tmp_dir.name, 'cache'))
+
+        # empty track is loaded as empty array of points by every path
+        for workers, track_cache in [(1, None), (1, cache), (1, cache), (2, None)]:
+            tracks = list(load_tracks([path] + self.files[:1], 30, workers=workers, cache=track_cache))
+            self.assertEqual((path, 0), tracks[0][:2])
+            self.assertEqual((0, 2), tracks[0][2].shape)
+
+            n = NetMem()
+            for track_id, (_, _, points, _) in enumerate(tracks):
+                n.add_track(points, track_id)
+            self.assertEqual(2, len(n.tracks))
+
+    def test_load_tracks_workers(self):
+        sequential = list(load_tracks(self.files, 30))
+        parallel = list(load_tracks(self.files, 30, workers=2))
+
+        # content hashes are computed by workers
+        self.assertEqual([(f, content_hash(f)) for f in self.files], [(t[0], t[3]) for t in sequential])
+        self.assertEqual([(t[0], t[3]) for t in sequential], [(t[0], t[3]) for t in parallel])
+        for t1, t2 in zip(sequential, parallel):
+            np.testing.assert_array_equal(t1[2], t2[2])
+
+        # workers keep their cache, known content hashes are passed to them
+        cache = TrackCache(os.path.join(self.tmp_dir.name, 'cache'))
+        for _ in range(2):
+            cached = list(load_tracks(new_tracks(self.files), 30, workers=2, cache=cache))
+            for t1, t2 in zip(sequential, cached):
+                self.assertEqual((t1[0], t1[1], t1[3]), (t2[0], t2[1], t2[3]))
+                np.testing.assert_array_equal(t1[2], t2[2])
+
+    def test_new_tracks(self):
+        known = [content_hash(self.files[0])]
+        files = self.files[:3] + self.files[1:2]
+
+        # known tracks and repeated files are skipped
+        self.assertEqual(self.files[1:3], [filename for filename, _ in new_tracks(files, known)])
+        self.assertEqual(self.files, [filename for filename, _ in new_tracks(self.files)])
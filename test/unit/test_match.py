@@ -0,0 +1,101 @@
+import unittest
+import numpy as np
+from geonetpy import match
+from geonetpy.geoutils import haversine_distances
+
+
+def random_track(seed, size=300, start=(49.2257, 16.5337)):
+    rng = np.random.default_rng(seed)
+    return np.array(start) + np.cumsum(rng.normal(0, 0.001, (size, 2)), axis=0)
+
+
+class TestMatch(unittest.TestCase):
+
+    def test_match(self):
+        rng = np.random.default_rng(1)
+        a = random_track(0)
+        b = a[100:250] + rng.normal(0, 0.0005, (150, 2))
+
+        result = match.match(a, b, 0.005, 'hierarchical')
+
+        # (x, y, track_id, index, cluster)
+        self.assertEqual((450, 5), result.shape)
+        np.testing.assert_array_equal(np.arange(450), result[:, 3])
+
+        # point is in a cluster if it has a point of the other track within tolerance
+        all_points = np.vstack([a, b])
+        tracks = np.repeat([0, 1], [300, 150])
+        distances = np.linalg.norm(all_points[:, None, :] - all_points[None, :, :], axis=2)
+        expected = np.any((distances <= 0.005) & (tracks[:, None] != tracks[None, :]), axis=1)
+        np.testing.assert_array_equal(expected, result[:, 4] != -1)
+
+    def test_no_match(self):
+        a = random_track(0, 50)
+        b = random_track(1, 50, start=(50.2257, 16.5337))
+
+        result = match.match(a, b, 0.005)
+
+        self.assertTrue(np.all(result[:, 4] == -1))
+
+    def test_clusterings(self):
+        rng = np.random.default_rng(1)
+        a = random_track(0, 600)
+
+        # second track follows two parts of first track with a detour between them
+        b = np.vstack([a[50:100], a[99] + [0.05, 0], a[400:450]]) + rng.normal(0, 0.0002, (101, 2))
+
+        segments = match.match(a, b, 0.003)
+        hierarchical = match.match(a, b, 0.003, 'hierarchical')
+
+        np.testing.assert_array_equal(segments[:, :4], hierarchical[:, :4])
+
+        # points are within tolerance of their neighbours, both clusterings
+        # make the same partition (numbering of clusters can differ)
+        pairs = set(zip(segments[:, 4], hierarchical[:, 4]))
+        self.assertEqual(len(set(segments[:, 4])), len(pairs))
+        self.assertEqual(len(set(hierarchical[:, 4])), len(pairs))
+        self.assertEqual(3, len(pairs))     # two clusters and points out of clusters
+
+        with self.assertRaises(ValueError):
+            match.match(a, b, 0.003, 'unknown')
+
+    def test_tolerance_m(self):
+        rng = np.random.default_rng(1)
+        a = random_track(0, 200, start=(65.0, 16.5))
+        b = a[50:150] + rng.normal(0, 0.0005, (100, 2))
+
+        for clustering in match.CLUSTERINGS:
+            result = match.match(a, b, None, clustering, tolerance_m=50)
+
+            # point is in a cluster if it has a point of the other track within 50 m
+            distances = haversine_distances(a[:, None, :], b[None, :, :])
+            expected = np.concatenate([np.any(distances <= 50, axis=1), np.any(distances <= 50, axis=0)])
+            np.testing.assert_array_equal(expected, result[:, 4] != -1)
+            self.assertTrue(np.any(expected))
+
+    def test_get_track_ratios(self):
+        a = random_track(0, 100)
+        b = random_track(1, 80)
+        c = random_track(2, 60)
+
+        # (x, y, track_id, index, cluster), every second point of a and all
+        # points of c are in a cluster
+        matches = np.vstack([np.column_stack([t, np.full(len(t), i)]) for i, t in enumerate([a, b, c])])
+        clusters = np.full(len(matches), -1.0)
+        clusters[0:100:2] = 1
+        clusters[180:] = 2
+        matches = np.column_stack([matches[:, :3], np.arange(len(matches)), clusters])
+
+        ratios = match.get_track_ratios(matches)
+
+        self.assertEqual([0, 1, 2], [r['track'] for r in ratios])
+        self.assertEqual([100, 80, 60], [r['points'] for r in ratios])
+
+        for r, t in zip(ratios, [a, b, c]):
+            self.assertAlmostEqual(haversine_distances(t[:-1], t[1:]).sum(), r['distance_total'])
+
+        lengths = haversine_distances(a[:-1], a[1:])
+        self.assertAlmostEqual(lengths[::2].sum(), ratios[0]['distance_outside'])
+        self.assertEqual(0.0, ratios[1]['ratio'])
+        self.assertEqual(1.0, ratios[2]['ratio'])
+        self.assertEqual([], match.get_track_ratios(np.empty((0, 5))))
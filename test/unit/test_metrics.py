@@ -0,0 +1,48 @@
+import unittest
+from geonetpy import metrics
+from geonetpy.netmem import NetMem
+from test_netmem import random_track
+
+
+class TestMetrics(unittest.TestCase):
+
+    def tearDown(self):
+        metrics.enable(False)
+        metrics.reset()
+
+    def test_disabled(self):
+        metrics.reset()
+        metrics.count('spots.created')
+        with metrics.timer('net.update'):
+            pass
+        self.assertEqual({'timers': {}, 'counters': {}}, metrics.snapshot())
+
+    def test_timers_counters(self):
+        metrics.reset()
+        metrics.enable()
+        metrics.count('mongo.ops', 2)
+        metrics.count('mongo.ops')
+        for _ in range(3):
+            with metrics.timer('net.update'):
+                pass
+
+        snapshot = metrics.snapshot()
+        self.assertEqual({'mongo.ops': 3}, snapshot['counters'])
+        self.assertEqual(3, snapshot['timers']['net.update']['calls'])
+
+        # snapshot of worker process is merged
+        metrics.merge(snapshot)
+        self.assertEqual(6, metrics.snapshot()['counters']['mongo.ops'])
+        self.assertEqual(6, metrics.snapshot()['timers']['net.update']['calls'])
+
+    def test_net_counters(self):
+        metrics.reset()
+        metrics.enable()
+        n = NetMem()
+        for track_id, seed in enumerate([0, 0]):
+            n.add_track(random_track(seed), track_id)
+
+        counters = metrics.snapshot()['counters']
+        self.assertEqual(600, counters['spots.created'] + counters['spots.reused'])
+        self.assertEqual(len(n.spots), counters['spots.created'])
+        self.assertEqual(len(n.edges), counters['edges.created'])
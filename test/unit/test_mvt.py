@@ -0,0 +1,99 @@
+import struct
+import unittest
+from geonetpy import mvt
+
+
+def decode_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return result, pos
+
+
+def decode_message(data):
+    """list of (field, value) of protobuf message"""
+    fields = []
+    pos = 0
+    while pos < len(data):
+        key, pos = decode_varint(data, pos)
+        field, wire_type = key >> 3, key & 0x7
+        if wire_type == mvt.VARINT:
+            value, pos = decode_varint(data, pos)
+        elif wire_type == mvt.FIXED64:
+            value, pos = struct.unpack('<d', data[pos:pos + 8])[0], pos + 8
+        else:
+            length, pos = decode_varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        fields.append((field, value))
+    return fields
+
+
+def decode_packed(data):
+    values = []
+    pos = 0
+    while pos < len(data):
+        value, pos = decode_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def decode_tile(data):
+    """tile -> {layer name: [(type, geometry commands, properties)]}"""
+    result = {}
+    for _, layer_data in decode_message(data):
+        layer = dict(decode_message(layer_data))
+        fields = decode_message(layer_data)
+        keys = [v.decode('utf-8') for f, v in fields if f == 3]
+        values = []
+        for _, value_data in (fv for fv in fields if fv[0] == 4):
+            field, value = decode_message(value_data)[0]
+            values.append(value.decode('utf-8') if field == 1 else unzigzag(value) if field == 6 else value)
+
+        features = []
+        for _, feature_data in (fv for fv in fields if fv[0] == 2):
+            feature = dict(decode_message(feature_data))
+            tags = decode_packed(feature[2])
+            properties = {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}
+            features.append((feature[3], decode_packed(feature[4]), properties))
+
+        result[layer[1].decode('utf-8')] = (layer[5], features)
+    return result
+
+
+class TestMvt(unittest.TestCase):
+
+    def test_varint(self):
+        for value in [0, 1, 127, 128, 300, 2 ** 40]:
+            self.assertEqual((value, len(mvt.encode_varint(value))), decode_varint(mvt.encode_varint(value), 0))
+
+        for value in [0, -1, 1, -4096, 4096]:
+            self.assertEqual(value, unzigzag(mvt.zigzag(value)))
+
+    def test_encode_tile(self):
+        edges = mvt.LayerEncoder('edges')
+        edges.add_feature(mvt.LINESTRING, [(10, 20), (15, 10), (-3, 4100)], {'edge': '1-2', 'q': 3})
+        spots = mvt.LayerEncoder('spots')
+        spots.add_feature(mvt.POINT, [(25, 17)], {'spot': '1', 'q': 3, 'weight': 0.5})
+        spots.add_feature(mvt.POINT, [(5, 7)], {'spot': '2', 'q': 3})
+
+        tile = decode_tile(mvt.encode_tile([edges, spots, mvt.LayerEncoder('empty')]))
+
+        self.assertEqual({'edges', 'spots'}, set(tile))
+        extent, features = tile['edges']
+        self.assertEqual(mvt.EXTENT, extent)
+        geometry_type, commands, properties = features[0]
+        self.assertEqual(mvt.LINESTRING, geometry_type)
+        self.assertEqual({'edge': '1-2', 'q': 3}, properties)
+        self.assertEqual([mvt.command(mvt.MOVE_TO, 1), 20, 40, mvt.command(mvt.LINE_TO, 2), 10, 19, 35, 8180], commands)
+
+        _, features = tile['spots']
+        self.assertEqual([(mvt.POINT, [9, 50, 34], {'spot': '1', 'q': 3, 'weight': 0.5}), (mvt.POINT, [9, 10, 14], {'spot': '2', 'q': 3})], features)
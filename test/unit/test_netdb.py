@@ -0,0 +1,302 @@
+import os
+import json
+import itertools
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+import pymongo.errors
+import numpy as np
+from geonetpy.netdb import NetDb, remove_att_from_list, rect_polygon, CLAIM_TIMEOUT
+from geonetpy.geoutils import haversine_distances
+from geonetpy.netmem import NetMem
+from geonetpy.rect import Rect
+from test_netmem import random_track
+
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+
+def dump(n):
+    points = sorted(remove_att_from_list(n.db.points.find({}), '_id'), key=lambda p: p['index'])
+    edges = sorted(remove_att_from_list(n.db.edges.find({}), '_id'), key=lambda e: e['index'])
+    return points, edges
+
+
+@unittest.skipIf(mongomock is None, 'mongomock is not installed')
+class TestNetDb(unittest.TestCase):
+
+    def create_net(self):
+        return NetDb('mongodb://localhost', client=mongomock.MongoClient())
+
+    def test_add_track(self):
+        n = self.create_net()
+        n.add_track(random_track(0), 1, {'name': 'a'})
+
+        points, edges = dump(n)
+        self.assertEqual(300, sum(p['q'] for p in points))
+        self.assertEqual([{'name': 'a', 'id': 1}], n.get_meta()['tracks'])
+        for edge in edges:
+            self.assertEqual(f"{edge['p1']}-{edge['p2']}", edge['index'])
+
+    def test_bulk_add_track(self):
+        tracks = [random_track(seed) for seed in range(3)]
+
+        n1 = self.create_net()
+        n2 = self.create_net()
+        for track_id, track in enumerate(tracks):
+            n1.add_track(track, track_id)
+            n2.add_track(track, track_id, batch_size=64)
+
+        points1, edges1 = dump(n1)
+        points2, edges2 = dump(n2)
+
+        self.assertEqual(points1, points2)
+        self.assertEqual(edges1, edges2)
+
+    def test_shared_database(self):
+        tracks = [random_track(seed) for seed in range(4)]
+
+        n = self.create_net()
+        for track_id, track in enumerate(tracks):
+            n.add_track(track, track_id)
+
+        # two workers sharing one database, ids are generated by database counter
+        client = mongomock.MongoClient()
+        workers = [NetDb('mongodb://localhost', client=client), NetDb('mongodb://localhost', client=client, reset=False)]
+        for track_id, track in enumerate(tracks):
+            workers[track_id % 2].add_track(track, track_id, batch_size=100 if track_id % 2 else None)
+
+        self.assertEqual(dump(n), dump(workers[0]))
+
+    def test_concurrent_workers(self):
+        client = mongomock.MongoClient()
+        workers = [NetDb('mongodb://localhost', client=client, shared=True), NetDb('mongodb://localhost', client=client, reset=False)]
+
+        # tracks of the same way a few meters apart
+        tracks = [random_track(0), random_track(0, start=(49.2258, 16.5338))]
+
+        for batch_size in [None, 100]:
+            workers[0].drop()
+
+            # second worker adds its track after the first one looked up
+            # spots of its point, but before it created new ones
+            claim = workers[0]._claim
+            interleaved = []
+
+            def interleaved_claim(keys, claim=claim, interleaved=interleaved, batch_size=batch_size):
+                if not interleaved:
+                    interleaved.append(keys)
+                    workers[1].add_track(tracks[1], 1, batch_size=batch_size)
+                return claim(keys)
+
+            with mock.patch.object(workers[0], '_claim', interleaved_claim):
+                workers[0].add_track(tracks[0], 0, batch_size=batch_size)
+
+            self.assertEqual(1, len(interleaved))
+            points, _ = dump(workers[0])
+            self.assertEqual(600, sum(p['q'] for p in points))
+
+            # no spot is closer than max spot distance to another one
+            coordinates = np.array([[p['loc']['coordinates'][1], p['loc']['coordinates'][0]] for p in points])
+            distances = haversine_distances(coordinates[:, np.newaxis], coordinates[np.newaxis])
+            np.fill_diagonal(distances, np.inf)
+            self.assertGreaterEqual(distances.min(), workers[0].max_spot_distance)
+
+        # spots in cells claimed by one worker wait for release
+        track = random_track(1, start=(50.0, 17.0))
+        with workers[0]._claim(workers[0].get_cell_keys(track[0])):
+            writer = threading.Thread(target=workers[1].add_track, args=(track, 2))
+            writer.start()
+            writer.join(0.2)
+            self.assertTrue(writer.is_alive())
+            self.assertEqual(0, workers[0].db.points.count_documents({'tracks': 2}))
+
+        writer.join()
+        self.assertEqual(0, workers[0].db.claims.count_documents({}))
+
+    def test_stale_claims(self):
+        n = NetDb('mongodb://localhost', client=mongomock.MongoClient(), shared=True)
+        keys = n.get_cell_keys(random_track(0)[0])
+
+        # claims of crashed worker expire
+        n.db.claims.insert_one({'_id': keys[0], 'owner': 'crashed', 'time': time.time() - CLAIM_TIMEOUT - 1})
+        n.add_track(random_track(0), 1)
+        self.assertEqual(0, n.db.claims.count_documents({}))
+        self.assertEqual(300, sum(p['q'] for p in dump(n)[0]))
+
+    def test_private_net(self):
+        n = self.create_net()
+        self.assertFalse(n.shared)
+
+        # net which is not shared creates spots without claims of cells
+        with mock.patch.object(n, '_claim') as claim:
+            n.add_track(random_track(0), 1)
+            n.add_track(random_track(1), 2, batch_size=100)
+            claim.assert_not_called()
+
+        self.assertEqual(600, sum(p['q'] for p in dump(n)[0]))
+
+    def test_unique_indexes(self):
+        n = self.create_net()
+        n.add_track(random_track(0, 10), 1)
+
+        with self.assertRaises(pymongo.errors.DuplicateKeyError):
+            n.db.points.insert_one({'index': 0})
+
+        edge = n.db.edges.find_one({})
+        with self.assertRaises(pymongo.errors.DuplicateKeyError):
+            n.db.edges.insert_one({'index': 'x', 'p1': edge['p1'], 'p2': edge['p2']})
+
+    def test_save_load_binary(self):
+        n1 = self.create_net()
+        for track_id, seed in enumerate(range(3)):
+            n1.add_track(random_track(seed), track_id, {'name': f'track{track_id}'})
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'net.gnb')
+            n1.save(path, 'gnb')
+
+            n2 = self.create_net()
+            n2.load(path)
+
+        self.assertEqual(dump(n1), dump(n2))
+        self.assertEqual(n1.get_meta(), n2.get_meta())
+        self.assertEqual(n1.generate_id(), n2.generate_id())
+
+    def test_load_without_cells(self):
+        n1 = self.create_net()
+        n1.add_track(random_track(0), 1)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'net.gnt')
+            n1.save(path)
+
+            # net saved before spots had cell keys
+            with open(path, encoding='utf-8') as f:
+                content = json.load(f)
+            for point in content['points']:
+                del point['cell']
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(content, f)
+
+            n2 = self.create_net()
+            n2.load(path)
+
+        self.assertEqual(dump(n1), dump(n2))
+
+        # spots of loaded net are reused
+        n1.add_track(random_track(0), 2)
+        n2.add_track(random_track(0), 2)
+        self.assertEqual(dump(n1), dump(n2))
+        self.assertEqual(len(content['points']), n2.db.points.count_documents({}))
+
+    def test_load_memory_net(self):
+        tracks = [random_track(seed) for seed in range(3)]
+
+        n1 = NetMem()
+        n2 = self.create_net()
+        for track_id, track in enumerate(tracks):
+            n1.add_track(track, track_id)
+            n2.add_track(track, track_id)
+
+        def content(n):
+            spots, edges = n.columns()
+            return (
+                sorted(zip(spots['id'].tolist(), spots['lat'].tolist(), spots['lon'].tolist(), spots['q'].tolist())),
+                sorted(zip(edges['p1'].tolist(), edges['p2'].tolist(), edges['q'].tolist()))
+            )
+
+        # json nets are loaded by both backends regardless of which one saved them
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mem_path = os.path.join(tmp_dir, 'mem.gnt')
+            db_path = os.path.join(tmp_dir, 'db.gnt')
+            n1.save(mem_path)
+            n2.save(db_path)
+
+            n3 = self.create_net()
+            n3.load(mem_path)
+            n4 = NetMem()
+            n4.load(db_path)
+
+        self.assertEqual(content(n1), content(n3))
+        self.assertEqual(content(n2), content(n4))
+        self.assertEqual(n1.get_meta(), n3.get_meta())
+        self.assertEqual(n1.last_id, n3.generate_id(0))
+        self.assertEqual(n2.generate_id(0), n4.last_id)
+
+    def test_simplify(self):
+        n1 = self.create_net()
+        for track_id, seed in enumerate(range(3)):
+            n1.add_track(random_track(seed), track_id)
+
+        _, edges = dump(n1)
+        n1.simplify()
+        _, polylines = dump(n1)
+        self.assertLess(len(polylines), len(edges))
+
+        # tracks of polyline are tracks of its edges
+        tracks = {}
+        for edge in edges:
+            tracks[edge['p1'], edge['p2']] = edge['tracks']
+        for edge in polylines:
+            spots = [edge['p1']] + edge['via'] + [edge['p2']]
+            expected = set()
+            for a, b in zip(spots[:-1], spots[1:]):
+                expected.update(tracks[min(a, b), max(a, b)])
+            self.assertEqual(sorted(expected), edge['tracks'])
+
+        features = n1.to_geojson(show_points=False)['features']
+        self.assertEqual(sorted(len(e['via']) + 2 for e in polylines), sorted(len(f['geometry']['coordinates']) for f in features))
+
+        # polylines survive binary save and load
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'net.gnb')
+            n1.save(path, 'gnb')
+
+            n2 = self.create_net()
+            n2.load(path)
+
+        self.assertEqual(dump(n1), dump(n2))
+
+    def test_geojson_chunks(self):
+        n = self.create_net()
+        for track_id in range(3):
+            n.add_track(random_track(track_id), track_id)
+        points, edges = dump(n)
+        coordinates = {p['index']: p['loc']['coordinates'] for p in points}
+
+        # edges are rendered in chunks of edges with coordinates of their spots
+        features = list(itertools.chain.from_iterable(n._edge_features(edges[i:i + 50]) for i in range(0, len(edges), 50)))
+        self.assertEqual(features, sorted(n.to_geojson(show_points=False)['features'], key=lambda f: f['properties']['edge']))
+        for edge, feature in zip(edges, features):
+            self.assertEqual([coordinates[edge['p1']], coordinates[edge['p2']]], feature['geometry']['coordinates'])
+
+    def test_query_rect(self):
+        n = self.create_net()
+        for track_id in range(3):
+            n.add_track(random_track(track_id), track_id)
+        rect = Rect([49.22, 16.53], [49.23, 16.54])
+
+        points, edges = dump(n)
+        inside = [p['index'] for p in points if rect.contains([p['loc']['coordinates'][1], p['loc']['coordinates'][0]])]
+        touching = [(e['p1'], e['p2']) for e in edges if e['p1'] in inside or e['p2'] in inside]
+        self.assertGreater(len(inside), 0)
+
+        spots, columns = n.query_rect(rect)
+        self.assertEqual(inside, spots['id'].tolist())
+        self.assertEqual(sorted(touching), sorted(zip(columns['p1'].tolist(), columns['p2'].tolist())))
+
+        features = n.to_geojson(rect=rect)['features']
+        self.assertEqual(len(inside), sum(1 for f in features if 'spot' in f['properties']))
+        self.assertEqual(len(touching), sum(1 for f in features if 'edge' in f['properties']))
+
+    def test_rect_polygon(self):
+        ring = rect_polygon(Rect([49, 16], [50, 17]), margin=0.5, step=0.5)['coordinates'][0]
+
+        self.assertEqual(ring[0], ring[-1])
+        self.assertEqual([15.5, 48.5], ring[0])
+        self.assertEqual(11, len(ring))
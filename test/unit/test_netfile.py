@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from geonetpy import netfile
+
+
+class TestNetFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'net.gnb')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_write_read(self):
+        arrays = {
+            'a': np.arange(10, dtype=np.int32),
+            'b': np.linspace(0, 1, 7),
+            'empty': np.empty(0, dtype=np.int64)
+        }
+        netfile.write_net(self.path, arrays, {'tracks': [{'id': 1}]})
+
+        self.assertTrue(netfile.is_net_file(self.path))
+        result, meta = netfile.read_net(self.path)
+
+        self.assertEqual({'tracks': [{'id': 1}]}, meta)
+        self.assertEqual(set(arrays), set(result))
+        for name, array in arrays.items():
+            self.assertEqual(array.dtype, result[name].dtype)
+            np.testing.assert_array_equal(array, result[name])
+
+        # arrays are memory mapped copy on write, file is not modified
+        result['a'][0] = 100
+        result, _ = netfile.read_net(self.path)
+        self.assertEqual(0, result['a'][0])
+
+    def test_not_net_file(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{"points": []}')
+
+        self.assertFalse(netfile.is_net_file(self.path))
+        with self.assertRaises(ValueError):
+            netfile.read_net(self.path)
+
+    def test_lists(self):
+        lists = [[1, 2], [], [3]]
+        offsets, values = netfile.from_lists(lists)
+        self.assertEqual(lists, netfile.to_lists(offsets, values))
@@ -1,5 +1,13 @@
+import os
+import json
+import tempfile
 import unittest
-from geonetpy.netmem import NetMem
+from unittest import mock
+import numpy as np
+from geonetpy import netfile
+from geonetpy.kdtree import KDTree
+from geonetpy.netmem import NetMem, SPOT_INDEXES
+from geonetpy.rect import Rect
 
 # sample points
 POINTS = [
@@ -10,10 +18,181 @@ POINTS = [
 ]
 
 
+def random_track(seed, size=300, start=(49.2257, 16.5337)):
+    """random walk with steps of roughly 30 m"""
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 0.0003, (size, 2))
+    return np.array(start) + np.cumsum(steps, axis=0)
+
+
 class TestNetMem(unittest.TestCase):
 
     def test_create(self):
 
         NetMem()
 
-        NetMem(POINTS)
+        n = NetMem(POINTS)
+
+        # new spots get ids following existing ones
+        point = n.add_point([49.2257, 16.5337])
+        self.assertEqual(4, point[2])
+        self.assertEqual(5, len(n.get_points()))
+
+    def test_add_track(self):
+        tracks = [random_track(seed) for seed in range(3)]
+
+        for spot_index in SPOT_INDEXES:
+            n1 = NetMem(spot_index=spot_index)
+            for track in tracks:
+                last_point = None
+                for point in track:
+                    last_point = n1.add_point(point, last_point)
+
+            n2 = NetMem(spot_index=spot_index)
+            for track_id, track in enumerate(tracks):
+                n2.add_track(track, track_id)
+
+            self.assertEqual(sorted(n1.edges.items()), sorted(n2.edges.items()))
+            self.assertEqual(n1.get_spots_meta(), n2.get_spots_meta())
+            self.assertEqual(3, len(n2.tracks))
+
+    def test_spot_indexes(self):
+        track = random_track(0, 500)
+
+        nets = []
+        for spot_index in SPOT_INDEXES:
+            n = NetMem(spot_index=spot_index)
+            last_point = None
+            for point in track:
+                last_point = n.add_point(point, last_point)
+            nets.append(n)
+
+        for n in nets[1:]:
+            self.assertEqual(list(nets[0].edges.items()), list(n.edges.items()))
+            self.assertEqual(nets[0].get_spots_meta(), n.get_spots_meta())
+            self.assertEqual(len(n.spots), n.stat()['spots'])
+            self.assertGreater(n.stat()['height'], 0)
+
+        with self.assertRaises(ValueError):
+            NetMem(spot_index='unknown')
+
+    def test_save_load(self):
+        n1 = NetMem()
+        for track_id, seed in enumerate(range(3)):
+            n1.add_track(random_track(seed), track_id)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path1 = os.path.join(tmp_dir, 'net1.gnt')
+            path2 = os.path.join(tmp_dir, 'net2.gnt')
+
+            n1.save(path1)
+            n2 = NetMem()
+            n2.load(path1)
+            n2.save(path2)
+
+            with open(path1, encoding='utf-8') as f1, open(path2, encoding='utf-8') as f2:
+                content1 = json.load(f1)
+                content2 = json.load(f2)
+
+        # every edge has its q in meta
+        for a, b in content1['edges']:
+            self.assertIn(f'{a}-{b}', content1['meta'])
+
+        self.assertEqual(content1['meta'], content2['meta'])
+        self.assertEqual(sorted(content1['edges']), sorted(content2['edges']))
+        self.assertEqual(sorted(n1.edges.items()), sorted(n2.edges.items()))
+
+        # order of spots depends on layout of spatial index
+        features1 = sorted(json.dumps(f) for f in json.loads(n1.to_geojson())['features'])
+        features2 = sorted(json.dumps(f) for f in json.loads(n2.to_geojson())['features'])
+        self.assertEqual(features1, features2)
+
+    def test_load_add_track(self):
+        tracks = [random_track(seed) for seed in range(4)]
+
+        n1 = NetMem()
+        for track_id, track in enumerate(tracks):
+            n1.add_track(track, track_id)
+
+        n2 = NetMem()
+        for track_id, track in enumerate(tracks[:2]):
+            n2.add_track(track, track_id)
+
+        # loaded net continues with ids following loaded spots
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for output_format in ['gnt', 'gnb']:
+                path = os.path.join(tmp_dir, f'net.{output_format}')
+                n2.save(path, output_format)
+
+                n3 = NetMem()
+                n3.load(path)
+                self.assertEqual(n2.last_id, n3.last_id)
+
+                for track_id, track in enumerate(tracks[2:], start=2):
+                    n3.add_track(track, track_id)
+
+                self.assertEqual(n1.get_points(), sorted(n3.get_points(), key=lambda p: p[2]))
+                self.assertEqual(sorted(n1.edges.items()), sorted(n3.edges.items()))
+
+                # binary net file can be overwritten while it is memory mapped
+                n3.save(path, output_format)
+
+    def test_save_load_binary(self):
+        tracks = [random_track(seed) for seed in range(4)]
+
+        n1 = NetMem()
+        for track_id, track in enumerate(tracks[:3]):
+            n1.add_track(track, track_id)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'net.gnb')
+            n1.save(path, 'gnb')
+
+            n2 = NetMem()
+            n2.load(path)
+
+            # index is restored on first use, its trees are not built
+            self.assertIsInstance(n2._index, dict)
+            self.assertEqual(n1.get_points(), n2.get_points())
+            self.assertEqual(sorted(n1.edges.items()), sorted(n2.edges.items()))
+            self.assertEqual(n1.tracks, n2.tracks)
+
+            with mock.patch.object(KDTree, '_build') as build:
+                self.assertEqual(n1.index.get_blocks().tolist(), n2.index.get_blocks().tolist())
+                build.assert_not_called()
+
+            # trees stored by other version of scipy are built with the same layout
+            arrays, meta = netfile.read_net(path)
+            n3 = NetMem()
+            n3._load_arrays(arrays, dict(meta, kdtree_format='other'))
+            self.assertEqual(['blocks'], list(n3._index))
+            self.assertEqual(n1.index.get_blocks().tolist(), n3.index.get_blocks().tolist())
+
+            # restored index continues the same way
+            n1.add_track(tracks[3], 3)
+            n2.add_track(tracks[3], 3)
+
+            self.assertEqual(n1.get_points(), n2.get_points())
+            self.assertEqual(sorted(n1.edges.items()), sorted(n2.edges.items()))
+            self.assertEqual(n1.get_spots_meta(), n2.get_spots_meta())
+
+    def test_query_rect(self):
+        rect = Rect([49.22, 16.53], [49.23, 16.54])
+
+        for spot_index in SPOT_INDEXES:
+            n = NetMem(spot_index=spot_index)
+            for track_id in range(3):
+                n.add_track(random_track(track_id), track_id)
+            all_spots, all_edges = n.columns()
+
+            inside = [int(i) for i, lat, lon in zip(all_spots['id'], all_spots['lat'], all_spots['lon']) if rect.contains([lat, lon])]
+            touching = [(int(p1), int(p2)) for p1, p2 in zip(all_edges['p1'], all_edges['p2']) if p1 in inside or p2 in inside]
+            self.assertGreater(len(inside), 0)
+
+            spots, edges = n.query_rect(rect)
+            self.assertEqual(inside, sorted(spots['id'].tolist()))
+            self.assertEqual(sorted(touching), sorted(zip(edges['p1'].tolist(), edges['p2'].tolist())))
+
+            features = json.loads(n.to_geojson(rect=rect))['features']
+            self.assertEqual(len(inside), sum(1 for f in features if 'spot' in f['properties']))
+            self.assertEqual(len(touching), sum(1 for f in features if 'edge' in f['properties']))
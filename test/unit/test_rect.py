@@ -13,5 +13,16 @@ class TestRect(unittest.TestCase):
     def test_get_corner_points(self):
         pass
 
+    def test_contains(self):
+        r = Rect([11, 11], [1, 2])
+        self.assertEqual([1, 2, 11, 11], r.get_bounds())
+        self.assertTrue(r.contains([1, 2]))
+        self.assertTrue(r.contains([5, 10]))
+        self.assertFalse(r.contains([5, 12]))
+
+        r = Rect.from_bbox([16.5, 49.1, 16.7, 49.3])
+        self.assertTrue(r.contains([49.2, 16.6]))
+        self.assertFalse(r.contains([16.6, 49.2]))
+
 if __name__ == '__main__':
     unittest.main()
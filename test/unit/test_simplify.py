@@ -0,0 +1,90 @@
+import os
+import json
+import tempfile
+import unittest
+import numpy as np
+from geonetpy.simplify import simplify
+from geonetpy.columns import EdgeTable
+from geonetpy.netmem import NetMem
+from test_netmem import random_track
+
+
+def columns(coordinates, edges):
+    """columns of spots (ids are positions in coordinates) and edges (p1, p2, q)"""
+    coordinates = np.array(coordinates)
+    spots = {'lat': coordinates[:, 0], 'lon': coordinates[:, 1], 'id': np.arange(len(coordinates))}
+    edges = np.array(edges)
+    return spots, {'p1': edges[:, 0], 'p2': edges[:, 1], 'q': edges[:, 2]}
+
+
+def line_spots(line):
+    spots = line['spots']
+    return spots if spots[0] <= spots[-1] else spots[::-1]
+
+
+class TestSimplify(unittest.TestCase):
+
+    def test_chain(self):
+        spots, edges = columns([[49.0, 16.0 + i * 0.001] for i in range(4)], [[0, 1, 1], [1, 2, 3], [2, 3, 2]])
+        lines = simplify(spots, edges)
+
+        self.assertEqual(1, len(lines))
+        self.assertEqual([0, 1, 2, 3], line_spots(lines[0]))
+        self.assertEqual(3, lines[0]['q'])
+
+    def test_parallel(self):
+        # two lines between spots 0 and 3 are 10 m apart, tails make 0 and 3 junctions
+        coordinates = [[49.0, 16.0], [49.0, 16.001], [49.0001, 16.001], [49.0, 16.002], [49.0, 15.999], [49.0, 16.003]]
+        spots, edges = columns(coordinates, [[0, 1, 3], [1, 3, 3], [0, 2, 1], [2, 3, 1], [0, 4, 5], [3, 5, 5]])
+        lines = simplify(spots, edges)
+
+        self.assertEqual(1, len(lines))
+        self.assertEqual([0, 1, 3, 4, 5], sorted(lines[0]['spots']))
+        self.assertEqual(5, lines[0]['q'])
+
+        # lines far from each other are kept
+        lines = simplify(spots, edges, merge_distance=5)
+        self.assertEqual(4, len(lines))
+
+    def test_spur(self):
+        coordinates = [[49.0, 16.0], [49.0, 16.001], [49.0, 16.002], [49.001, 16.001]]
+        spots, edges = columns(coordinates, [[0, 1, 5], [1, 2, 5], [1, 3, 1]])
+
+        lines = simplify(spots, edges)
+        self.assertEqual(1, len(lines))
+        self.assertEqual([0, 1, 2], line_spots(lines[0]))
+
+        lines = simplify(spots, edges, min_q=1)
+        self.assertEqual(3, len(lines))
+
+    def test_polylines(self):
+        spots, edges = columns([[49.0, 16.0 + i * 0.001] for i in range(5)], [[0, 1, 1], [1, 2, 1], [2, 3, 1], [3, 4, 1]])
+
+        table = EdgeTable.from_lines(simplify(spots, edges))
+        self.assertEqual([(0, 4)], list(table))
+        self.assertEqual([1, 2, 3], table.get_via(0))
+
+        # simplification of simplified net keeps via spots
+        lines = simplify(spots, table.columns())
+        self.assertEqual([[0, 1, 2, 3, 4]], [line_spots(line) for line in lines])
+
+    def test_net_save_load(self):
+        n1 = NetMem()
+        for track_id, seed in enumerate(range(3)):
+            n1.add_track(random_track(seed), track_id)
+
+        edges = len(n1.edges)
+        n1.simplify()
+        self.assertLess(len(n1.edges), edges)
+
+        features1 = sorted(json.dumps(f) for f in json.loads(n1.to_geojson())['features'])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for output_format in ['gnt', 'gnb']:
+                path = os.path.join(tmp_dir, f'net.{output_format}')
+                n1.save(path, output_format)
+
+                n2 = NetMem()
+                n2.load(path)
+
+                features2 = sorted(json.dumps(f) for f in json.loads(n2.to_geojson())['features'])
+                self.assertEqual(features1, features2)
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+import numpy as np
+from geonetpy import tiles
+from geonetpy.netmem import NetMem
+from test_mvt import decode_tile
+from test_netmem import random_track
+
+
+class TestTiles(unittest.TestCase):
+
+    def setUp(self):
+        n = NetMem()
+        for track_id in range(3):
+            n.add_track(random_track(track_id), track_id)
+        self.spots, self.edges = n.columns()
+
+    def test_tile_coordinates(self):
+        x, y = tiles.to_tile_coordinates(np.array([0.0, 85.0511287798, -85.0511287798]), np.array([0.0, -180.0, 180.0]), 2)
+        np.testing.assert_allclose([2, 0, 4], x)
+        np.testing.assert_allclose([2, 0, 4], y, atol=1e-6)
+
+    def test_zoom_tiles(self):
+        # at high zoom all edges and spots are visible
+        result = tiles.zoom_tiles(self.spots, self.edges, 18, points_min_zoom=18)
+        edges = [f for _, _, _, data in result for f in decode_tile(data).get('edges', (0, []))[1]]
+        spots = [f for _, _, _, data in result for f in decode_tile(data).get('spots', (0, []))[1]]
+
+        self.assertEqual(len(self.edges['q']), len({f[2]['edge'] for f in edges}))
+        self.assertEqual(len(self.spots['q']), len(spots))
+
+        # at low zoom there is one tile, edges collapsed to a pixel are dropped
+        result = tiles.zoom_tiles(self.spots, self.edges, 4)
+        self.assertEqual(1, len(result))
+        tile = decode_tile(result[0][3])
+        self.assertNotIn('spots', tile)
+        self.assertLess(len(tile['edges'][1]), len(self.edges['q']))
+
+    def test_polyline_segments(self):
+        edges = {'p1': [1, 5, 7], 'p2': [4, 6, 9], 'q': [3, 2, 8], 'via_offsets': [0, 2, 2, 3], 'via': [2, 3, 8]}
+        segments = tiles.polyline_segments(edges)
+
+        self.assertEqual([1, 2, 3, 5, 7, 8], segments['p1'].tolist())
+        self.assertEqual([2, 3, 4, 6, 8, 9], segments['p2'].tolist())
+        self.assertEqual([3, 3, 3, 2, 8, 8], segments['q'].tolist())
+
+    def test_max_features(self):
+        result = tiles.zoom_tiles(self.spots, self.edges, 13, max_features=10)
+        for _, _, _, data in result:
+            features = decode_tile(data)['edges'][1]
+            self.assertLessEqual(len(features), 10)
+
+        # features with highest q are kept
+        q = np.array([1, 5, 3, 7, 2])
+        kept = tiles.limit_per_tile(np.array([0, 0, 0, 1, 1]), np.array([0, 0, 0, 0, 0]), q, 2)
+        self.assertEqual([1, 2, 3, 4], sorted(kept.tolist()))
+
+    def test_write(self):
+        zooms = range(10, 15)
+        meta = tiles.tiles_meta(self.spots, 10, 14)
+        expected = sorted(tiles.generate_tiles(self.spots, self.edges, zooms))
+
+        # tiles generated in parallel are the same
+        self.assertEqual(expected, sorted(tiles.generate_tiles(self.spots, self.edges, zooms, workers=2)))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            count = tiles.write_directory(tmp_dir, iter(expected), meta)
+            self.assertEqual(len(expected), count)
+            zoom, x, y, data = expected[0]
+            with open(os.path.join(tmp_dir, str(zoom), str(x), f'{y}.pbf'), 'rb') as tile_file:
+                self.assertEqual(data, tile_file.read())
+
+            path = os.path.join(tmp_dir, 'net.mbtiles')
+            self.assertEqual(len(expected), tiles.write_mbtiles(path, iter(expected), meta))
+            with sqlite3.connect(path) as db:
+                rows = db.execute('SELECT zoom_level, tile_column, tile_row FROM tiles').fetchall()
+                self.assertEqual(sorted((z, x, 2 ** z - 1 - y) for z, x, y, _ in expected), sorted(rows))
+                self.assertEqual('pbf', db.execute("SELECT value FROM metadata WHERE name = 'format'").fetchone()[0])
+            db.close()
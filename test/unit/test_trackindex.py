@@ -0,0 +1,41 @@
+import unittest
+import numpy as np
+from geonetpy.trackindex import TrackIndex
+from geonetpy.interpolation import interpolate_distance
+
+
+def straight_track(start, end, dist=10):
+    return interpolate_distance(np.array([start, end]), dist)
+
+
+class TestTrackIndex(unittest.TestCase):
+
+    def test_match(self):
+        track = straight_track([49.0, 16.0], [49.01, 16.0])      # ~1100 m to north
+
+        index = TrackIndex(20)
+        index.add_track(track, 'same')
+        index.add_track(straight_track([49.005, 16.0], [49.02, 16.0]), 'half')
+        index.add_track(straight_track([49.0, 16.1], [49.01, 16.1]), 'far')
+
+        result = index.match(track)
+
+        self.assertEqual(['same', 'half'], [r['track'] for r in result])
+        self.assertAlmostEqual(1, result[0]['ratio'], places=3)
+        self.assertAlmostEqual(1, result[0]['ref_ratio'], places=3)
+
+        # tolerance extends overlap by up to 20 m
+        self.assertAlmostEqual(0.5, result[1]['ratio'], delta=0.03)
+        self.assertAlmostEqual(1 / 3, result[1]['ref_ratio'], delta=0.03)
+
+    def test_add_track_rebuilds_index(self):
+        track = straight_track([49.0, 16.0], [49.01, 16.0])
+
+        index = TrackIndex(20)
+        self.assertEqual([], index.match(track))
+
+        index.add_track(straight_track([49.0, 16.1], [49.01, 16.1]), 1)
+        self.assertEqual([], index.match(track))
+
+        index.add_track(track, 2)
+        self.assertEqual([2], [r['track'] for r in index.match(track)])